@@ -2,6 +2,7 @@ import os
 
 import dj_database_url
 import sentry_sdk
+from decouple import Csv
 from sentry_sdk.integrations.django import DjangoIntegration
 
 from .settings import *
@@ -23,6 +24,13 @@ DATABASES = {
     )
 }
 
+# ? Comma separated URLs of read replicas of DATABASE_URL, see core/routers.py
+for number, url in enumerate(config("DATABASE_REPLICA_URLS", "", cast=Csv()), 1):
+    DATABASES[f"replica_{number}"] = dj_database_url.parse(
+        url, conn_max_age=600, conn_health_checks=True
+    )
+    REPLICA_SETTINGS["REPLICAS"].append(f"replica_{number}")
+
 INSTALLED_APPS.remove("debug_toolbar")
 MIDDLEWARE.remove("debug_toolbar.middleware.DebugToolbarMiddleware")
 
@@ -42,6 +50,11 @@ CACHES = {
     }
 }
 
+TIMELINE_SETTINGS["BACKEND"] = "social.timeline.RedisTimeline"
+LIKE_BUFFER_SETTINGS["BACKEND"] = "async_like.buffer.RedisLikeBuffer"
+VIEW_COUNT_SETTINGS["BACKEND"] = "social.hits.RedisViewCounter"
+REQUEST_TIMING_SETTINGS.update(SLOW_MS=500, MAX_QUERIES=30)
+
 sentry_sdk.init(
     dsn=config("SENTRY_LOGGER_URL", ""),
     integrations=[DjangoIntegration()],
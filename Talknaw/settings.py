@@ -47,6 +47,7 @@ INSTALLED_APPS = [
     "rest_framework",
     "social",
     "likes",
+    "async_like",
     "users",
     "utils",
     "core",
@@ -55,11 +56,12 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "core.middleware.RequestIDMiddleware",
-    "users.middleware.UserIDMiddleware",
+    "core.middleware.RequestTimingMiddleware",
     "users.middleware.UserIDJWTMiddleware",
+    "core.middleware.ReplicaMiddleware",
     "core.middleware.ExceptionHandlerMiddleware",
     "corsheaders.middleware.CorsMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "core.middleware.StaticFilesMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -101,8 +103,19 @@ DATABASES = {
     }
 }
 
+# ? Read replicas, see core/routers.py
+DATABASE_ROUTERS = ["core.routers.ReplicaRouter"]
+REPLICA_SETTINGS = {
+    "REPLICAS": [],  # Aliases in DATABASES that replicate "default"
+    "STICKY_SECONDS": 10,  # Reads stay on the primary this long after a user's write
+}
+
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_RENDERER_CLASSES": [
+        "utils.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
     "DEFAULT_PERMISSION_CLASSES": [
         "core.permissions.IsAuthenticated",
     ],
@@ -219,6 +232,99 @@ CACHES = {
     }
 }
 
+# ? Cached responses are expired by tag on write (utils/cache.py), so they can live long
+VIEW_CACHE_TIMEOUT = 60 * 60 * 24
+
+# ? ETags and Cache-Control of post, comment and profile responses, see utils/conditional.py
+CONDITIONAL_GET_SETTINGS = {
+    "PUBLIC_MAX_AGE": 60,  # Seconds a CDN may serve a response that is the same for everyone
+}
+
+# ? Async views for the hot read endpoints, for ASGI deployments (Talknaw/asgi.py)
+ASYNC_READ_VIEWS = config("ASYNC_READ_VIEWS", False, cast=bool)
+
+# ? Server-Timing headers and request logs, see core.middleware.RequestTimingMiddleware
+REQUEST_TIMING_SETTINGS = {
+    "HEADER": True,
+    # With either threshold set only requests above it are logged, as warnings
+    "SLOW_MS": None,
+    "MAX_QUERIES": None,
+}
+
+# ? Verified bearer tokens remembered per worker, see users/middleware.py
+JWT_TOKEN_CACHE_SIZE = 10000
+
+# ? Cached sets of liked/bookmarked uids per user, see social/membership.py
+MEMBERSHIP_CACHE_SETTINGS = {
+    "ENABLED": False,
+    "MAX_SIZE": 5000,  # Users with more likes or bookmarks are resolved per page
+    "TIMEOUT": 60 * 60,
+}
+
+# ? Home timeline inboxes, see social/timeline.py
+TIMELINE_SETTINGS = {
+    "BACKEND": "social.timeline.LocalTimeline",
+    "REDIS_URL": config("REDIS_URL", ""),
+    "MAX_LENGTH": 800,  # Entries kept per inbox
+    "FANOUT_LIMIT": 5000,  # Above this many watchers posts are pulled on read
+}
+
+# ? Write-behind like buffer, see async_like/buffer.py
+LIKE_BUFFER_SETTINGS = {
+    "BACKEND": "async_like.buffer.LocalLikeBuffer",
+    "REDIS_URL": config("REDIS_URL", ""),
+    "FLUSH_INTERVAL": 5,  # Seconds between background flushes, None to only flush manually
+    "MAX_PENDING": 1000,  # Pending toggles that trigger an immediate flush
+}
+
+# ? Buffered post view counting, see social/hits.py
+VIEW_COUNT_SETTINGS = {
+    "BACKEND": "social.hits.LocalViewCounter",
+    "REDIS_URL": config("REDIS_URL", ""),
+    "WINDOW": 60 * 60,  # A user counts once per post within this many seconds
+    "FLUSH_INTERVAL": 30,
+}
+
+# ? Deleting expired posts, see social/expiry.py
+POST_EXPIRY_SETTINGS = {
+    "BATCH_SIZE": 500,  # Posts deleted per transaction
+    "PAUSE": 0.1,  # Seconds between batches
+}
+
+# ? "Who to watch" recommendations, see users/recommendations.py
+RECOMMENDATION_SETTINGS = {
+    "TOP_K": 50,  # Recommendations stored per profile
+    "SKILL_WEIGHT": 0.5,  # Score per shared skill, a path through a watched profile is 1
+    "MAX_DEGREE": 5000,  # Watched profiles watching more than this are not followed
+    "BATCH_SIZE": 500,  # Profiles written per transaction
+}
+
+# ? Trending post scores, see social/trending.py
+TRENDING_SETTINGS = {
+    "WINDOW": 3 * 24 * 60 * 60,  # Seconds after creation a post can trend
+    "HALF_LIFE": 6 * 60 * 60,  # Seconds for the weight of some activity to halve
+    "WEIGHTS": {"likes": 1, "comments": 3, "views": 0.2},
+    "BATCH_SIZE": 1000,  # Posts scored per query
+}
+
+# ? Background uploads of post files, see social/media.py
+MEDIA_UPLOAD_SETTINGS = {
+    "BACKEND": "social.media.FieldStorage",
+    "LOCATION": MEDIA_ROOT,  # Where social.media.LocalMediaStorage keeps files
+    "SPOOL_DIR": BASE_DIR / "spool",  # Files waiting for a worker
+    "CONCURRENCY": 4,  # Upload threads per worker process
+    "MAX_ATTEMPTS": 3,
+    "RETRY_DELAY": 2,  # Seconds before the first retry, doubled for each next one
+}
+
+# ? Renditions of post pictures, see social/images.py
+IMAGE_VARIANT_SETTINGS = {
+    "WIDTHS": [320, 640, 1080],
+    "FORMATS": ["webp", "jpeg"],
+    "QUALITY": 80,
+    "PLACEHOLDER_SIZE": 16,  # Longest side of the blurred placeholder, in pixels
+}
+
 CLOUDINARY_STORAGE = {
     "CLOUD_NAME": config("CLOUD_NAME", ""),
     "API_KEY": config("CLOUD_API_KEY", ""),
@@ -0,0 +1,372 @@
+"""
+Write-behind buffer for like toggles.
+
+A toggle only records the wanted end state of a (content type, object, user) key in the
+buffer, repeated toggles of the same key coalesce into a single entry. `flush` then applies
+everything at once: one `INSERT ... ON CONFLICT DO NOTHING` for the new likes, one locking
+select and one `DELETE` for the removed ones and one counter update per touched object,
+instead of a select/delete/insert round trip per tap. Counters move by the rows these
+statements actually inserted and deleted, so likes also toggled through the synchronous
+path are never counted twice.
+
+Every entry holds `(base, state)`: the liked state the database had when the key was first
+buffered and the wanted one. Until a flush lands, the buffer also keeps a per object delta,
+the sum of `state - base` over its entries, that is added on top of the stored `like_count`
+so users read their own toggles straight away.
+"""
+
+import threading
+from collections import defaultdict
+
+import redis
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+from django.utils.module_loading import import_string
+
+from likes.models import Like
+from social.cache import invalidate_posts
+from social.membership import invalidate_likes
+from social.models import Post
+from utils.flusher import start_flusher
+
+
+class BaseLikeBuffer:
+    def __init__(self, options):
+        self.max_pending = options.get("MAX_PENDING", 1000)
+
+    def state(self, key):
+        """The buffered liked state of `key` as a bool, or None when it is not buffered"""
+        raise NotImplementedError
+
+    def toggle(self, key, stored):
+        """Flips `key`, `stored` is its state in the database. Returns the new state"""
+        raise NotImplementedError
+
+    def delta(self, content_type_id, object_id):
+        raise NotImplementedError
+
+    def pending_count(self):
+        raise NotImplementedError
+
+    def take(self):
+        """
+        Moves the pending entries aside for flushing and returns them as
+        {key: (base, state)}, or None when there is nothing to flush or another flush runs.
+        A batch whose flush failed is handed out again before any new one.
+        """
+        raise NotImplementedError
+
+    def release(self, entries):
+        """Drops the flushed entries and their overlay once the database has them"""
+        raise NotImplementedError
+
+    def abort(self):
+        """Gives up the current flush, keeping its batch for the next attempt"""
+        raise NotImplementedError
+
+    def flush(self):
+        entries = self.take()
+        if entries is None:
+            return 0
+        try:
+            apply_entries(entries)
+        except Exception:
+            self.abort()
+            raise
+        self.release(entries)
+        return len(entries)
+
+
+class LocalLikeBuffer(BaseLikeBuffer):
+    """In-process stand-in for the Redis buffer, for development and tests"""
+
+    def __init__(self, options):
+        super().__init__(options)
+        self._pending = {}
+        self._flushing = {}
+        self._deltas = defaultdict(int)
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+
+    def state(self, key):
+        with self._lock:
+            entry = self._pending.get(key) or self._flushing.get(key)
+            return None if entry is None else entry[1]
+
+    def toggle(self, key, stored):
+        with self._lock:
+            if key in self._pending:
+                base, current = self._pending[key]
+            elif key in self._flushing:
+                # The batch being written will leave the database in its wanted state
+                base = current = self._flushing[key][1]
+            else:
+                base = current = stored
+
+            self._pending[key] = (base, not current)
+            self._deltas[key[:2]] += -1 if current else 1
+            return not current
+
+    def delta(self, content_type_id, object_id):
+        return self._deltas.get((content_type_id, object_id), 0)
+
+    def pending_count(self):
+        return len(self._pending)
+
+    def take(self):
+        if not self._flush_lock.acquire(blocking=False):
+            return None
+        with self._lock:
+            if not self._flushing:
+                self._flushing, self._pending = self._pending, {}
+            if not self._flushing:
+                self._flush_lock.release()
+                return None
+            return dict(self._flushing)
+
+    def release(self, entries):
+        with self._lock:
+            for key, delta in entry_deltas(entries).items():
+                self._deltas[key] -= delta
+                if not self._deltas[key]:
+                    del self._deltas[key]
+            self._flushing = {}
+        self._flush_lock.release()
+
+    def abort(self):
+        self._flush_lock.release()
+
+
+class RedisLikeBuffer(BaseLikeBuffer):
+    """
+    Keeps the pending `base:state` entries in the `likes:pending` hash and the overlay in
+    `likes:delta`.
+    A flush renames the pending hash to `likes:flushing`, so toggles keep landing in a fresh
+    hash while the batch is written, and only one worker flushes at a time.
+    """
+
+    PENDING = "likes:pending"
+    FLUSHING = "likes:flushing"
+    DELTAS = "likes:delta"
+    LOCK = "likes:flush-lock"
+
+    # Flip the entry atomically, falling back to the batch being flushed, then to the database
+    TOGGLE = """
+    local base, current
+    local entry = redis.call('HGET', KEYS[1], ARGV[1])
+    if entry then
+        base, current = string.sub(entry, 1, 1), string.sub(entry, 3, 3)
+    else
+        entry = redis.call('HGET', KEYS[2], ARGV[1])
+        if entry then current = string.sub(entry, 3, 3) else current = ARGV[2] end
+        base = current
+    end
+    local new = 1 - tonumber(current)
+    redis.call('HSET', KEYS[1], ARGV[1], base .. ':' .. new)
+    redis.call('HINCRBY', KEYS[3], ARGV[3], new - tonumber(current))
+    return new
+    """
+
+    # Take the flushed overlay back out, dropping objects that no longer have a delta
+    RELEASE = """
+    for i = 1, #ARGV, 2 do
+        if redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 1]) == 0 then
+            redis.call('HDEL', KEYS[1], ARGV[i])
+        end
+    end
+    redis.call('DEL', KEYS[2], KEYS[3])
+    """
+
+    def __init__(self, options):
+        super().__init__(options)
+        self.client = redis.Redis.from_url(options["REDIS_URL"])
+        self._toggle = self.client.register_script(self.TOGGLE)
+        self._release = self.client.register_script(self.RELEASE)
+
+    def field(self, key):
+        return ":".join(str(part) for part in key)
+
+    def state(self, key):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hget(self.PENDING, self.field(key))
+        pipe.hget(self.FLUSHING, self.field(key))
+        pending, flushing = pipe.execute()
+        entry = pending if pending is not None else flushing
+        return None if entry is None else entry.endswith(b"1")
+
+    def toggle(self, key, stored):
+        new = self._toggle(
+            keys=[self.PENDING, self.FLUSHING, self.DELTAS],
+            args=[self.field(key), int(stored), self.field(key[:2])],
+        )
+        return bool(new)
+
+    def delta(self, content_type_id, object_id):
+        return int(self.client.hget(self.DELTAS, f"{content_type_id}:{object_id}") or 0)
+
+    def pending_count(self):
+        return self.client.hlen(self.PENDING)
+
+    def take(self):
+        if not self.client.set(self.LOCK, 1, nx=True, ex=60):
+            return None
+        # A batch left behind by a worker that died mid flush is written first
+        if not self.client.exists(self.FLUSHING):
+            try:
+                self.client.rename(self.PENDING, self.FLUSHING)
+            except redis.ResponseError:
+                # Nothing pending
+                self.client.delete(self.LOCK)
+                return None
+
+        entries = {}
+        for field, entry in self.client.hgetall(self.FLUSHING).items():
+            content_type_id, object_id, user_id = field.decode().split(":")
+            base, state = entry.decode().split(":")
+            entries[(int(content_type_id), int(object_id), user_id)] = (
+                base == "1",
+                state == "1",
+            )
+        return entries
+
+    def release(self, entries):
+        args = []
+        for (content_type_id, object_id), delta in entry_deltas(entries).items():
+            args += [f"{content_type_id}:{object_id}", -delta]
+        self._release(keys=[self.DELTAS, self.FLUSHING, self.LOCK], args=args)
+
+    def abort(self):
+        self.client.delete(self.LOCK)
+
+
+def entry_deltas(entries):
+    """The overlay the entries contributed per (content type, object) while buffered"""
+    deltas = defaultdict(int)
+    for (content_type_id, object_id, _), (base, state) in entries.items():
+        deltas[(content_type_id, object_id)] += int(state) - int(base)
+    return deltas
+
+
+def keys_filter(keys):
+    condition = Q()
+    for content_type_id, object_id, user_id in keys:
+        condition |= Q(
+            content_type_id=content_type_id, object_id=object_id, user_id=user_id
+        )
+    return condition
+
+
+def chunked(items, size=200):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+INSERT_LIKES = """
+    INSERT INTO {likes} (user_id, content_type_id, object_id) VALUES {values}
+    ON CONFLICT (user_id, content_type_id, object_id) DO NOTHING
+    RETURNING content_type_id, object_id, user_id
+"""
+
+
+def insert_likes(keys):
+    """Stores likes for `keys`, skipping the ones already stored. Returns the inserted keys"""
+    if connection.vendor not in ("postgresql", "sqlite"):
+        return insert_likes_orm(keys)
+
+    field = Like._meta.get_field("user_id")
+    likes = connection.ops.quote_name(Like._meta.db_table)
+    inserted = []
+    with connection.cursor() as cursor:
+        for chunk in chunked(keys):
+            values = ", ".join(["(%s, %s, %s)"] * len(chunk))
+            params = []
+            for content_type_id, object_id, user_id in chunk:
+                user_id = field.get_db_prep_value(user_id, connection)
+                params += [user_id, content_type_id, object_id]
+
+            cursor.execute(INSERT_LIKES.format(likes=likes, values=values), params)
+            inserted += [
+                (content_type_id, object_id, str(field.to_python(user_id)))
+                for content_type_id, object_id, user_id in cursor.fetchall()
+            ]
+    return inserted
+
+
+def insert_likes_orm(keys):
+    """Fallback for other databases, one savepoint per like"""
+    inserted = []
+    for content_type_id, object_id, user_id in keys:
+        try:
+            with transaction.atomic():
+                Like.objects.create(
+                    content_type_id=content_type_id,
+                    object_id=object_id,
+                    user_id=user_id,
+                )
+        except IntegrityError:
+            continue
+        inserted.append((content_type_id, object_id, user_id))
+    return inserted
+
+
+def delete_likes(keys):
+    """Removes the stored likes among `keys`. Returns the deleted keys"""
+    deleted = []
+    for chunk in chunked(keys):
+        # Locked, so a concurrent toggle can't delete them too between the two queries
+        rows = list(
+            Like.objects.select_for_update()
+            .filter(keys_filter(chunk))
+            .values_list("id", "content_type_id", "object_id", "user_id")
+        )
+        Like.objects.filter(id__in=[row[0] for row in rows]).delete()
+        deleted += [(ct, pk, str(user_id)) for _, ct, pk, user_id in rows]
+    return deleted
+
+
+def apply_entries(entries):
+    """
+    Writes a batch of wanted like states to the database. Keys already in their wanted
+    state, e.g. toggled through the synchronous path meanwhile, are left alone and don't
+    move the counters.
+    """
+    with transaction.atomic():
+        created = insert_likes(key for key, (_, liked) in entries.items() if liked)
+        removed = delete_likes(key for key, (_, liked) in entries.items() if not liked)
+
+        counters = defaultdict(int)
+        for content_type_id, object_id, _ in created:
+            counters[(content_type_id, object_id)] += 1
+        for content_type_id, object_id, _ in removed:
+            counters[(content_type_id, object_id)] -= 1
+
+        invalidate_likes(*{user_id for _, _, user_id in created + removed})
+
+        for (content_type_id, object_id), change in counters.items():
+            if change:
+                model = ContentType.objects.get_for_id(content_type_id).model_class()
+                model.objects.filter(pk=object_id).update(
+                    like_count=Greatest(F("like_count") + change, 0)
+                )
+                # Raw inserts and update() send no signals, expire cached posts here
+                if model is Post:
+                    invalidate_posts(object_id)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            options = settings.LIKE_BUFFER_SETTINGS
+            _buffer = import_string(options["BACKEND"])(options)
+            if interval := options.get("FLUSH_INTERVAL"):
+                start_flusher(_buffer.flush, interval, "like-buffer-flusher")
+    return _buffer
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from async_like.buffer import get_buffer
+
+
+class Command(BaseCommand):
+    help = "Writes the buffered like toggles to the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            type=float,
+            default=None,
+            help="Keep flushing every LOOP seconds instead of flushing once",
+        )
+
+    def handle(self, *args, **options):
+        buffer = get_buffer()
+
+        while True:
+            flushed = buffer.flush()
+            self.stdout.write(self.style.SUCCESS(f"Flushed {flushed} like toggles"))
+
+            if options["loop"] is None:
+                break
+            time.sleep(options["loop"])
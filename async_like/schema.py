@@ -1,8 +1,13 @@
-from typing import Optional
+from uuid import UUID
 
 from ninja.schema import Schema
 
 
 class LikeSchema(Schema):
-    object_id: int
+    object_id: UUID
+    kind: str = "post"
 
+
+class LikeStateSchema(Schema):
+    liked: bool
+    like_count: int
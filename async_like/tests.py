@@ -1,3 +1,71 @@
+from unittest import mock
+
+from django.contrib.contenttypes.models import ContentType
 from django.test import TestCase
 
-# Create your tests here.
+from likes.models import Like
+from social.models import Post
+from utils.test import make_profile
+
+from . import buffer
+from .buffer import LocalLikeBuffer
+
+
+class FlushTests(TestCase):
+    def setUp(self):
+        self.buffer = LocalLikeBuffer({})
+        self.post = Post.objects.create(profile=make_profile("author"), content="post")
+        self.content_type = ContentType.objects.get_for_model(Post)
+        self.users = [str(make_profile(f"user{index}").user_id) for index in range(3)]
+
+    def key(self, user_id):
+        return (self.content_type.pk, self.post.pk, user_id)
+
+    def like_count(self):
+        self.post.refresh_from_db(fields=["like_count"])
+        return self.post.like_count
+
+    def store_like(self, user_id):
+        """A like written by the synchronous path, counter included"""
+        Like.objects.create(
+            content_type=self.content_type, object_id=self.post.pk, user_id=user_id
+        )
+        Post.objects.filter(pk=self.post.pk).update(like_count=self.like_count() + 1)
+
+    def test_flush_stores_likes_and_counts_them(self):
+        for user_id in self.users:
+            self.buffer.toggle(self.key(user_id), False)
+
+        self.assertEqual(self.buffer.flush(), 3)
+
+        self.assertEqual(self.like_count(), 3)
+        self.assertEqual(Like.objects.filter(object_id=self.post.pk).count(), 3)
+        self.assertEqual(self.buffer.delta(self.content_type.pk, self.post.pk), 0)
+
+    def test_likes_stored_during_the_flush_are_not_counted_twice(self):
+        for user_id in self.users:
+            self.buffer.toggle(self.key(user_id), False)
+
+        def insert_likes(keys):
+            self.store_like(self.users[0])
+            return insert(keys)
+
+        insert = buffer.insert_likes
+        with mock.patch.object(buffer, "insert_likes", insert_likes):
+            self.buffer.flush()
+
+        self.assertEqual(self.like_count(), 3)
+        self.assertEqual(Like.objects.filter(object_id=self.post.pk).count(), 3)
+
+    def test_only_stored_likes_are_taken_off_the_counter(self):
+        for user_id in self.users[:2]:
+            self.store_like(user_id)
+            self.buffer.toggle(self.key(user_id), True)
+        # Unliked through the synchronous path before the flush
+        Like.objects.filter(user_id=self.users[0]).delete()
+        Post.objects.filter(pk=self.post.pk).update(like_count=1)
+
+        self.buffer.flush()
+
+        self.assertEqual(self.like_count(), 0)
+        self.assertFalse(Like.objects.filter(object_id=self.post.pk).exists())
@@ -0,0 +1,24 @@
+import pytest
+
+
+def pytest_configure():
+    from django.conf import settings
+    from django.db import connections
+
+    # Stands in for a read replica in the routing tests of core/tests.py
+    settings.DATABASES["replica"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": ":memory:",
+    }
+    connections.settings = connections.configure_settings(settings.DATABASES)
+
+
+@pytest.fixture(autouse=True)
+def local_cache(settings):
+    """Tests run against an in-process cache instead of REDIS_URL"""
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    from django.core.cache import cache
+
+    cache.clear()
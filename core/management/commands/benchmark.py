@@ -0,0 +1,319 @@
+import json
+import math
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from jose import jwt
+
+from social.models import Comment, Post
+from users.models import Profile
+
+
+def percentile(samples, percent):
+    """Nearest-rank percentile of a list of samples"""
+    ordered = sorted(samples)
+    rank = math.ceil(percent / 100 * len(ordered))
+    return ordered[max(rank, 1) - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Times every route of social/urls.py and users/urls.py against the current"
+        " database, reporting latency percentiles and SQL query counts per endpoint."
+        " Run `manage.py seed` first for realistic data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument(
+            "--warmup", type=int, default=2, help="Untimed rounds before measuring"
+        )
+        parser.add_argument(
+            "--output", help="Writes the results to this JSON file, e.g. as a baseline"
+        )
+        parser.add_argument(
+            "--compare", help="A baseline JSON file to diff the results against"
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.25,
+            help="Relative p95 slowdown counted as a regression",
+        )
+
+    def handle(self, *args, **options):
+        self.client = self.client_for(self.pick_viewer())
+        self.context = self.pick_targets()
+        steps = self.steps()
+
+        for _ in range(options["warmup"]):
+            self.run_round(steps, None)
+
+        samples = {}
+        for _ in range(options["iterations"]):
+            self.run_round(steps, samples)
+
+        results = {
+            "meta": {
+                "database": connection.vendor,
+                "debug": settings.DEBUG,
+                "iterations": options["iterations"],
+                "profiles": Profile.objects.count(),
+                "posts": Post.objects.count(),
+                "comments": Comment.objects.count(),
+            },
+            "endpoints": {name: self.summarize(runs) for name, runs in samples.items()},
+        }
+        self.report(results["endpoints"])
+
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(results, file, indent=2, sort_keys=True)
+                file.write("\n")
+            self.stdout.write(self.style.SUCCESS(f"Saved {options['output']}"))
+
+        if options["compare"]:
+            with open(options["compare"]) as file:
+                baseline = json.load(file)
+            regressions = self.compare(
+                baseline["endpoints"], results["endpoints"], options["threshold"]
+            )
+            if regressions:
+                raise CommandError(f"{regressions} endpoints regressed")
+
+    def pick_viewer(self):
+        """A profile watching a typical number of others, so the feed has content"""
+        profiles = Profile.objects.filter(watching_count__gt=0).order_by(
+            "watching_count", "pk"
+        )
+        total = profiles.count()
+        if not total:
+            raise CommandError("No profiles watching anybody, run `manage.py seed`")
+        return profiles[total // 2]
+
+    def pick_targets(self):
+        post = (
+            Post.objects.annotate(comments_total=Count("comments"))
+            .filter(comments_total__gt=0)
+            .order_by("-comments_total", "pk")
+            .first()
+        )
+        if post is None:
+            raise CommandError("No commented posts, run `manage.py seed`")
+
+        watched = Profile.objects.order_by("-watchers_count", "pk")
+        return {
+            "post": post,
+            "comment": post.comments.order_by("pk").first(),
+            "popular": watched.first(),
+            # Somebody the viewer does not watch yet, for watch/unwatch
+            "stranger": watched.exclude(watchers__user_id=self.viewer).first(),
+            "search": post.content.split()[0] if post.content else "talk",
+        }
+
+    def client_for(self, profile):
+        self.viewer = profile
+        token = jwt.encode(
+            {"user_id": str(profile.user_id)}, settings.SECRET_KEY, algorithm="HS256"
+        )
+        return Client(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def steps(self):
+        """
+        (name, method, path, body) of each request in a round. Paths and bodies may be
+        callables of the responses seen so far in the round, and writes are paired with
+        the request undoing them so every round starts from the same state.
+        """
+        post, comment = self.context["post"], self.context["comment"]
+        popular, stranger = self.context["popular"], self.context["stranger"]
+        posts, comments = "/api/v1/posts", f"/api/v1/posts/{post.uid}/comments"
+
+        return [
+            ("GET posts", "get", posts, None),
+            (
+                "GET posts?search",
+                "get",
+                f"{posts}?search={self.context['search']}",
+                None,
+            ),
+            ("GET posts/mine", "get", f"{posts}/mine", None),
+            ("GET posts/trending", "get", f"{posts}/trending", None),
+            ("GET posts/<uid>", "get", f"{posts}/{post.uid}", None),
+            ("POST posts", "post", posts, {"content": "benchmark post"}),
+            (
+                "DELETE posts/<uid>",
+                "delete",
+                lambda seen: f"{posts}/{seen['POST posts'].json().get('id')}",
+                None,
+            ),
+            ("GET feed", "get", "/api/v1/feed", None),
+            ("GET posts/<uid>/comments", "get", comments, None),
+            (
+                "GET posts/<uid>/comments/<uid>",
+                "get",
+                f"{comments}/{comment.uid}",
+                None,
+            ),
+            ("POST posts/<uid>/comments", "post", comments, {"content": "benchmark"}),
+            (
+                "DELETE posts/<uid>/comments/<uid>",
+                "delete",
+                lambda seen: (
+                    f"{comments}/{seen['POST posts/<uid>/comments'].json().get('id')}"
+                ),
+                None,
+            ),
+            ("POST like/post", "post", "/api/v1/like/post", {"post_id": post.uid}),
+            (
+                "POST like/post (undo)",
+                "post",
+                "/api/v1/like/post",
+                {"post_id": post.uid},
+            ),
+            (
+                "POST like/comment",
+                "post",
+                "/api/v1/like/comment",
+                {"comment_id": comment.uid},
+            ),
+            (
+                "POST like/comment (undo)",
+                "post",
+                "/api/v1/like/comment",
+                {"comment_id": comment.uid},
+            ),
+            ("POST bookmark", "post", "/api/v1/bookmark", {"post_id": post.uid}),
+            ("GET bookmark", "get", "/api/v1/bookmark", None),
+            ("DELETE bookmark", "delete", "/api/v1/bookmark", {"post_ids": [post.uid]}),
+            ("GET profile", "get", "/api/v1/profile", None),
+            ("PATCH profile", "patch", "/api/v1/profile", {"bio": "benchmark"}),
+            (
+                "GET profile/<user_id>",
+                "get",
+                f"/api/v1/profile/{popular.user_id}",
+                None,
+            ),
+            ("GET watchers", "get", "/api/v1/watchers", None),
+            ("GET watching", "get", "/api/v1/watching", None),
+            (
+                "GET watchers/<user_id>",
+                "get",
+                f"/api/v1/watchers/{popular.user_id}",
+                None,
+            ),
+            (
+                "GET watching/<user_id>",
+                "get",
+                f"/api/v1/watching/{popular.user_id}",
+                None,
+            ),
+            (
+                "POST watch",
+                "post",
+                "/api/v1/watch",
+                {"watching_user_id": stranger.user_id},
+            ),
+            (
+                "DELETE unwatch/<user_id>",
+                "delete",
+                f"/api/v1/unwatch/{stranger.user_id}",
+                None,
+            ),
+            ("GET recommendations", "get", "/api/v1/recommendations", None),
+            ("POST skill", "post", "/api/v1/skill", {"names": ["Benchmarking"]}),
+            ("DELETE skill", "delete", "/api/v1/skill", {"names": ["Benchmarking"]}),
+        ]
+
+    def run_round(self, steps, samples):
+        seen = {}
+        for name, method, path, body in steps:
+            if callable(path):
+                path = path(seen)
+
+            request = getattr(self.client, method)
+            kwargs = {}
+            if body is not None:
+                kwargs = {"data": json.dumps(body, default=str)}
+                kwargs["content_type"] = "application/json"
+
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = request(path, **kwargs)
+                elapsed = time.perf_counter() - started
+
+            if hasattr(response, "streaming_content"):
+                # Streamed bodies are only produced, and queried, while being consumed
+                with CaptureQueriesContext(connection) as streamed:
+                    started = time.perf_counter()
+                    b"".join(response.streaming_content)
+                    elapsed += time.perf_counter() - started
+                query_count = len(queries) + len(streamed)
+            else:
+                query_count = len(queries)
+
+            seen[name] = response
+            if samples is not None:
+                samples.setdefault(name, []).append(
+                    (elapsed * 1000, query_count, response.status_code)
+                )
+
+    def summarize(self, runs):
+        latencies = [latency for latency, _, _ in runs]
+        queries = [count for _, count, _ in runs]
+        return {
+            "status": sorted({status for _, _, status in runs}),
+            "queries": {"median": statistics.median(queries), "max": max(queries)},
+            "latency_ms": {
+                "p50": round(percentile(latencies, 50), 2),
+                "p95": round(percentile(latencies, 95), 2),
+                "p99": round(percentile(latencies, 99), 2),
+                "mean": round(statistics.mean(latencies), 2),
+            },
+        }
+
+    def report(self, endpoints):
+        self.stdout.write(
+            f"{'endpoint':<36} {'status':<10} {'queries':>7}"
+            f" {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+        )
+        for name, result in endpoints.items():
+            latency = result["latency_ms"]
+            status = ",".join(str(code) for code in result["status"])
+            self.stdout.write(
+                f"{name:<36} {status:<10} {result['queries']['median']:>7}"
+                f" {latency['p50']:>9} {latency['p95']:>9} {latency['p99']:>9}"
+            )
+
+    def compare(self, baseline, current, threshold):
+        regressions = 0
+        for name, result in current.items():
+            if name not in baseline:
+                self.stdout.write(f"{name}: new endpoint")
+                continue
+
+            before, changes = baseline[name], []
+            if result["queries"]["median"] > before["queries"]["median"]:
+                changes.append(
+                    f"queries {before['queries']['median']} ->"
+                    f" {result['queries']['median']}"
+                )
+            if result["latency_ms"]["p95"] > before["latency_ms"]["p95"] * (
+                1 + threshold
+            ):
+                changes.append(
+                    f"p95 {before['latency_ms']['p95']} ->"
+                    f" {result['latency_ms']['p95']} ms"
+                )
+            if result["status"] != before["status"]:
+                changes.append(f"status {before['status']} -> {result['status']}")
+
+            if changes:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(f"{name}: {', '.join(changes)}"))
+        return regressions
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from social.models import Post
+from social.serializers import PostSerializer
+from utils.renderers import ORJSONRenderer
+from utils.serializers import compile_serializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Times rendering a page of posts with PostSerializer and JSONRenderer against"
+        " the compiled serializer and ORJSONRenderer, and checks both give the same bytes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--page-size", type=int, default=100)
+        parser.add_argument("--repeat", type=int, default=50)
+
+    def handle(self, *args, **options):
+        page_size, repeat = options["page_size"], options["repeat"]
+        queryset = Post.objects.order_by("-date_created", "-id")[:page_size]
+        if len(queryset) < page_size:
+            raise CommandError(f"Needs {page_size} posts, run `manage.py seed`")
+
+        context = {"request": APIRequestFactory().get("/api/v1/posts")}
+
+        def drf():
+            posts = queryset.select_related("profile").prefetch_related(
+                "pictures", "videos"
+            )
+            data = PostSerializer(posts, many=True, context=context).data
+            return JSONRenderer().render(data)
+
+        def compiled():
+            serializer = compile_serializer(PostSerializer)
+            data = serializer.render(serializer.values(queryset), context)
+            return ORJSONRenderer().render(data)
+
+        if drf() != compiled():
+            raise CommandError("The compiled output differs from PostSerializer's")
+
+        timings = {}
+        for name, render in (
+            ("PostSerializer + JSONRenderer", drf),
+            ("compiled + orjson", compiled),
+        ):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                render()
+            timings[name] = (time.perf_counter() - started) / repeat * 1000
+            self.stdout.write(f"{name:<32} {timings[name]:8.2f} ms per page")
+
+        baseline, fast = timings.values()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{baseline / fast:.1f}x faster on a {page_size} post page,"
+                " identical output"
+            )
+        )
@@ -0,0 +1,199 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from uuid import uuid4
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from hitcount.models import HitCount
+
+from likes.models import Like
+from social.models import Comment, Post
+from users.models import Profile, Skill, UserWatching
+
+WORDS = (
+    "talk campus lecture exam library hostel project deadline lagos coffee code python"
+    " django music match football weekend party class friends study group notes"
+    " internship startup design photo travel food market news update question answer"
+).split()
+
+SKILLS = (
+    "Python Django JavaScript React Design Writing Marketing Photography Video Music"
+    " Data Analysis Public Speaking Research Sales Accounting"
+).split()
+
+
+@contextmanager
+def explicit_dates(*models):
+    """Lets bulk_create keep the date_created given to each row instead of now()"""
+    fields = [model._meta.get_field("date_created") for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills the database with generated profiles, a power-law watch graph, posts,"
+        " comments, likes and views, for benchmarking"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profiles", type=int, default=1000)
+        parser.add_argument(
+            "--posts", type=float, default=10, help="Average posts per profile"
+        )
+        parser.add_argument(
+            "--watching", type=float, default=20, help="Average profiles each watches"
+        )
+        parser.add_argument(
+            "--comments", type=float, default=3, help="Average comments per post"
+        )
+        parser.add_argument(
+            "--likes", type=float, default=8, help="Average likes per post"
+        )
+        parser.add_argument(
+            "--views", type=float, default=50, help="Average views per post"
+        )
+        parser.add_argument("--days", type=int, default=90, help="Span of post dates")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+        self.now = timezone.now()
+        self.span = timedelta(days=options["days"]).total_seconds()
+
+        with transaction.atomic(), explicit_dates(Post, Comment):
+            profiles = self.create_profiles(options["profiles"])
+            # Zipf like popularity, a few profiles draw most watchers, likes and views
+            self.popularity = [1 / rank**1.1 for rank in range(1, len(profiles) + 1)]
+            self.create_watch_graph(profiles, options["watching"])
+            posts = self.create_posts(profiles, options["posts"])
+            self.create_comments(profiles, posts, options["comments"])
+            self.create_likes(profiles, posts, options["likes"])
+            self.create_views(posts, options["views"])
+
+        # bulk_create skips the signals, so derive counters and search rows in one go
+        call_command("rebuild_counters", stdout=self.stdout)
+        call_command("rebuild_search_index", stdout=self.stdout)
+
+    def sentence(self, low, high):
+        return " ".join(self.random.choices(WORDS, k=self.random.randint(low, high)))
+
+    def heavy_tailed(self, mean):
+        """A Pareto distributed count averaging roughly `mean`"""
+        return int(self.random.paretovariate(2) * mean / 2)
+
+    def pick(self, profiles, k):
+        return self.random.choices(profiles, weights=self.popularity, k=k)
+
+    def past(self):
+        return self.now - timedelta(seconds=self.random.uniform(0, self.span))
+
+    def create_profiles(self, count):
+        skills = [Skill.objects.get_or_create(name=name)[0] for name in SKILLS]
+        profiles = []
+        for _ in range(count):
+            handle = f"{self.random.choice(WORDS)}_{uuid4().hex[:8]}"
+            profile_skills = self.random.sample(skills, self.random.randint(0, 4))
+            profiles.append(
+                Profile(
+                    user_id=uuid4(),
+                    name=handle.replace("_", " ").title(),
+                    username=handle,
+                    bio=self.sentence(0, 12),
+                    user_skills=[skill.name for skill in profile_skills],
+                )
+            )
+            profiles[-1].seeded_skills = profile_skills
+        Profile.objects.bulk_create(profiles, batch_size=1000)
+
+        Through = Profile.skills.through
+        Through.objects.bulk_create(
+            [
+                Through(profile_id=profile.pk, skill_id=skill.pk)
+                for profile in profiles
+                for skill in profile.seeded_skills
+            ],
+            batch_size=1000,
+        )
+        self.stdout.write(f"Created {len(profiles)} profiles")
+        return profiles
+
+    def create_watch_graph(self, profiles, mean):
+        edges = set()
+        for profile in profiles:
+            count = min(self.heavy_tailed(mean), len(profiles) - 1)
+            for other in self.pick(profiles, count):
+                if other is not profile:
+                    edges.add((profile.pk, other.pk))
+
+        UserWatching.objects.bulk_create(
+            [
+                UserWatching(user_id_id=user_id, watching_user_id_id=watching_user_id)
+                for user_id, watching_user_id in edges
+            ],
+            batch_size=1000,
+        )
+        self.stdout.write(f"Created {len(edges)} watch edges")
+
+    def create_posts(self, profiles, mean):
+        posts = [
+            Post(
+                profile=profile, content=self.sentence(3, 40), date_created=self.past()
+            )
+            for profile in profiles
+            for _ in range(self.heavy_tailed(mean))
+        ]
+        Post.objects.bulk_create(posts, batch_size=1000)
+        self.stdout.write(f"Created {len(posts)} posts")
+        return posts
+
+    def create_comments(self, profiles, posts, mean):
+        comments = []
+        for post in posts:
+            for _ in range(self.heavy_tailed(mean)):
+                comments.append(
+                    Comment(
+                        post=post,
+                        profile=self.random.choice(profiles),
+                        content=self.sentence(1, 20),
+                        date_created=post.date_created
+                        + timedelta(seconds=self.random.uniform(0, 86400)),
+                    )
+                )
+        Comment.objects.bulk_create(comments, batch_size=1000)
+        self.stdout.write(f"Created {len(comments)} comments")
+
+    def create_likes(self, profiles, posts, mean):
+        content_type = ContentType.objects.get_for_model(Post)
+        likes = []
+        for post in posts:
+            count = min(self.heavy_tailed(mean), len(profiles))
+            likers = {profile.user_id for profile in self.pick(profiles, count)}
+            likes += [
+                Like(content_type=content_type, object_id=post.pk, user_id=user_id)
+                for user_id in likers
+            ]
+        Like.objects.bulk_create(likes, batch_size=1000)
+        self.stdout.write(f"Created {len(likes)} likes")
+
+    def create_views(self, posts, mean):
+        content_type = ContentType.objects.get_for_model(Post)
+        hits = [
+            HitCount(
+                content_type=content_type,
+                object_pk=post.pk,
+                hits=self.heavy_tailed(mean),
+            )
+            for post in posts
+        ]
+        HitCount.objects.bulk_create(hits, batch_size=1000, ignore_conflicts=True)
+        self.stdout.write(f"Recorded views on {len(hits)} posts")
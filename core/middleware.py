@@ -1,33 +1,200 @@
 import logging
+from contextlib import ExitStack
 from uuid import uuid4
 
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
 from django.http import JsonResponse
+from rest_framework.permissions import SAFE_METHODS
+from whitenoise.middleware import WhiteNoiseMiddleware
 
+from utils import timing
 from utils.exception_handlers import ErrorEnum, ErrorResponse
+from utils.middleware import SyncAndAsyncMiddleware
 
-LOGGER = logging.getLogger(__name__)
+from . import routers
 
+LOGGER = logging.getLogger(__name__)
 
-class RequestIDMiddleware:
-    def __init__(self, get_response):
-        self.get_response = get_response
 
-    def __call__(self, request):
+class RequestIDMiddleware(SyncAndAsyncMiddleware):
+    def handle(self, request):
         request.uid = uuid4()
 
         response = self.get_response(request)
         return response
 
+    async def ahandle(self, request):
+        request.uid = uuid4()
+        return await self.get_response(request)
+
+
+class RequestTimingMiddleware(SyncAndAsyncMiddleware):
+    """
+    Measures each request: the SQL queries and their time, the hits and misses of
+    utils.cache and the total time. They are sent as a `Server-Timing` header and logged
+    with the request id, see REQUEST_TIMING_SETTINGS.
+    """
 
-class ExceptionHandlerMiddleware:
     def __init__(self, get_response):
-        self.get_response = get_response
+        super().__init__(get_response)
+        options = settings.REQUEST_TIMING_SETTINGS
+        self.header = options.get("HEADER", True)
+        self.slow_ms = options.get("SLOW_MS")
+        self.max_queries = options.get("MAX_QUERIES")
 
-    def __call__(self, request):
+    def handle(self, request):
+        metrics, token = timing.start()
+        try:
+            with ExitStack() as stack:
+                self.instrument(stack, metrics)
+                response = self.get_response(request)
+        finally:
+            timing.stop(token)
+
+        return self.finish(request, response, metrics)
+
+    async def ahandle(self, request):
+        metrics, token = timing.start()
+        stack = ExitStack()
+        try:
+            # Under ASGI the ORM runs in the request's sync thread, whose connections
+            # are the ones to wrap
+            await sync_to_async(self.instrument)(stack, metrics)
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            timing.stop(token)
+
+        return self.finish(request, response, metrics)
+
+    def instrument(self, stack, metrics):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(metrics.execute))
+
+    def finish(self, request, response, metrics):
+        total_ms = metrics.total_ms
+        if self.header:
+            response["Server-Timing"] = ", ".join(
+                [
+                    f'db;dur={metrics.db_ms:.1f};desc="{metrics.queries} queries"',
+                    f'cache;desc="{metrics.cache_hits} hits {metrics.cache_misses} misses"',
+                    f"total;dur={total_ms:.1f}",
+                ]
+            )
+        self.log(request, response, metrics, total_ms)
+        return response
+
+    def log(self, request, response, metrics, total_ms):
+        thresholds = self.slow_ms is not None or self.max_queries is not None
+        slow = (self.slow_ms is not None and total_ms > self.slow_ms) or (
+            self.max_queries is not None and metrics.queries > self.max_queries
+        )
+        if thresholds and not slow:
+            return
+
+        fields = {
+            "request_id": str(getattr(request, "uid", "")),
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round(total_ms, 1),
+            "queries": metrics.queries,
+            "db_ms": round(metrics.db_ms, 1),
+            "cache_hits": metrics.cache_hits,
+            "cache_misses": metrics.cache_misses,
+        }
+        LOGGER.log(
+            logging.WARNING if slow else logging.INFO,
+            " ".join(f"{name}=%s" for name in fields),
+            *fields.values(),
+            extra=fields,
+        )
+
+
+class ReplicaMiddleware(SyncAndAsyncMiddleware):
+    """
+    Lets safe requests to views with `read_from_replica = True` read from the replicas,
+    and keeps users on the primary for a while after they wrote, see core/routers.py
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        if self.is_async:
+            # Django awaits a coroutine process_view instead of moving it to a thread
+            self.process_view = self.aprocess_view
+
+    def handle(self, request):
+        routers.allow_replica(False)
         response = self.get_response(request)
 
+        if user_id := self.writer(request, response):
+            routers.stick_to_primary(user_id)
+        return self.release(response)
+
+    async def ahandle(self, request):
+        routers.allow_replica(False)
+        response = await self.get_response(request)
+
+        if user_id := self.writer(request, response):
+            await routers.astick_to_primary(user_id)
+        return self.release(response)
+
+    def writer(self, request, response):
+        """The user_id of a request that wrote something, None for any other request"""
+        if not routers.replicas():
+            # Nothing to stick to, the primary serves every read anyway
+            return None
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return None
+        return getattr(request, "user_id", None)
+
+    def release(self, response):
+        if not response.streaming:
+            routers.allow_replica(False)
+        # Streamed pages query while they are sent, after this returns
+        elif response.is_async:
+            response.streaming_content = self.astream(response.streaming_content)
+        else:
+            response.streaming_content = self.stream(response.streaming_content)
         return response
 
+    def replica_view(self, request, view_func):
+        view = getattr(view_func, "cls", None) or getattr(view_func, "view_class", None)
+        return (
+            getattr(view or view_func, "read_from_replica", False)
+            and request.method in SAFE_METHODS
+            and routers.replicas()
+        )
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if self.replica_view(request, view_func):
+            user_id = getattr(request, "user_id", None)
+            routers.allow_replica(not (user_id and routers.is_sticky(user_id)))
+        return None
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        if self.replica_view(request, view_func):
+            user_id = getattr(request, "user_id", None)
+            routers.allow_replica(not (user_id and await routers.ais_sticky(user_id)))
+        return None
+
+    def stream(self, content):
+        try:
+            yield from content
+        finally:
+            routers.allow_replica(False)
+
+    async def astream(self, content):
+        try:
+            async for chunk in content:
+                yield chunk
+        finally:
+            routers.allow_replica(False)
+
+
+class ExceptionHandlerMiddleware(SyncAndAsyncMiddleware):
     def process_exception(self, request, exception):
         LOGGER.error(
             "An exception occurred: %s, Request_ID: %s",
@@ -37,3 +204,30 @@ class ExceptionHandlerMiddleware:
         )
         response = ErrorResponse(ErrorEnum.ERR_003, extra_detail=request.uid)
         return JsonResponse(data=response.data, status=response.status_code)
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoiseMiddleware, which is sync only, serving in async stacks as well"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings=settings)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.acall(request)
+        return super().__call__(request)
+
+    async def acall(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
@@ -15,7 +15,10 @@ class IsAuthenticated(permissions.BasePermission):
 
             if isinstance(obj, Post) or isinstance(obj, Comment):
                 
-                return bool(request.user_id and (obj.profile.user_id == request.user_id))
+                # user_id is the token's string claim, the profile's a UUID
+                return bool(
+                    request.user_id and str(obj.profile.user_id) == str(request.user_id)
+                )
         
         return bool(request.user_id)
         
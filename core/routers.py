@@ -0,0 +1,72 @@
+"""
+Read replica routing.
+
+Reads go to one of REPLICA_SETTINGS["REPLICAS"] only while core.middleware.ReplicaMiddleware
+allows it: in views that opt in with `read_from_replica = True`, for GET/HEAD/OPTIONS
+requests, outside of transactions, and unless the user wrote something within the last
+STICKY_SECONDS, so users always read their own writes. Writes, transactional blocks and
+everything running outside such a request use the primary `default` database.
+"""
+
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_replica_allowed = ContextVar("replica_allowed", default=False)
+
+
+def replicas():
+    return settings.REPLICA_SETTINGS.get("REPLICAS", [])
+
+
+def sticky_key(user_id):
+    return f"db:sticky:{user_id}"
+
+
+def stick_to_primary(user_id):
+    """Keeps the reads of `user_id` on the primary until replicas caught up with a write"""
+    timeout = settings.REPLICA_SETTINGS.get("STICKY_SECONDS", 10)
+    cache.set(sticky_key(user_id), True, timeout)
+
+
+async def astick_to_primary(user_id):
+    timeout = settings.REPLICA_SETTINGS.get("STICKY_SECONDS", 10)
+    await cache.aset(sticky_key(user_id), True, timeout)
+
+
+def is_sticky(user_id):
+    return cache.get(sticky_key(user_id)) is not None
+
+
+async def ais_sticky(user_id):
+    return await cache.aget(sticky_key(user_id)) is not None
+
+
+def allow_replica(allowed):
+    _replica_allowed.set(allowed)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _replica_allowed.get() or not replicas():
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # Reads inside a transaction must see what it wrote
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas())
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary
+        return db not in replicas()
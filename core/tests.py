@@ -1,3 +1,223 @@
-from django.test import TestCase
+import importlib
+import json
+import re
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path
+
+import social.urls
+import users.urls
+from likes.models import Like
+from social import async_views
+from social.models import Post
+from users.models import UserWatching
+
+from users.models import Profile
+from utils.test import async_client_for, client_for, make_profile
+
+from . import routers
+
+REPLICA = {"REPLICAS": ["replica"], "STICKY_SECONDS": 10}
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        self.profile = make_profile("primary")
+        # The replica lags behind and still has the old name
+        Profile.objects.using("replica").create(
+            pk=self.profile.pk,
+            user_id=self.profile.user_id,
+            name="replica",
+            username="replica",
+        )
+        self.client = client_for(self.profile)
+
+    def name(self):
+        response = self.client.get("/api/v1/profile")
+        self.assertEqual(response.status_code, 200)
+        return response.json()["name"]
+
+    @override_settings(REPLICA_SETTINGS=REPLICA)
+    def test_reads_of_opted_in_views_go_to_the_replica(self):
+        self.assertEqual(self.name(), "replica")
+
+    @override_settings(REPLICA_SETTINGS=REPLICA)
+    def test_writes_go_to_the_primary_and_stick_the_writer_to_it(self):
+        response = self.client.patch("/api/v1/profile", {"bio": "hello"})
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(Profile.objects.using("default").get().bio, "hello")
+        self.assertEqual(Profile.objects.using("replica").get().bio, "")
+        self.assertTrue(routers.is_sticky(self.profile.user_id))
+        self.assertEqual(self.name(), "primary")
+
+        # Other users still read from the replica
+        other = make_profile("other")
+        Profile.objects.using("replica").create(
+            pk=other.pk, user_id=other.user_id, name="other on replica"
+        )
+        response = client_for(other).get("/api/v1/profile")
+        self.assertEqual(response.json()["name"], "other on replica")
+
+    def test_reads_and_writes_stay_on_the_primary_without_replicas(self):
+        self.assertEqual(self.name(), "primary")
+
+        response = self.client.patch("/api/v1/profile", {"bio": "hello"})
+        self.assertEqual(response.status_code, 200)
+
+        self.assertFalse(routers.is_sticky(self.profile.user_id))
+
+
+class RequestTimingTests(TestCase):
+    def setUp(self):
+        self.profile = make_profile("profile")
+
+    def get(self):
+        # A new client, so the middleware reads the settings of the test
+        return client_for(self.profile).get("/api/v1/profile")
+
+    def test_sends_the_queries_and_their_time_as_server_timing(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get()
+
+        timing = response["Server-Timing"]
+        db = re.search(r'db;dur=([\d.]+);desc="(\d+) queries"', timing)
+        self.assertIsNotNone(db, timing)
+        self.assertEqual(int(db[2]), len(queries))
+        self.assertGreaterEqual(float(db[1]), 0)
+        self.assertRegex(timing, r'cache;desc="\d+ hits \d+ misses"')
+        self.assertRegex(timing, r"total;dur=[\d.]+")
+
+    @override_settings(
+        REQUEST_TIMING_SETTINGS={"HEADER": False, "SLOW_MS": None, "MAX_QUERIES": 0}
+    )
+    def test_logs_requests_over_a_threshold_with_their_measures(self):
+        with self.assertLogs("core.middleware", "WARNING") as logs:
+            response = self.get()
+
+        self.assertNotIn("Server-Timing", response)
+        record = logs.records[0]
+        self.assertEqual(
+            (record.method, record.path, record.status),
+            ("GET", "/api/v1/profile", 200),
+        )
+        self.assertTrue(record.request_id)
+        self.assertGreater(record.queries, 0)
+        self.assertIn(f"queries={record.queries}", record.getMessage())
+        for name in ("duration_ms", "db_ms", "cache_hits", "cache_misses"):
+            self.assertIsInstance(getattr(record, name), (int, float), name)
+
+    @override_settings(
+        REQUEST_TIMING_SETTINGS={"HEADER": True, "SLOW_MS": 60000, "MAX_QUERIES": 100}
+    )
+    def test_requests_under_the_thresholds_are_not_logged(self):
+        with self.assertNoLogs("core.middleware"):
+            self.get()
+
+
+# The URLconf of AsyncReadViewTests, filled once the app URLconfs are rebuilt
+urlpatterns = []
+
+
+def reload_urls():
+    """Rebuilds the app URLconfs, which read ASYNC_READ_VIEWS when they are imported"""
+    for module in (social.urls, users.urls):
+        importlib.reload(module)
+
+
+class AsyncReadViewTests(TransactionTestCase):
+    def setUp(self):
+        override = override_settings(ASYNC_READ_VIEWS=True)
+        override.enable()
+        reload_urls()
+        self.addCleanup(reload_urls)
+        self.addCleanup(override.disable)
+
+        urlpatterns[:] = [
+            path("api/v1/", include(social.urls)),
+            path("api/v1/", include(users.urls)),
+        ]
+        override = override_settings(ROOT_URLCONF=__name__)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.author = make_profile("author")
+        self.viewer = make_profile("viewer")
+        self.posts = [
+            Post.objects.create(profile=self.author, content=f"post {index}")
+            for index in range(3)
+        ]
+        Like.objects.create(
+            content_type=ContentType.objects.get_for_model(Post),
+            object_id=self.posts[0].pk,
+            user_id=self.viewer.user_id,
+        )
+        for name in ("first", "second"):
+            UserWatching.objects.create(
+                user_id=make_profile(name), watching_user_id=self.viewer
+            )
+
+    async def test_cached_post_pages_get_the_viewer_flags(self):
+        client = async_client_for(self.viewer)
+        response = await client.get("/api/v1/posts")
+        self.assertEqual(response.status_code, 200)
+
+        # Served from the cache of PostViewSet.public_page, without the sync view
+        with mock.patch.object(async_views, "post_list", side_effect=AssertionError):
+            for profile, liked in [(self.viewer, True), (self.author, False)]:
+                response = await async_client_for(profile).get("/api/v1/posts")
+                flags = {
+                    post["content"]: post["liked_by_me"]
+                    for post in response.json()["results"]
+                }
+                self.assertEqual(flags["post 0"], liked)
+                self.assertFalse(flags["post 1"])
+
+    async def test_post_details_answer_a_matching_etag_with_304(self):
+        client = async_client_for(self.viewer)
+        path = f"/api/v1/posts/{self.posts[0].uid}"
+
+        with mock.patch.object(
+            async_views.PostViewSet, "retrieve", side_effect=AssertionError
+        ):
+            response = await client.get(path)
+            self.assertEqual(response.json()["liked_by_me"], True)
+
+            response = await client.get(
+                path, headers={"If-None-Match": response["ETag"]}
+            )
+            self.assertEqual(response.status_code, 304)
+
+    async def test_writes_are_routed_to_the_sync_views(self):
+        client = async_client_for(self.author)
+
+        response = await client.post(
+            "/api/v1/posts", {"content": "async"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        response = await client.patch(
+            f"/api/v1/posts/{self.posts[1].uid}",
+            {"content": "edited"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+
+        self.assertEqual(await Post.objects.filter(content="async").acount(), 1)
+        self.assertEqual(
+            (await Post.objects.aget(pk=self.posts[1].pk)).content, "edited"
+        )
+
+    async def test_streams_watch_pages(self):
+        response = await async_client_for(self.viewer).get("/api/v1/watchers")
+
+        self.assertTrue(response.is_async)
+        body = b"".join([chunk async for chunk in response.streaming_content])
+        data = json.loads(body)
+        self.assertEqual([row["name"] for row in data["results"]], ["second", "first"])
+        self.assertIsNone(data["next"])
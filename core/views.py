@@ -5,9 +5,11 @@ from django.core.mail.backends.smtp import EmailBackend
 from django.shortcuts import redirect
 from ninja import NinjaAPI, Schema
 
+from async_like.views import router as like_router
 from users.models import Profile
 
 api = NinjaAPI(csrf=False)
+api.add_router("", like_router)
 
 
 class ChangeUsername(Schema):
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.6 on 2026-10-17 00:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('likes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(fields=['content_type', 'object_id', 'user_id'], name='likes_like_content_ddf715_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_likes(apps, schema_editor):
+    """Keeps the first like of every (user_id, content_type, object_id)"""
+    Like = apps.get_model('likes', 'Like')
+    duplicates = (
+        Like.objects.values('user_id', 'content_type', 'object_id')
+        .annotate(count=Count('id'), first=Min('id'))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        Like.objects.filter(
+            user_id=duplicate['user_id'],
+            content_type=duplicate['content_type'],
+            object_id=duplicate['object_id'],
+        ).exclude(id=duplicate['first']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('likes', '0002_like_lookup_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_likes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='like',
+            constraint=models.UniqueConstraint(fields=('user_id', 'content_type', 'object_id'), name='unique_likes'),
+        ),
+    ]
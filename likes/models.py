@@ -26,3 +26,16 @@ class Like(models.Model):
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
     object_id = models.PositiveIntegerField(default=uuid4)
     content_object = GenericForeignKey()
+
+    class Meta:
+        indexes = [
+            # Like lookups and the liked_by_me flags of social/membership.py
+            models.Index(fields=["content_type", "object_id", "user_id"]),
+        ]
+        constraints = [
+            # A user likes an object at most once, the toggle in likes/toggle.py relies
+            # on it to absorb concurrent double taps
+            models.UniqueConstraint(
+                fields=["user_id", "content_type", "object_id"], name="unique_likes"
+            ),
+        ]
@@ -1,41 +1,37 @@
-from django.contrib.auth import get_user_model
-from django.contrib.contenttypes.models import ContentType
 from rest_framework import serializers
+from rest_framework.exceptions import NotFound
 
 from .models import Like
+from .toggle import toggle_like
 
 
 class LikeSerializer(serializers.ModelSerializer):
     model = None  # Simply change this model name to Your required model to inherit all of this functionality
+    # The model must expose a `like_count` column, it is kept in step with every toggle
 
     class Meta:
         model = Like
         fields = ["id", "object_id"]
 
+    def get_targets(self):
+        """The rows that may be liked, override to leave out rows the user can't see"""
+        return self.model._default_manager.all()
+
     def save(self, **kwargs):
+        """
+        Toggles the like of the user in the context, sets `liked` and `like_count` to the
+        new state and returns `liked`
+        """
         if self.model is None or self.model == "":
             raise serializers.ValidationError({"error": "No model_name was specified"})
 
-        content_type = ContentType.objects.get_for_model(self.model)
-        user_id = self.context.get("user_id")
-
         try:
-            obj = self.model.objects.get(uid=self.validated_data["object_id"])
-        except self.model.DoesNotExist:
-            raise serializers.ValidationError(
-                {"error": f"{self.model.__name__} does not exist"}
+            self.object_pk, self.liked, self.like_count = toggle_like(
+                self.get_targets(),
+                self.validated_data["object_id"],
+                self.context.get("user_id"),
             )
+        except self.model.DoesNotExist:
+            raise NotFound({"error": f"{self.model.__name__} does not exist"})
 
-        if like := Like.objects.filter(
-            user_id=user_id, object_id=obj.pk, content_type=content_type
-        ):
-            like.delete()
-            return None
-        self.instance = Like.objects.create(
-            user_id=user_id,
-            content_type=content_type,
-            content_object=obj,
-            **self.validated_data,
-        )
-
-        return self.instance
+        return self.liked
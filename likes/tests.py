@@ -1,3 +1,109 @@
+from datetime import timedelta
+from unittest import mock
+from uuid import uuid4
+
+from django.db import connection
 from django.test import TestCase
+from django.utils import timezone
+
+from social.models import Comment, Post
+from utils.test import client_for, make_profile
+
+from .models import Like
+
+
+class ToggleTests(TestCase):
+    def setUp(self):
+        self.profile = make_profile("profile")
+        self.post = Post.objects.create(profile=self.profile, content="post")
+        self.client = client_for(self.profile)
+
+    def like_post(self, uid=None):
+        return self.client.post(
+            "/api/v1/like/post", {"post_id": str(uid or self.post.uid)}
+        )
+
+    def result(self, response):
+        self.assertEqual(response.status_code, 200)
+        result = response.json()["result"]
+        return result["liked"], result["like_count"]
+
+    def test_toggles_the_like_and_its_count(self):
+        # The ORM fallback stands in for backends without RETURNING
+        for vendor in ("sqlite", "other"):
+            with self.subTest(vendor), mock.patch.object(connection, "vendor", vendor):
+                self.assertEqual(self.result(self.like_post()), (True, 1))
+                self.assertEqual(self.result(self.like_post()), (False, 0))
+                self.assertEqual(self.result(self.like_post()), (True, 1))
+                self.like_post()
+
+        self.assertFalse(Like.objects.exists())
+
+    def test_the_count_never_goes_below_zero(self):
+        self.like_post()
+        # A counter that drifted below the stored likes
+        Post.objects.filter(pk=self.post.pk).update(like_count=0)
+
+        self.assertEqual(self.result(self.like_post()), (False, 0))
+
+    def test_toggles_comment_likes(self):
+        comment = Comment.objects.create(
+            post=self.post, profile=self.profile, content="comment"
+        )
+
+        for expected in [(True, 1), (False, 0)]:
+            response = self.client.post(
+                "/api/v1/like/comment", {"comment_id": str(comment.uid)}
+            )
+            self.assertEqual(self.result(response), expected)
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+    def test_unknown_uids_are_not_found(self):
+        self.assertEqual(self.like_post(uuid4()).status_code, 404)
+
+        response = self.client.post(
+            "/api/v1/like/comment", {"comment_id": str(uuid4())}
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class ExpiredTargetTests(TestCase):
+    def setUp(self):
+        self.profile = make_profile("profile")
+        self.post = Post.objects.create(
+            profile=self.profile,
+            content="expired",
+            expiry=timezone.now() - timedelta(minutes=1),
+            like_count=3,
+        )
+        self.comment = Comment.objects.create(
+            post=self.post, profile=self.profile, content="comment"
+        )
+        self.client = client_for(self.profile)
+
+    def test_expired_posts_and_their_comments_cannot_be_liked(self):
+        for vendor in ("sqlite", "other"):
+            with self.subTest(vendor), mock.patch.object(connection, "vendor", vendor):
+                response = self.client.post(
+                    "/api/v1/like/post", {"post_id": str(self.post.uid)}
+                )
+                self.assertEqual(response.status_code, 404)
+
+                response = self.client.post(
+                    "/api/v1/like/comment", {"comment_id": str(self.comment.uid)}
+                )
+                self.assertEqual(response.status_code, 404)
+
+        self.assertFalse(Like.objects.exists())
+        self.assertEqual(Post.all_objects.get().like_count, 3)
 
-# Create your tests here.
+    def test_the_buffered_like_route_does_not_find_them_either(self):
+        for kind, target in [("post", self.post), ("comment", self.comment)]:
+            response = self.client.post(
+                "/api/like",
+                {"object_id": str(target.uid), "kind": kind},
+                format="json",
+            )
+            self.assertEqual(response.status_code, 404, kind)
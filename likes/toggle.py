@@ -0,0 +1,135 @@
+"""
+Like toggles as raw statements against the (user_id, content_type, object_id) unique
+constraint.
+
+On Postgres a toggle is a single statement: data modifying CTEs delete the caller's like
+if there is one, insert it otherwise (`ON CONFLICT DO NOTHING` absorbs a concurrent double
+tap), move the target's `like_count` and return the new state and count. SQLite can't
+modify data inside a CTE, so there the same three steps run as separate statements in one
+transaction, which SQLite serializes anyway. Either way the liked row is looked up with
+the SQL of a queryset the caller passes, so rows its managers and filters hide can't be
+liked.
+
+Raw statements send no model signals, callers expire whatever caches depend on likes.
+"""
+
+from uuid import UUID
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import Like
+
+POSTGRES_TOGGLE = """
+    WITH target AS ({target}), removed AS (
+        DELETE FROM {likes} AS liked USING target
+        WHERE liked.user_id = %s AND liked.content_type_id = %s
+              AND liked.object_id = target.id
+        RETURNING liked.id
+    ), added AS (
+        INSERT INTO {likes} (user_id, content_type_id, object_id)
+        SELECT %s, %s, target.id FROM target
+        WHERE NOT EXISTS (SELECT 1 FROM removed)
+        ON CONFLICT (user_id, content_type_id, object_id) DO NOTHING
+        RETURNING id
+    )
+    UPDATE {table} SET like_count = GREATEST(
+        like_count + (SELECT COUNT(*) FROM added) - (SELECT COUNT(*) FROM removed), 0
+    )
+    FROM target WHERE {table}.id = target.id
+    RETURNING target.id, NOT EXISTS (SELECT 1 FROM removed), {table}.like_count
+"""
+
+
+def toggle_like(targets, uid, user_id):
+    """
+    Flips the like of `user_id` on the row with `uid` of the `targets` queryset, whose
+    model needs a `like_count` column. Rows outside `targets` can't be liked, the row is
+    looked up with the queryset's own SQL. Returns (object pk, liked, like_count), raises
+    model.DoesNotExist.
+    """
+    model = targets.model
+    uid, user_id = UUID(str(uid)), UUID(str(user_id))
+    content_type = ContentType.objects.get_for_model(model)
+    quote = connection.ops.quote_name
+    table, likes = quote(model._meta.db_table), quote(Like._meta.db_table)
+    lookup = targets.filter(uid=uid).order_by().values("id")
+    lookup = lookup.query.get_compiler(connection=connection).as_sql()
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            sql, params = lookup
+            cursor.execute(
+                POSTGRES_TOGGLE.format(target=sql, table=table, likes=likes),
+                [*params, user_id, content_type.pk, user_id, content_type.pk],
+            )
+            row = cursor.fetchone()
+        elif connection.vendor == "sqlite":
+            row = toggle_sqlite(cursor, lookup, table, likes, content_type, user_id)
+        else:
+            row = toggle_orm(targets, content_type, uid, user_id)
+
+    if row is None:
+        raise model.DoesNotExist(f"{model.__name__} does not exist")
+    return row
+
+
+def toggle_sqlite(cursor, lookup, table, likes, content_type, user_id):
+    cursor.execute(*lookup)
+    if (target := cursor.fetchone()) is None:
+        return None
+    params = {
+        # Stored as 32 hex characters, like Django does
+        "user_id": user_id.hex,
+        "content_type": content_type.pk,
+        "object_id": target[0],
+    }
+
+    cursor.execute(
+        f"DELETE FROM {likes} WHERE user_id = %(user_id)s"
+        " AND content_type_id = %(content_type)s AND object_id = %(object_id)s"
+        " RETURNING id",
+        params,
+    )
+    liked = not cursor.fetchall()
+    change = -1
+    if liked:
+        cursor.execute(
+            f"INSERT INTO {likes} (user_id, content_type_id, object_id)"
+            " VALUES (%(user_id)s, %(content_type)s, %(object_id)s)"
+            " ON CONFLICT (user_id, content_type_id, object_id) DO NOTHING RETURNING id",
+            params,
+        )
+        change = len(cursor.fetchall())
+
+    params["change"] = change
+    cursor.execute(
+        f"UPDATE {table} SET like_count = MAX(like_count + %(change)s, 0)"
+        " WHERE id = %(object_id)s RETURNING like_count",
+        params,
+    )
+    return target[0], liked, cursor.fetchone()[0]
+
+
+def toggle_orm(targets, content_type, uid, user_id):
+    """Fallback for other databases, the unique constraint still rules out duplicates"""
+    model = targets.model
+    target = targets.select_for_update().filter(uid=uid).first()
+    if target is None:
+        return None
+
+    lookup = {"user_id": user_id, "content_type": content_type, "object_id": target.pk}
+    deleted, _ = Like.objects.filter(**lookup).delete()
+    if not deleted:
+        Like.objects.create(**lookup)
+
+    counter = model.objects.filter(pk=target.pk)
+    if deleted:
+        counter.filter(like_count__gte=deleted).update(
+            like_count=F("like_count") - deleted
+        )
+    else:
+        counter.update(like_count=F("like_count") + 1)
+    target.refresh_from_db(fields=["like_count"])
+    return target.pk, not deleted, target.like_count
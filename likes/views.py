@@ -1,21 +1,25 @@
-from rest_framework import permissions, status
+from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from .serializers import LikeSerializer
-from uuid import UUID
 
 
-class LikeView (APIView):
-
+class LikeView(APIView):
     serializer_class = LikeSerializer  # default
     unlike = False
 
     def post(self, request):
+        """Toggles the like and returns only the new state, `liked` and `like_count`"""
         serializer = self.serializer_class(
-            data=request.data, context={'user_id': request.user_id})
+            data=request.data, context={"user_id": request.user_id}
+        )
         serializer.is_valid(raise_exception=True)
-        instance = serializer.save()
-        if instance is None:
-            self.unlike = True
-        return Response(status=status.HTTP_200_OK)
+        liked = serializer.save()
+
+        self.unlike = not liked
+        self.object_pk = serializer.object_pk
+        return Response(
+            {"liked": liked, "like_count": serializer.like_count},
+            status=status.HTTP_200_OK,
+        )
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class SocialConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'social'
+
+    def ready(self):
+        from . import cache  # noqa: F401 Connects the cache invalidation receivers
+        from . import membership  # noqa: F401 Expires cached like/bookmark sets
+        from . import search  # noqa: F401 Keeps the full-text index in sync
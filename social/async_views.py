@@ -0,0 +1,78 @@
+"""
+Async versions of the post read endpoints, routed for GET/HEAD instead of PostViewSet when
+settings.ASYNC_READ_VIEWS is on, see social/urls.py.
+
+Under ASGI they wait on the cache and the database without holding a worker thread. Pages
+of the post list are served from the cache of `PostViewSet.public_page` when they are
+there, and rendered by the sync view, which also caches them, when they are not.
+"""
+
+from adrf.views import APIView
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404
+from rest_framework import status
+from rest_framework.response import Response
+
+from utils.cache import aget_cached, cache_key
+from utils.conditional import conditional
+
+from .cache import public_scope
+from .conditional import post_version
+from .hits import get_view_counter
+from .membership import aapply_viewer_flags
+from .models import Post
+from .serializers import PostSerializer
+from .views import PostViewSet
+
+post_list = PostViewSet.as_view({"get": "list", "post": "create"})
+post_detail = PostViewSet.as_view(
+    {"get": "retrieve", "patch": "partial_update", "delete": "destroy"}
+)
+
+
+class AsyncPostListView(APIView):
+    read_from_replica = True
+
+    async def get(self, request):
+        if not settings.DEBUG and request.method == "GET":
+            scope = public_scope(self, request)
+            key = cache_key(PostViewSet.public_page, scope, request)
+            if (data := await aget_cached(key)) is not None:
+                await aapply_viewer_flags(data["results"], Post, request.user_id)
+                return Response(data)
+
+        return await sync_to_async(post_list)(request._request)
+
+
+class AsyncPostDetailView(APIView):
+    read_from_replica = True
+
+    async def get(self, request, uid):
+        response = await self.post_detail(request, uid=uid)
+
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            # A Redis round trip with the Redis counter, kept off the event loop
+            await sync_to_async(get_view_counter().record, thread_sensitive=False)(
+                self.resource_version["id"], request.user_id
+            )
+        return response
+
+    @conditional(post_version)
+    async def post_detail(self, request, uid):
+        post = await (
+            Post.objects.visible_to(request.user_id)
+            .filter(uid=uid)
+            .select_related("profile")
+            .prefetch_related("pictures", "videos")
+            .afirst()
+        )
+        if post is None:
+            raise Http404
+        self.check_object_permissions(request, post)
+
+        # Everything the serializer reads was loaded above, flags are resolved here
+        context = {"request": request, "view": self, "viewer": None}
+        data = PostSerializer(post, context=context).data
+        await aapply_viewer_flags([data], Post, request.user_id)
+        return Response(data)
@@ -0,0 +1,80 @@
+"""
+Cache tags for post responses and the model hooks that expire them, see utils.cache.
+
+    posts                   membership of the global post list
+    posts:profile:<pk>      membership of a profile's own post list
+    post:<pk>               a single post, including its like/comment counters
+    profile:<pk>            a profile embedded in post responses
+"""
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Min
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from likes.models import Like
+from users.models import Profile
+from utils.cache import invalidate_tags
+
+from .models import Comment, Post
+
+
+def page_tags(rows):
+    """Tags of a page of compiled PostSerializer rows, see utils.serializers"""
+    tags = set()
+    for row in rows:
+        tags.update([f"post:{row['id']}", f"profile:{row['profile']}"])
+    return tags
+
+
+def post_list_tags(view, request, response):
+    return {"posts"} | page_tags(view.paginator.page)
+
+
+def my_posts_tags(view, request, response):
+    return {f"posts:profile:{view.profile.pk}"} | page_tags(view.paginator.page)
+
+
+def page_expires(view, request, response):
+    """When the first post on the page expires, cached pages must not outlive it"""
+    ids = [row["id"] for row in view.paginator.page]
+    return Post.objects.filter(id__in=ids).aggregate(first=Min("expiry"))["first"]
+
+
+def public_scope(view, request):
+    return "public"
+
+
+def viewer_scope(view, request):
+    return request.user_id
+
+
+def invalidate_posts(*post_ids):
+    invalidate_tags(*(f"post:{pk}" for pk in post_ids))
+
+
+def invalidate_profiles(*profile_ids):
+    invalidate_tags(*(f"profile:{pk}" for pk in profile_ids))
+
+
+@receiver([post_save, post_delete], sender=Post)
+def post_changed(sender, instance, **kwargs):
+    invalidate_tags(
+        "posts", f"posts:profile:{instance.profile_id}", f"post:{instance.pk}"
+    )
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    invalidate_posts(instance.post_id)
+
+
+@receiver([post_save, post_delete], sender=Like)
+def like_changed(sender, instance, **kwargs):
+    if instance.content_type_id == ContentType.objects.get_for_model(Post).pk:
+        invalidate_posts(instance.object_id)
+
+
+@receiver(post_save, sender=Profile)
+def profile_changed(sender, instance, **kwargs):
+    invalidate_profiles(instance.pk)
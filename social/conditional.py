@@ -0,0 +1,71 @@
+"""
+Versions of post and comment responses for utils.conditional: the columns a response
+changes with, including counters and the embedded profile's counters, which are updated
+without touching the update timestamps, and the viewer's flags.
+"""
+
+from django.core.exceptions import ValidationError
+
+from .membership import bookmarked_uids, liked_uids
+from .models import Comment, Post
+
+PROFILE_VERSION = [
+    "profile__date_update",
+    "profile__watchers_count",
+    "profile__watching_count",
+]
+POST_VERSION = [
+    "id",
+    "date_updated",
+    "status",
+    "like_count",
+    "comment_count",
+    "view_count",
+    *PROFILE_VERSION,
+]
+COMMENT_VERSION = [
+    "id",
+    "uid",
+    "date_created",
+    "date_updated",
+    "like_count",
+    *PROFILE_VERSION,
+]
+
+
+def post_version(view, request, uid, **kwargs):
+    """Version of a PostSerializer response, None for a missing post"""
+    try:
+        posts = Post.objects.visible_to(request.user_id).filter(uid=uid)
+        row = posts.values(*POST_VERSION).first()
+    except ValidationError:
+        # Not a uuid, left to the view to answer
+        return None
+    if row is None:
+        return None
+
+    viewer = request.user_id
+    row["liked_by_me"] = bool(viewer and liked_uids(Post, viewer, [uid]))
+    row["bookmarked_by_me"] = bool(viewer and bookmarked_uids(viewer, [uid]))
+    return row
+
+
+def comment_page_version(view, request, post_uid, **kwargs):
+    """Version of a page of CommentViewSet.list, read with the same keyset query"""
+    try:
+        queryset = view.filter_queryset(view.get_queryset())
+        rows = view.paginate_queryset(queryset.values(*COMMENT_VERSION))
+    except ValidationError:
+        return None
+    posts = Post.objects.visible_to(request.user_id)
+    if not rows and not posts.filter(uid=post_uid).exists():
+        return None
+
+    viewer = request.user_id
+    liked = liked_uids(Comment, viewer, [row["uid"] for row in rows]) if viewer else ()
+    paginator = view.paginator
+    return (
+        [(*row.values(), str(row["uid"]) in liked) for row in rows],
+        paginator.has_next,
+        paginator.has_previous,
+    )
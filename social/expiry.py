@@ -0,0 +1,91 @@
+"""
+Removal of expired posts.
+
+Expired posts are hidden from the moment `Post.expiry` passes, `Post.objects` leaves them
+out (see LivePostManager). `sweep` deletes them later in batches of BATCH_SIZE posts, one
+short transaction per batch, so the table is never locked for the length of the whole
+sweep. Likes and comments of a batch are removed with plain DELETE statements instead of
+being loaded for their delete signals, the caches those signals would expire are expired
+once per batch here. Stored pictures, videos and voice recordings are deleted from storage
+once a batch is committed.
+"""
+
+import time
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.db.models import Q
+
+from likes.models import Like
+
+from .cache import invalidate_posts
+from .media import delete_files, stored_files
+from .membership import invalidate_likes
+from .models import Comment, Post
+
+
+def delete_rows(model, ids, size=500):
+    """Deletes rows of `model` by id with plain DELETE statements, no signals are sent"""
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        for start in range(0, len(ids), size):
+            chunk = ids[start : start + size]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cursor.execute(f"DELETE FROM {table} WHERE id IN ({placeholders})", chunk)
+
+
+def delete_posts(post_ids):
+    """
+    Deletes posts with their pictures, videos, comments, likes and bookmarks, and their
+    stored files
+    """
+    post_type = ContentType.objects.get_for_model(Post)
+    comment_type = ContentType.objects.get_for_model(Comment)
+
+    with transaction.atomic():
+        comment_ids = list(
+            Comment.objects.filter(post_id__in=post_ids).values_list("id", flat=True)
+        )
+        likes = list(
+            Like.objects.filter(
+                Q(content_type=post_type, object_id__in=post_ids)
+                | Q(content_type=comment_type, object_id__in=comment_ids)
+            ).values_list("id", "user_id")
+        )
+        files = stored_files(post_ids)
+
+        # Expired below instead of by the delete signals of every row
+        delete_rows(Like, [pk for pk, _ in likes])
+        delete_rows(Comment, comment_ids)
+        deleted, _ = Post.all_objects.filter(id__in=post_ids).delete()
+
+        invalidate_posts(*post_ids)
+        invalidate_likes(*{user_id for _, user_id in likes})
+        # Only once the rows are gone for good
+        transaction.on_commit(lambda: delete_files(files))
+    return deleted
+
+
+def sweep(batch_size=None, pause=None):
+    """Deletes every post expired by now, returns how many posts were deleted"""
+    options = settings.POST_EXPIRY_SETTINGS
+    batch_size = batch_size or options.get("BATCH_SIZE", 500)
+    pause = options.get("PAUSE", 0) if pause is None else pause
+
+    swept = 0
+    while True:
+        post_ids = list(
+            Post.all_objects.expired()
+            .order_by("expiry")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not post_ids:
+            return swept
+
+        delete_posts(post_ids)
+        swept += len(post_ids)
+        if len(post_ids) < batch_size:
+            return swept
+        # Lets other writers in between batches
+        time.sleep(pause)
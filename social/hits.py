@@ -0,0 +1,194 @@
+"""
+Buffered view counting for posts.
+
+A view is counted at most once per user and post within `WINDOW` seconds. Counted views only
+increment a per post counter in memory/Redis, and `flush` periodically writes the aggregated
+increments to hitcount's HitCount rows and to `Post.view_count` with a couple of bulk
+statements. Reading a post therefore costs no database writes and no session.
+"""
+
+import threading
+import time
+from collections import Counter
+
+import redis
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils.module_loading import import_string
+from hitcount.models import HitCount
+
+from utils.flusher import start_flusher
+
+from .cache import invalidate_posts
+from .models import Post
+
+
+class BaseViewCounter:
+    def __init__(self, options):
+        self.window = options.get("WINDOW", 60 * 60)
+
+    def record(self, post_id, user_id):
+        """Counts a view unless this user already viewed the post within the window"""
+        raise NotImplementedError
+
+    def take(self):
+        """Moves the pending increments aside for flushing, returns them as {post_id: views}"""
+        raise NotImplementedError
+
+    def release(self):
+        raise NotImplementedError
+
+    def abort(self):
+        raise NotImplementedError
+
+    def flush(self):
+        increments = self.take()
+        if increments is None:
+            return 0
+        try:
+            apply_increments(increments)
+        except Exception:
+            self.abort()
+            raise
+        self.release()
+        return sum(increments.values())
+
+
+class LocalViewCounter(BaseViewCounter):
+    """In-process stand-in for the Redis counter, for development and tests"""
+
+    def __init__(self, options):
+        super().__init__(options)
+        self._seen = {}
+        self._pending = Counter()
+        self._flushing = Counter()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def record(self, post_id, user_id):
+        now = time.monotonic()
+        with self._lock:
+            if self._seen.get((post_id, user_id), 0) > now:
+                return False
+            self._seen[(post_id, user_id)] = now + self.window
+            self._pending[post_id] += 1
+
+            if len(self._seen) > 10000:
+                self._seen = {
+                    key: until for key, until in self._seen.items() if until > now
+                }
+            return True
+
+    def take(self):
+        if not self._flush_lock.acquire(blocking=False):
+            return None
+        with self._lock:
+            if not self._flushing:
+                self._flushing, self._pending = self._pending, Counter()
+            if not self._flushing:
+                self._flush_lock.release()
+                return None
+            return dict(self._flushing)
+
+    def release(self):
+        with self._lock:
+            self._flushing = Counter()
+        self._flush_lock.release()
+
+    def abort(self):
+        self._flush_lock.release()
+
+
+class RedisViewCounter(BaseViewCounter):
+    """
+    Deduplicates with expiring `views:seen:<post>:<user>` keys and accumulates increments in
+    the `views:pending` hash, which a flush renames to `views:flushing` like the like buffer.
+    """
+
+    PENDING = "views:pending"
+    FLUSHING = "views:flushing"
+    LOCK = "views:flush-lock"
+
+    def __init__(self, options):
+        super().__init__(options)
+        self.client = redis.Redis.from_url(options["REDIS_URL"])
+
+    def record(self, post_id, user_id):
+        if not self.client.set(
+            f"views:seen:{post_id}:{user_id}", 1, nx=True, ex=self.window
+        ):
+            return False
+        self.client.hincrby(self.PENDING, post_id, 1)
+        return True
+
+    def take(self):
+        if not self.client.set(self.LOCK, 1, nx=True, ex=60):
+            return None
+        # A batch left behind by a worker that died mid flush is written first
+        if not self.client.exists(self.FLUSHING):
+            try:
+                self.client.rename(self.PENDING, self.FLUSHING)
+            except redis.ResponseError:
+                # Nothing pending
+                self.client.delete(self.LOCK)
+                return None
+
+        return {
+            int(post_id): int(views)
+            for post_id, views in self.client.hgetall(self.FLUSHING).items()
+        }
+
+    def release(self):
+        self.client.delete(self.FLUSHING, self.LOCK)
+
+    def abort(self):
+        self.client.delete(self.LOCK)
+
+
+def added(field, lookup, increments):
+    """`field` plus the increment of each row, as a single CASE expression"""
+    return F(field) + Case(
+        *[When(**{lookup: pk}, then=Value(views)) for pk, views in increments.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def apply_increments(increments, chunk_size=500):
+    """Adds a batch of {post_id: views} to HitCount and Post.view_count"""
+    content_type = ContentType.objects.get_for_model(Post)
+    post_ids = list(increments)
+
+    with transaction.atomic():
+        for start in range(0, len(post_ids), chunk_size):
+            chunk = {pk: increments[pk] for pk in post_ids[start : start + chunk_size]}
+
+            HitCount.objects.bulk_create(
+                [HitCount(content_type=content_type, object_pk=pk) for pk in chunk],
+                ignore_conflicts=True,
+            )
+            HitCount.objects.filter(
+                content_type=content_type, object_pk__in=chunk
+            ).update(hits=added("hits", "object_pk", chunk))
+            Post.all_objects.filter(pk__in=chunk).update(
+                view_count=added("view_count", "pk", chunk)
+            )
+
+        invalidate_posts(*post_ids)
+
+
+_counter = None
+_counter_lock = threading.Lock()
+
+
+def get_view_counter():
+    global _counter
+    with _counter_lock:
+        if _counter is None:
+            options = settings.VIEW_COUNT_SETTINGS
+            _counter = import_string(options["BACKEND"])(options)
+            if interval := options.get("FLUSH_INTERVAL"):
+                start_flusher(_counter.flush, interval, "view-count-flusher")
+    return _counter
@@ -0,0 +1,104 @@
+"""
+Size-bounded renditions of post pictures, made by the upload workers of social/media.py.
+
+Every picture gets one rendition per IMAGE_VARIANT_SETTINGS["WIDTHS"] entry narrower than
+the original (or a single one at its own size when it is narrower than all of them), each
+encoded once per FORMATS entry, plus a tiny WebP blur placeholder inlined as a data URI.
+They are recorded on `Picture.variants` as:
+
+    {
+        "width": 3024, "height": 4032, "placeholder": "data:image/webp;base64,...",
+        "renditions": [{"width": 320, "height": 427, "webp": <name>, "jpeg": <name>}, ...],
+    }
+
+EXIF data (location, camera, ...) is dropped from the original as well as from every
+rendition, after its orientation has been applied to the pixels.
+"""
+
+import base64
+import io
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+ORIENTATION = 0x0112
+
+# Pillow format names and file extensions of the rendition formats
+FORMATS = {"webp": ("WEBP", "webp"), "jpeg": ("JPEG", "jpg")}
+
+
+def strip_exif(path):
+    """Rewrites the image at `path` without its EXIF data, when it has any"""
+    with Image.open(path) as image:
+        exif = image.getexif()
+        if not exif:
+            return
+        image_format = image.format
+        options = {"icc_profile": image.info.get("icc_profile")}
+
+        if image_format == "JPEG" and exif.get(ORIENTATION, 1) == 1:
+            # Nothing to rotate, keep the original quantization instead of re-encoding
+            image.load()
+            image.save(path, image_format, quality="keep", **options)
+            return
+
+        upright = ImageOps.exif_transpose(image)
+        if image_format == "JPEG":
+            options["quality"] = 95
+    upright.save(path, image_format, **options)
+
+
+def encode(image, image_format, quality):
+    if image_format == "JPEG" and image.mode != "RGB":
+        # JPEG has no alpha channel, flatten transparent pictures onto white
+        background = Image.new("RGB", image.size, "white")
+        background.paste(
+            image, mask=image.getchannel("A") if "A" in image.mode else None
+        )
+        image = background
+
+    output = io.BytesIO()
+    image.save(output, image_format, quality=quality, optimize=image_format == "JPEG")
+    return output.getvalue()
+
+
+def render_variants(path, name, save):
+    """
+    Renders the variants of the picture at `path`, uploaded as `name`. `save(name, content)`
+    stores a rendition and returns its stored name.
+    """
+    options = settings.IMAGE_VARIANT_SETTINGS
+    stem = Path(name).stem
+
+    with Image.open(path) as original:
+        image = ImageOps.exif_transpose(original)
+    image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    width, height = image.size
+
+    widths = sorted({min(bound, width) for bound in options["WIDTHS"]}, reverse=True)
+    renditions = []
+    for bound in widths:
+        # Scaled down from the previous, larger, rendition which is cheaper than the original
+        size = (bound, max(1, round(height * bound / width)))
+        image = image.resize(size, Image.LANCZOS) if image.size != size else image
+
+        rendition = {"width": size[0], "height": size[1]}
+        for key in options["FORMATS"]:
+            image_format, extension = FORMATS[key]
+            content = encode(image, image_format, options["QUALITY"])
+            rendition[key] = save(f"{stem}_{bound}w.{extension}", ContentFile(content))
+        renditions.append(rendition)
+
+    placeholder = image.copy()
+    placeholder.thumbnail((options["PLACEHOLDER_SIZE"],) * 2)
+    placeholder = base64.b64encode(encode(placeholder, "WEBP", 30)).decode()
+
+    return {
+        "width": width,
+        "height": height,
+        "placeholder": f"data:image/webp;base64,{placeholder}",
+        # Smallest first, clients take the first one at least as wide as they need
+        "renditions": renditions[::-1],
+    }
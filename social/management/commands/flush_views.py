@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from social.hits import get_view_counter
+
+
+class Command(BaseCommand):
+    help = "Writes the buffered post views to HitCount and Post.view_count"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            type=float,
+            default=None,
+            help="Keep flushing every LOOP seconds instead of flushing once",
+        )
+
+    def handle(self, *args, **options):
+        counter = get_view_counter()
+
+        while True:
+            flushed = counter.flush()
+            self.stdout.write(self.style.SUCCESS(f"Flushed {flushed} post views"))
+
+            if options["loop"] is None:
+                break
+            time.sleep(options["loop"])
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+from social.media import publish, store
+from social.models import MediaUpload, Post
+
+
+class Command(BaseCommand):
+    help = (
+        "Stores the spooled files of processing posts that no worker is uploading"
+        " anymore, e.g. after a restart, and publishes the posts"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retry-failed",
+            action="store_true",
+            help="Also retry the files of posts whose upload failed",
+        )
+
+    def handle(self, *args, **options):
+        upload_settings = settings.MEDIA_UPLOAD_SETTINGS
+        backend = import_string(upload_settings["BACKEND"])(upload_settings)
+
+        if options["retry_failed"]:
+            Post.all_objects.filter(
+                status=Post.Status.FAILED, uploads__isnull=False
+            ).update(status=Post.Status.PROCESSING)
+
+        processing = MediaUpload.objects.filter(post__status=Post.Status.PROCESSING)
+        stored = failed = 0
+        for upload in processing.filter(stored_name="").order_by("id"):
+            if store(
+                upload,
+                backend,
+                upload_settings.get("MAX_ATTEMPTS", 3),
+                upload_settings.get("RETRY_DELAY", 2),
+            ):
+                stored += 1
+            else:
+                failed += 1
+
+        # Posts whose last file was stored right before their worker stopped
+        for post_id in processing.values_list("post_id", flat=True).distinct():
+            publish(post_id)
+
+        self.stdout.write(self.style.SUCCESS(f"Stored {stored} files, {failed} failed"))
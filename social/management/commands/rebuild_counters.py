@@ -0,0 +1,72 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from hitcount.models import HitCount
+
+from likes.models import Like
+from social.models import Comment, Post
+from users.models import Profile, UserWatching
+
+
+def count_subquery(queryset, field):
+    """
+    Correlated `COUNT(*)` of `queryset` grouped on `field`, matched against the outer row's pk
+    """
+    counts = (
+        queryset.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(total=Count("*"))
+        .values("total")
+    )
+    return Coalesce(
+        Subquery(counts, output_field=IntegerField()),
+        Value(0),
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalculates the stored like/comment/view counters on Posts and Comments"
+        " and the watcher/watching counters on Profiles"
+    )
+
+    def handle(self, *args, **options):
+        post_type = ContentType.objects.get_for_model(Post)
+        comment_type = ContentType.objects.get_for_model(Comment)
+
+        with transaction.atomic():
+            posts = Post.all_objects.update(
+                like_count=count_subquery(
+                    Like.objects.filter(content_type=post_type), "object_id"
+                ),
+                comment_count=count_subquery(Comment.objects.all(), "post_id"),
+                view_count=Coalesce(
+                    Subquery(
+                        HitCount.objects.filter(
+                            content_type=post_type, object_pk=OuterRef("pk")
+                        ).values("hits")[:1]
+                    ),
+                    Value(0),
+                ),
+            )
+            comments = Comment.objects.update(
+                like_count=count_subquery(
+                    Like.objects.filter(content_type=comment_type), "object_id"
+                ),
+            )
+            profiles = Profile.objects.update(
+                watchers_count=count_subquery(
+                    UserWatching.objects.all(), "watching_user_id"
+                ),
+                watching_count=count_subquery(UserWatching.objects.all(), "user_id"),
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt counters for {posts} posts, {comments} comments"
+                f" and {profiles} profiles"
+            )
+        )
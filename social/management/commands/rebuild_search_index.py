@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from social.models import Post
+from social.search import is_supported, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the full-text search index of posts from scratch"
+
+    def handle(self, *args, **options):
+        if not is_supported():
+            self.stdout.write(
+                self.style.WARNING("This database has no full-text index to rebuild")
+            )
+            return
+
+        with transaction.atomic():
+            rebuild_index()
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Indexed {Post.objects.count()} posts for search")
+        )
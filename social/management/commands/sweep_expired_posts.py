@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from social.expiry import sweep
+
+
+class Command(BaseCommand):
+    help = "Deletes expired posts with their pictures, videos, comments and likes, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Posts deleted per transaction, defaults to POST_EXPIRY_SETTINGS",
+        )
+        parser.add_argument(
+            "--loop",
+            type=float,
+            default=None,
+            help="Keep sweeping every LOOP seconds instead of sweeping once",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            swept = sweep(batch_size=options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(f"Deleted {swept} expired posts"))
+
+            if options["loop"] is None:
+                break
+            time.sleep(options["loop"])
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from social.trending import update
+
+
+class Command(BaseCommand):
+    help = "Scores the recent likes, comments and views of posts for /posts/trending"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            type=float,
+            default=None,
+            help="Keep scoring every LOOP seconds instead of scoring once",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            rescored = update()
+            self.stdout.write(self.style.SUCCESS(f"Rescored {rescored} posts"))
+
+            if options["loop"] is None:
+                break
+            time.sleep(options["loop"])
@@ -0,0 +1,260 @@
+"""
+Background uploads of the files attached to new posts.
+
+Creating a post only spools its pictures, videos and voice recording to local disk and
+records a MediaUpload per file, the post is saved as `processing` and returned straight
+away. A pool of CONCURRENCY worker threads then puts the spooled files into storage,
+retrying a failed attempt after RETRY_DELAY, 2 * RETRY_DELAY, ... seconds. Once every file
+of a post is stored its Picture and Video rows are created in the order they were sent and
+the post is `published`, a file still failing after MAX_ATTEMPTS marks the post `failed`.
+Pictures also get their resized renditions here, see social/images.py.
+
+Files are stored by MEDIA_UPLOAD_SETTINGS["BACKEND"]: `FieldStorage` uses the storage of
+the model field (Cloudinary), `LocalMediaStorage` a local directory so the pipeline runs
+offline. Uploads a restarted worker left behind are finished by `manage.py process_uploads`.
+"""
+
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import close_old_connections, transaction
+from django.utils.module_loading import import_string
+
+from .images import render_variants, strip_exif
+from .models import MediaUpload, Picture, Post, Video
+from .timeline import fan_out_post
+
+LOGGER = logging.getLogger(__name__)
+
+# The model field the files of each kind of upload are stored for
+FIELDS = {
+    MediaUpload.Kind.PICTURE: (Picture, "image"),
+    MediaUpload.Kind.VIDEO: (Video, "clip"),
+    MediaUpload.Kind.VOICE_RECORDING: (Post, "voice_recording"),
+}
+
+
+class FieldStorage:
+    """Stores files with the storage configured on their model field"""
+
+    def __init__(self, options):
+        pass
+
+    def save(self, field, name, content):
+        """Stores `content` for `field` and returns the name to put in the field"""
+        name = field.generate_filename(None, name)
+        return field.storage.save(name, content, max_length=field.max_length)
+
+    def delete(self, field, name):
+        field.storage.delete(name)
+
+
+class LocalMediaStorage(FieldStorage):
+    """Stores every file under options["LOCATION"], for development and tests"""
+
+    def __init__(self, options):
+        self.storage = FileSystemStorage(location=options.get("LOCATION"))
+
+    def save(self, field, name, content):
+        name = field.generate_filename(None, name)
+        return self.storage.save(name, content, max_length=field.max_length)
+
+    def delete(self, field, name):
+        self.storage.delete(name)
+
+
+def spool(kind, file):
+    """Writes an uploaded file to the spool directory, returns its unsaved MediaUpload"""
+    directory = Path(settings.MEDIA_UPLOAD_SETTINGS["SPOOL_DIR"])
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{uuid4().hex}{Path(file.name).suffix}"
+
+    if hasattr(file, "temporary_file_path"):
+        # Large uploads are on disk already, Django copes with them being moved
+        shutil.move(file.temporary_file_path(), path)
+    else:
+        with open(path, "wb") as spooled:
+            for chunk in file.chunks():
+                spooled.write(chunk)
+
+    return MediaUpload(kind=kind, spool_path=str(path), name=file.name)
+
+
+def stored_files(post_ids):
+    """(field, name) of every stored file of the posts, picture renditions included"""
+    picture = Picture._meta.get_field("image")
+    video = Video._meta.get_field("clip")
+    recording = Post._meta.get_field("voice_recording")
+
+    files = []
+    pictures = Picture.objects.filter(post_id__in=post_ids)
+    for name, variants in pictures.values_list("image", "variants"):
+        files.append((picture, name))
+        for rendition in variants.get("renditions", []):
+            files += [
+                (picture, value)
+                for key, value in rendition.items()
+                if key not in ("width", "height")
+            ]
+
+    videos = Video.objects.filter(post_id__in=post_ids).values_list("clip", flat=True)
+    files += [(video, name) for name in videos]
+    recordings = Post.all_objects.filter(id__in=post_ids).values_list(
+        "voice_recording", flat=True
+    )
+    files += [(recording, name) for name in recordings]
+    return [(field, name) for field, name in files if name]
+
+
+def delete_files(files):
+    """Removes stored files from the storage they were saved to, logging failures"""
+    backend = get_upload_pool().backend
+    for field, name in files:
+        try:
+            backend.delete(field, name)
+        except Exception:
+            LOGGER.warning("Deleting stored file %s failed", name, exc_info=True)
+
+
+def discard(uploads):
+    """Removes the spooled files of uploads that will not be processed"""
+    for upload in uploads:
+        try:
+            os.remove(upload.spool_path)
+        except FileNotFoundError:
+            pass
+
+
+def store(upload, backend, max_attempts=3, retry_delay=2):
+    """
+    Puts the spooled file of `upload` into storage, publishes its post when it was the
+    last one. Returns whether the file was stored.
+    """
+    model, field_name = FIELDS[upload.kind]
+    field = model._meta.get_field(field_name)
+
+    for attempt in range(max_attempts):
+        upload.attempts += 1
+        try:
+            upload.variants = {}
+            if upload.kind == MediaUpload.Kind.PICTURE:
+                strip_exif(upload.spool_path)
+                upload.variants = render_variants(
+                    upload.spool_path,
+                    upload.name,
+                    lambda name, content: backend.save(field, name, content),
+                )
+
+            with open(upload.spool_path, "rb") as spooled:
+                content = File(spooled, name=upload.name)
+                upload.stored_name = backend.save(field, upload.name, content)
+            break
+        except Exception:
+            LOGGER.warning(
+                "Upload %s of post %s failed", upload.pk, upload.post_id, exc_info=True
+            )
+            if attempt + 1 < max_attempts:
+                time.sleep(retry_delay * 2**attempt)
+
+    upload.save(update_fields=["stored_name", "variants", "attempts"])
+    if not upload.stored_name:
+        set_status(upload.post_id, Post.Status.FAILED)
+        return False
+
+    discard([upload])
+    publish(upload.post_id)
+    return True
+
+
+def set_status(post_id, status):
+    post = Post.all_objects.get(pk=post_id)
+    post.status = status
+    # Saved rather than updated so post_save expires the cached pages showing it
+    post.save(update_fields=["status", "date_updated"])
+
+
+def publish(post_id):
+    """Attaches the stored files and publishes the post, once all of them are stored"""
+    with transaction.atomic():
+        uploads = list(MediaUpload.objects.filter(post_id=post_id).order_by("id"))
+        if any(not upload.stored_name for upload in uploads):
+            return False
+
+        # Of several workers storing the last files at once only one gets past this
+        published = Post.all_objects.filter(
+            pk=post_id, status=Post.Status.PROCESSING
+        ).update(status=Post.Status.PUBLISHED)
+        if not published:
+            return False
+
+        stored = {kind: [] for kind in MediaUpload.Kind}
+        for upload in uploads:
+            stored[upload.kind].append(upload.stored_name)
+
+        Picture.objects.bulk_create(
+            Picture(post_id=post_id, image=upload.stored_name, variants=upload.variants)
+            for upload in uploads
+            if upload.kind == MediaUpload.Kind.PICTURE
+        )
+        Video.objects.bulk_create(
+            Video(post_id=post_id, clip=name) for name in stored[MediaUpload.Kind.VIDEO]
+        )
+        MediaUpload.objects.filter(post_id=post_id).delete()
+
+        post = Post.all_objects.select_related("profile").get(pk=post_id)
+        for name in stored[MediaUpload.Kind.VOICE_RECORDING]:
+            post.voice_recording = name
+        post.save(update_fields=["voice_recording", "status", "date_updated"])
+        # Watchers only get the post in their feeds once its files are there
+        transaction.on_commit(lambda: fan_out_post(post))
+    return True
+
+
+class UploadPool:
+    """Stores spooled uploads from a bounded pool of threads of this worker"""
+
+    def __init__(self, options):
+        self.backend = import_string(options["BACKEND"])(options)
+        self.max_attempts = options.get("MAX_ATTEMPTS", 3)
+        self.retry_delay = options.get("RETRY_DELAY", 2)
+        self.executor = ThreadPoolExecutor(
+            max_workers=options.get("CONCURRENCY", 4),
+            thread_name_prefix="media-upload",
+        )
+
+    def submit(self, post_id):
+        """Queues the files of `post_id` that are not stored yet"""
+        pending = MediaUpload.objects.filter(post_id=post_id, stored_name="")
+        for upload_id in pending.values_list("id", flat=True):
+            self.executor.submit(self.run, upload_id)
+
+    def run(self, upload_id):
+        close_old_connections()
+        try:
+            upload = MediaUpload.objects.get(pk=upload_id)
+            store(upload, self.backend, self.max_attempts, self.retry_delay)
+        except Exception:
+            LOGGER.error("Processing upload %s failed", upload_id, exc_info=True)
+        finally:
+            close_old_connections()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_upload_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = UploadPool(settings.MEDIA_UPLOAD_SETTINGS)
+    return _pool
@@ -0,0 +1,183 @@
+"""
+Per viewer `liked_by_me` / `bookmarked_by_me` flags.
+
+Flags are resolved for a whole page at once, by uid, with one join against Like or
+Bookmark per flag. Cached pages are shared between viewers, so they are stored without
+flags and `apply_viewer_flags` adds them to the rendered results on every request.
+
+With MEMBERSHIP_CACHE_SETTINGS["ENABLED"] the full set of uids a user liked or bookmarked
+is also kept in the cache, as long as it has at most MAX_SIZE members, and pages of
+those users are flagged without a query. The sets are tagged `likes:user:<user_id>` and
+`bookmarks:user:<user_id>` (see utils/cache.py) and expired whenever that user's likes
+or bookmarks change.
+"""
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from likes.models import Like
+from utils.cache import (
+    aget_cached,
+    aset_cached,
+    atag_clock,
+    get_cached,
+    invalidate_tags,
+    set_cached,
+    tag_clock,
+)
+
+from .models import Post
+
+# Cached in place of a membership set that is too large to be worth caching
+TOO_LARGE = "too-large"
+
+
+def likes_tag(user_id):
+    return f"likes:user:{user_id}"
+
+
+def bookmarks_tag(user_id):
+    return f"bookmarks:user:{user_id}"
+
+
+def is_enabled():
+    return settings.MEMBERSHIP_CACHE_SETTINGS.get("ENABLED", False)
+
+
+def invalidate_likes(*user_ids):
+    if is_enabled():
+        invalidate_tags(*(likes_tag(user_id) for user_id in user_ids))
+
+
+def invalidate_bookmarks(*user_ids):
+    if is_enabled():
+        invalidate_tags(*(bookmarks_tag(user_id) for user_id in user_ids))
+
+
+def liked(model, user_id):
+    return model.objects.filter(likes__user_id=user_id)
+
+
+def bookmarked(model, user_id):
+    return model.objects.filter(bookmark__user_id=user_id)
+
+
+def cached_members(members, key, tag):
+    """Every uid in `members`, from the cache when enabled, or None when not cached"""
+    if not is_enabled():
+        return None
+
+    options = settings.MEMBERSHIP_CACHE_SETTINGS
+    cached = get_cached(key)
+    if cached is None:
+        clock = tag_clock()
+        uids = members.values_list("uid", flat=True)[: options["MAX_SIZE"] + 1]
+        uids = {str(uid) for uid in uids}
+        cached = uids if len(uids) <= options["MAX_SIZE"] else TOO_LARGE
+        set_cached(key, cached, [tag], options["TIMEOUT"], clock)
+
+    return None if cached == TOO_LARGE else cached
+
+
+def member_uids(members, uids, key, tag):
+    """The subset of `uids` in the `members` queryset"""
+    if not uids:
+        return set()
+
+    if (cached := cached_members(members, key, tag)) is not None:
+        return {str(uid) for uid in uids} & cached
+
+    return {
+        str(uid) for uid in members.filter(uid__in=uids).values_list("uid", flat=True)
+    }
+
+
+async def acached_members(members, key, tag):
+    if not is_enabled():
+        return None
+
+    options = settings.MEMBERSHIP_CACHE_SETTINGS
+    cached = await aget_cached(key)
+    if cached is None:
+        clock = await atag_clock()
+        uids = members.values_list("uid", flat=True)[: options["MAX_SIZE"] + 1]
+        uids = {str(uid) async for uid in uids}
+        cached = uids if len(uids) <= options["MAX_SIZE"] else TOO_LARGE
+        await aset_cached(key, cached, [tag], options["TIMEOUT"], clock)
+
+    return None if cached == TOO_LARGE else cached
+
+
+async def amember_uids(members, uids, key, tag):
+    if not uids:
+        return set()
+
+    if (cached := await acached_members(members, key, tag)) is not None:
+        return {str(uid) for uid in uids} & cached
+
+    members = members.filter(uid__in=uids).values_list("uid", flat=True)
+    return {str(uid) async for uid in members}
+
+
+def liked_uids(model, user_id, uids):
+    key = f"membership:likes:{model._meta.model_name}:{user_id}"
+    return member_uids(liked(model, user_id), uids, key, likes_tag(user_id))
+
+
+def bookmarked_uids(user_id, uids):
+    key = f"membership:bookmarks:{user_id}"
+    return member_uids(bookmarked(Post, user_id), uids, key, bookmarks_tag(user_id))
+
+
+async def aliked_uids(model, user_id, uids):
+    key = f"membership:likes:{model._meta.model_name}:{user_id}"
+    return await amember_uids(liked(model, user_id), uids, key, likes_tag(user_id))
+
+
+async def abookmarked_uids(user_id, uids):
+    key = f"membership:bookmarks:{user_id}"
+    return await amember_uids(
+        bookmarked(Post, user_id), uids, key, bookmarks_tag(user_id)
+    )
+
+
+def get_viewer(context):
+    """The user_id flags are resolved for, None renders every flag as False"""
+    if "viewer" in context:
+        return context["viewer"]
+    request = context.get("request")
+    return getattr(request, "user_id", None)
+
+
+def apply_viewer_flags(results, model, user_id):
+    """Sets the flags of `user_id` on rendered Post or Comment results, in place"""
+    uids = [result["id"] for result in results]
+    liked = liked_uids(model, user_id, uids) if user_id else set()
+    for result in results:
+        result["liked_by_me"] = str(result["id"]) in liked
+
+    if model is Post:
+        bookmarked = bookmarked_uids(user_id, uids) if user_id else set()
+        for result in results:
+            result["bookmarked_by_me"] = str(result["id"]) in bookmarked
+    return results
+
+
+async def aapply_viewer_flags(results, model, user_id):
+    """`apply_viewer_flags` for async views"""
+    uids = [result["id"] for result in results]
+    liked = await aliked_uids(model, user_id, uids) if user_id else set()
+    for result in results:
+        result["liked_by_me"] = str(result["id"]) in liked
+
+    if model is Post:
+        bookmarked = await abookmarked_uids(user_id, uids) if user_id else set()
+        for result in results:
+            result["bookmarked_by_me"] = str(result["id"]) in bookmarked
+    return results
+
+
+@receiver([post_save, post_delete], sender=Like)
+def like_changed(sender, instance, **kwargs):
+    invalidate_likes(instance.user_id)
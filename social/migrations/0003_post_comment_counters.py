@@ -0,0 +1,61 @@
+# Generated by Django 4.2.6 on 2026-10-17 00:11
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_rows(queryset, field):
+    counts = (
+        queryset.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(total=Count("*"))
+        .values("total")
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def backfill(apps, schema_editor):
+    """The UPDATEs of `manage.py rebuild_counters`, for the rows already stored"""
+    Post = apps.get_model("social", "Post")
+    Comment = apps.get_model("social", "Comment")
+    Like = apps.get_model("likes", "Like")
+
+    def likes_of(model):
+        return Like.objects.filter(
+            content_type__app_label="social", content_type__model=model
+        )
+
+    Post.objects.update(
+        like_count=count_rows(likes_of("post"), "object_id"),
+        comment_count=count_rows(Comment.objects.all(), "post_id"),
+    )
+    Comment.objects.update(like_count=count_rows(likes_of("comment"), "object_id"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social', '0002_alter_post_content'),
+        ('likes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
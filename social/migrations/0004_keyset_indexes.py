@@ -0,0 +1,25 @@
+# Generated by Django 4.2.6 on 2026-10-17 00:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social', '0003_post_comment_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'date_created', 'id'], name='social_comm_post_id_9335f1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-date_created', '-id'], name='social_post_date_cr_2dee4d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['profile', '-date_created', '-id'], name='social_post_profile_1efb5e_idx'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+from django.db import migrations
+
+SQLITE_TABLE = """
+    CREATE VIRTUAL TABLE social_post_search
+    USING fts5(body, author, tokenize = 'porter unicode61')
+"""
+
+POSTGRES_TABLE = """
+    CREATE TABLE social_post_search (
+        post_id bigint PRIMARY KEY REFERENCES social_post (id)
+            ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+        document tsvector NOT NULL
+    );
+    CREATE INDEX social_post_search_document ON social_post_search USING GIN (document)
+"""
+
+# The rows social.search writes, as of this migration
+SQLITE_FILL = """
+    INSERT INTO social_post_search (rowid, body, author)
+    SELECT post.id, COALESCE(post.content, ''),
+           profile.username || ' ' || profile.name || ' ' || profile.user_id
+    FROM social_post post JOIN users_profile profile ON profile.id = post.profile_id
+"""
+
+POSTGRES_FILL = """
+    INSERT INTO social_post_search (post_id, document)
+    SELECT post.id,
+           setweight(to_tsvector('english', COALESCE(post.content, '')), 'A')
+           || setweight(to_tsvector('simple', profile.username || ' ' || profile.name
+                                              || ' ' || profile.user_id::text), 'B')
+    FROM social_post post JOIN users_profile profile ON profile.id = post.profile_id
+"""
+
+
+def create_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(SQLITE_TABLE)
+        schema_editor.execute(SQLITE_FILL)
+    elif vendor == 'postgresql':
+        schema_editor.execute(POSTGRES_TABLE)
+        schema_editor.execute(POSTGRES_FILL)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute('DROP TABLE social_post_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social', '0005_post_view_count'),
+        ('users', '0006_watch_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.6 on 2026-10-17 02:10
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_bookmarks(apps, schema_editor):
+    Bookmark = apps.get_model('social', 'Bookmark')
+    duplicates = (
+        Bookmark.objects.values('user_id', 'post_id')
+        .annotate(total=Count('id'), keep=Min('id'))
+        .filter(total__gt=1)
+    )
+    for duplicate in duplicates:
+        Bookmark.objects.filter(
+            user_id=duplicate['user_id'], post_id=duplicate['post_id']
+        ).exclude(id=duplicate['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social', '0006_post_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookmark',
+            name='date_created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(remove_duplicate_bookmarks, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='bookmark',
+            constraint=models.UniqueConstraint(fields=('user_id', 'post'), name='unique_bookmarks'),
+        ),
+        migrations.AddIndex(
+            model_name='bookmark',
+            index=models.Index(fields=['user_id', '-date_created', '-id'], name='social_book_user_id_45b497_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.6 on 2026-10-17 00:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social', '0008_unique_uids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='status',
+            field=models.CharField(choices=[('processing', 'Processing'), ('published', 'Published'), ('failed', 'Failed')], default='published', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='MediaUpload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('picture', 'Picture'), ('video', 'Video'), ('voice_recording', 'Voice Recording')], max_length=20)),
+                ('spool_path', models.CharField(max_length=500)),
+                ('name', models.CharField(max_length=255)),
+                ('stored_name', models.CharField(blank=True, max_length=255)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='uploads', to='social.post')),
+            ],
+        ),
+    ]
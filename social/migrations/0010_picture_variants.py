@@ -0,0 +1,23 @@
+# Generated by Django 4.2.6 on 2026-10-17 00:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social', '0009_post_status_media_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediaupload',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='picture',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
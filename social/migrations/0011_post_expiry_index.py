@@ -0,0 +1,17 @@
+# Generated by Django 4.2.6 on 2026-10-17 00:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social', '0010_picture_variants'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('expiry__isnull', False)), fields=['expiry'], name='social_post_expiry_idx'),
+        ),
+    ]
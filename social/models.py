@@ -7,6 +7,8 @@ from cloudinary_storage.storage import (
 from cloudinary_storage.validators import validate_video
 from django.contrib.contenttypes.fields import GenericRelation
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
 from hitcount.models import (  # This will add a reverse lookup from HitCount Model
     HitCount,
     HitCountMixin,
@@ -24,8 +26,40 @@ class BaseModel(models.Model):
         abstract = True
 
 
+class PostQuerySet(models.QuerySet):
+    def live(self):
+        return self.filter(Q(expiry__isnull=True) | Q(expiry__gt=timezone.now()))
+
+    def expired(self):
+        return self.filter(expiry__lte=timezone.now())
+
+    def published(self):
+        return self.filter(status=self.model.Status.PUBLISHED)
+
+    def visible_to(self, user_id):
+        """Published posts, and the posts of `user_id` whatever their status"""
+        condition = Q(status=self.model.Status.PUBLISHED)
+        if user_id:
+            condition |= Q(profile__user_id=user_id)
+        return self.filter(condition)
+
+
+class LivePostManager(models.Manager.from_queryset(PostQuerySet)):
+    """Leaves out expired posts, so no query through `Post.objects` shows them"""
+
+    def get_queryset(self):
+        return super().get_queryset().live()
+
+
 class Post(BaseModel, HitCountMixin):
-    uid = models.UUIDField(default=uuid4, editable=False)
+    class Status(models.TextChoices):
+        # Files of the post are still being uploaded, see social/media.py
+        PROCESSING = "processing"
+        PUBLISHED = "published"
+        FAILED = "failed"
+
+    # Every route addresses posts by uid, comments are joined on it
+    uid = models.UUIDField(default=uuid4, editable=False, unique=True)
 
     content = models.TextField(null=True, blank=True)
     voice_recording = models.ImageField(
@@ -36,14 +70,37 @@ class Post(BaseModel, HitCountMixin):
     )
     expiry = models.DateTimeField(null=True)
     likes = GenericRelation(Like)
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    # Flushed in batches by social.hits, HitCount holds the same total
+    view_count = models.PositiveIntegerField(default=0)
     profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name="posts")
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.PUBLISHED
+    )
 
     views = GenericRelation(
         HitCount, object_id_field="object_pk", related_query_name="views_relation"
     )
 
+    objects = LivePostManager()
+    # Expired posts included, for the sweeper and jobs writing to posts by pk
+    all_objects = PostQuerySet.as_manager()
+
     class Meta:
         ordering = ["-date_created"]
+        indexes = [
+            # Back the (date_created, id) keyset pagination of social.pagination
+            models.Index(fields=["-date_created", "-id"]),
+            models.Index(fields=["profile", "-date_created", "-id"]),
+            # Only the few posts with an expiry are indexed, the sweeper walks them
+            # oldest first and pages check the next one to expire
+            models.Index(
+                fields=["expiry"],
+                condition=Q(expiry__isnull=False),
+                name="social_post_expiry_idx",
+            ),
+        ]
 
     def __str__(self):
 
@@ -53,19 +110,11 @@ class Post(BaseModel, HitCountMixin):
     # def views(self):
     #     return self.hit_count.hits
 
-    @property
-    def like_count(self):
-        return self.likes.count()
-
-    @property
-    def comment_count(self):
-        if self.comments:
-            return self.comments.count()
-        return None
-
 
 class Picture(BaseModel):
     image = models.ImageField(upload_to="images/", blank=True, null=True)
+    # Renditions and placeholder made at upload time, see social/images.py
+    variants = models.JSONField(default=dict, blank=True)
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="pictures")
 
 
@@ -80,8 +129,27 @@ class Video(BaseModel):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="videos")
 
 
+class MediaUpload(models.Model):
+    """A file of a processing post, spooled to local disk until a worker stores it"""
+
+    class Kind(models.TextChoices):
+        PICTURE = "picture"
+        VIDEO = "video"
+        VOICE_RECORDING = "voice_recording"
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="uploads")
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    spool_path = models.CharField(max_length=500)
+    name = models.CharField(max_length=255)
+    # Set once the file is in storage, the post is published when all of them are
+    stored_name = models.CharField(max_length=255, blank=True)
+    variants = models.JSONField(default=dict, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    date_created = models.DateTimeField(auto_now_add=True)
+
+
 class Comment(BaseModel):
-    uid = models.UUIDField(default=uuid4, editable=False)
+    uid = models.UUIDField(default=uuid4, editable=False, unique=True)
     content = models.TextField()
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="comments")
 
@@ -93,12 +161,40 @@ class Comment(BaseModel):
     date_updated = models.DateTimeField(auto_now=True)
 
     likes = GenericRelation(Like)
+    like_count = models.PositiveIntegerField(default=0)
 
-    @property
-    def like_count(self):
-        return self.likes.count()
+    class Meta:
+        # Keyset pages of a post's comments, see CommentPagination
+        indexes = [models.Index(fields=["post", "date_created", "id"])]
 
 
 class Bookmark(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE)
     user_id = models.UUIDField()
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user_id", "post"], name="unique_bookmarks")
+        ]
+        indexes = [
+            # Keyset pages of a user's bookmarks, most recently saved first
+            models.Index(fields=["user_id", "-date_created", "-id"]),
+        ]
+
+
+class TrendingScore(models.Model):
+    """Time-decayed activity score of a recent post, kept up to date by social/trending.py"""
+
+    post = models.OneToOneField(
+        Post, on_delete=models.CASCADE, primary_key=True, related_name="trending"
+    )
+    score = models.FloatField()
+    # The counters of the post as of the last scoring, only growth beyond them scores
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    view_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # Pages of /posts/trending, highest score first
+        indexes = [models.Index(fields=["-score", "-post"])]
@@ -1,4 +1,262 @@
+from datetime import datetime
+
+from django.db.models import Q
+from django.http import StreamingHttpResponse
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import Cursor
+
+from utils.renderers import ORJSONRenderer
+
+
+class KeysetPagination(pagination.CursorPagination):
+    """
+    Cursor pagination keyed on `(date_created, id)`.
+
+    Unlike PageNumberPagination there is no `COUNT(*)` and no `OFFSET`, each page is a
+    `WHERE (date_created, id) < (last_date, last_id)` lookup served from a matching composite
+    index, so deep pages cost the same as the first one and rows inserted while a client is
+    scrolling never shift or repeat items.
+    """
+
+    page_size = 10
+    ordering = "-date_created"
+    tie_breaker = "id"
+
+    def decode_cursor(self, request):
+        try:
+            return super().decode_cursor(request)
+        except NotFound:
+            raise self.invalid_cursor()
+
+    def invalid_cursor(self):
+        # A client error rather than a missing page, so 400 instead of DRF's 404
+        return ValidationError({self.cursor_query_param: [self.invalid_cursor_message]})
+
+    def get_ordering(self, request, queryset, view):
+        direction = "-" if self.ordering.startswith("-") else ""
+        return (self.ordering, f"{direction}{self.tie_breaker}")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page = self.get_page_queryset(queryset, request, view)
+        if page is None:
+            return None
+
+        # One extra row tells us whether there is a further page, no count required
+        results = list(page)
+        self.page = results[: self.page_size]
+        if self.reverse:
+            self.page.reverse()
+
+        self.set_positions(self.page, has_more=len(results) > self.page_size)
+        return self.page
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """The unevaluated queryset for the requested page, with one row of lookahead"""
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering_fields = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+
+        self.reverse = bool(self.cursor and self.cursor.reverse)
+        ordering = self.ordering_fields
+        if self.reverse:
+            ordering = tuple(self._flip(field) for field in ordering)
+
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None:
+            queryset = queryset.filter(self._after(ordering, self.cursor.position))
+
+        return queryset[: self.page_size + 1]
+
+    def set_positions(self, page, has_more):
+        if self.reverse:
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+
+        fallback = self.cursor.position if self.cursor else None
+        self.previous_position = self._position(page[0]) if page else fallback
+        self.next_position = self._position(page[-1]) if page else fallback
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        cursor = Cursor(offset=0, reverse=False, position=self.next_position)
+        return self.encode_cursor(cursor)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        cursor = Cursor(offset=0, reverse=True, position=self.previous_position)
+        return self.encode_cursor(cursor)
+
+    def get_streaming_response(self, queryset, request, serialize, view=None):
+        """
+        Same payload as `get_paginated_response`, but rows are read from a server side cursor
+        and written out one at a time instead of being built into a list first. The links
+        are only known once the last row has been read, so they follow the results.
+        """
+        page = self.get_page_queryset(queryset, request, view)
+
+        def stream():
+            writer = PageWriter(self, serialize)
+            rows = page.iterator(chunk_size=self.page_size + 1)
+            if self.reverse:
+                rows = writer.buffer(list(rows))
+
+            yield writer.head()
+            for row in rows:
+                if (chunk := writer.row(row)) is None:
+                    break
+                yield chunk
+            yield writer.tail()
+
+        return StreamingHttpResponse(stream(), content_type="application/json")
+
+    def get_async_streaming_response(self, queryset, request, serialize, view=None):
+        """`get_streaming_response` for async views, rows come from the async ORM"""
+        page = self.get_page_queryset(queryset, request, view)
+
+        async def stream():
+            writer = PageWriter(self, serialize)
+            rows = page.aiterator(chunk_size=self.page_size + 1)
+            if self.reverse:
+                rows = writer.buffer([row async for row in rows])
+
+                yield writer.head()
+                for row in rows:
+                    yield writer.row(row)
+            else:
+                yield writer.head()
+                async for row in rows:
+                    if (chunk := writer.row(row)) is None:
+                        break
+                    yield chunk
+            yield writer.tail()
+
+        return StreamingHttpResponse(stream(), content_type="application/json")
+
+    def _flip(self, field):
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    def format_value(self, value):
+        """How the ordering field's value is written into a cursor"""
+        return value.isoformat()
+
+    def parse_value(self, value):
+        return datetime.fromisoformat(value)
+
+    def _position(self, instance):
+        field, tie_breaker = (field.lstrip("-") for field in self.ordering_fields)
+        if isinstance(instance, dict):
+            # A `.values()` row
+            value, tie_value = instance[field], instance[tie_breaker]
+        else:
+            value, tie_value = getattr(instance, field), getattr(instance, tie_breaker)
+        return f"{self.format_value(value)}|{tie_value}"
+
+    def _after(self, ordering, position):
+        """The rows that come after `position` when the queryset is sorted by `ordering`"""
+        try:
+            value, tie_value = position.rsplit("|", 1)
+            value, tie_value = self.parse_value(value), int(tie_value)
+        except (AttributeError, ValueError):
+            raise self.invalid_cursor()
+
+        field, tie_breaker = ordering
+        lookup = "lt" if field.startswith("-") else "gt"
+        field, tie_breaker = field.lstrip("-"), tie_breaker.lstrip("-")
+
+        return Q(**{f"{field}__{lookup}": value}) | Q(
+            **{field: value, f"{tie_breaker}__{lookup}": tie_value}
+        )
+
+
+class PageWriter:
+    """
+    Writes a page out row by row, for the streaming responses of KeysetPagination. Rows
+    and links are rendered like the body of a regular response, by ORJSONRenderer.
+    """
+
+    renderer = ORJSONRenderer()
+
+    def __init__(self, paginator, serialize):
+        self.paginator = paginator
+        self.serialize = serialize
+        self.first = self.last = None
+        self.count = 0
+        self.has_more = False
+
+    def buffer(self, rows):
+        """Backwards pages come out of the database flipped, only these are buffered"""
+        self.has_more = len(rows) > self.paginator.page_size
+        return rows[: self.paginator.page_size][::-1]
+
+    def head(self):
+        return b'{"results":['
+
+    def row(self, row):
+        """The bytes of `row`, None once the page is full"""
+        if self.count == self.paginator.page_size:
+            self.has_more = True
+            return None
+
+        data = self.renderer.render(self.serialize(row))
+        chunk = (b"," if self.count else b"") + data
+        self.first = row if self.first is None else self.first
+        self.last = row
+        self.count += 1
+        return chunk
+
+    def tail(self):
+        paginator = self.paginator
+        page = [] if self.first is None else [self.first, self.last]
+        paginator.set_positions(page, self.has_more)
+        links = {
+            "next": paginator.get_next_link(),
+            "previous": paginator.get_previous_link(),
+        }
+        return b"]," + self.renderer.render(links)[1:]
+
+
+class PostPagination(KeysetPagination):
+    ordering = "-date_created"
+
+
+class CommentPagination(KeysetPagination):
+    # Conversations read top to bottom, oldest comment first
+    ordering = "date_created"
+
+
+class BookmarkPagination(KeysetPagination):
+    # Keyed on the Bookmark row joined to each post, most recently saved first
+    ordering = "-saved_at"
+    tie_breaker = "bookmark_id"
+
+
+class SearchPagination(KeysetPagination):
+    """Search results, most relevant first, keyed on the rank of social.search.PostSearchFilter"""
+
+    ordering = "-search_rank"
+
+    def format_value(self, value):
+        return repr(value)
+
+    def parse_value(self, value):
+        return float(value)
+
+
+class TrendingPagination(KeysetPagination):
+    """Trending posts, highest score first, keyed on the score of social.trending"""
+
+    ordering = "-trending_score"
+
+    def format_value(self, value):
+        return repr(value)
 
-class PostPagination(pagination.PageNumberPagination):
-    page_size = 10
\ No newline at end of file
+    def parse_value(self, value):
+        return float(value)
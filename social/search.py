@@ -0,0 +1,179 @@
+"""
+Full-text search over post content and author names.
+
+The index lives next to `social_post` in a `social_post_search` table created by migration
+0006: an FTS5 virtual table on SQLite, and a `tsvector` column with a GIN index on Postgres.
+Rows are rewritten from the post and profile tables whenever a post is saved or deleted or
+an author changes their names, and `manage.py rebuild_search_index` rebuilds all of them.
+Any other database falls back to the previous `icontains` search.
+"""
+
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.filters import BaseFilterBackend
+
+from users.models import Profile
+
+from .models import Post
+
+SQLITE_INDEX = """
+    INSERT INTO social_post_search (rowid, body, author)
+    SELECT post.id, COALESCE(post.content, ''),
+           profile.username || ' ' || profile.name || ' ' || profile.user_id
+    FROM social_post post JOIN users_profile profile ON profile.id = post.profile_id
+    WHERE {where}
+"""
+
+POSTGRES_INDEX = """
+    INSERT INTO social_post_search (post_id, document)
+    SELECT post.id,
+           setweight(to_tsvector('english', COALESCE(post.content, '')), 'A')
+           || setweight(to_tsvector('simple', profile.username || ' ' || profile.name
+                                              || ' ' || profile.user_id::text), 'B')
+    FROM social_post post JOIN users_profile profile ON profile.id = post.profile_id
+    WHERE {where}
+    ON CONFLICT (post_id) DO UPDATE SET document = EXCLUDED.document
+"""
+
+UUID_PATTERN = re.compile(r"\b[0-9a-f]{8}(?:-[0-9a-f]{4}){3}-[0-9a-f]{12}\b", re.I)
+
+POSTGRES_QUERY = (
+    "(websearch_to_tsquery('english', %s) || websearch_to_tsquery('simple', %s))"
+)
+
+
+def is_supported():
+    return connection.vendor in ("sqlite", "postgresql")
+
+
+def reindex(where, params=()):
+    """Rewrites the index rows of the posts matching `where`, a condition on `post`"""
+    if not is_supported():
+        return
+
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(
+                "DELETE FROM social_post_search WHERE rowid IN "
+                f"(SELECT post.id FROM social_post post WHERE {where})",
+                params,
+            )
+            cursor.execute(SQLITE_INDEX.format(where=where), params)
+        else:
+            cursor.execute(POSTGRES_INDEX.format(where=where), params)
+
+
+def index_post(post_id):
+    reindex("post.id = %s", [post_id])
+
+
+def index_profile_posts(profile_id):
+    reindex("post.profile_id = %s", [profile_id])
+
+
+def unindex_post(post_id):
+    if not is_supported():
+        return
+
+    column = "rowid" if connection.vendor == "sqlite" else "post_id"
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM social_post_search WHERE {column} = %s", [post_id])
+
+
+def rebuild_index():
+    if not is_supported():
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM social_post_search")
+    reindex("1 = 1")
+
+
+def match_expression(terms):
+    """
+    FTS5 has its own query syntax, so user input is reduced to quoted words.
+    Every word has to match, the last one as a prefix so results show up while typing.
+    Author ids are indexed the way SQLite stores UUIDs, as 32 hex digits, so dashed ids
+    are searched for in that form.
+    """
+    terms = UUID_PATTERN.sub(lambda match: match.group().replace("-", ""), terms)
+    words = re.findall(r"\w+", terms)
+    if not words:
+        return None
+    return " ".join(f'"{word}"' for word in words[:-1]) + f' "{words[-1]}"*'
+
+
+class PostSearchFilter(BaseFilterBackend):
+    """
+    Filters posts on `?search=` through the full-text index and annotates each match with a
+    `search_rank`, higher is more relevant.
+    """
+
+    search_param = "search"
+    fallback_fields = ["content", "profile__user_id", "profile__username"]
+
+    def get_search_terms(self, request):
+        return request.query_params.get(self.search_param, "").strip()
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+
+        if connection.vendor == "sqlite":
+            if (expression := match_expression(terms)) is None:
+                return queryset.none().annotate(
+                    search_rank=Value(0.0, output_field=FloatField())
+                )
+            matches = RawSQL(
+                "SELECT rowid FROM social_post_search WHERE social_post_search MATCH %s",
+                [expression],
+            )
+            # bm25 is lower for better matches, content counts double the author names
+            rank = RawSQL(
+                "SELECT -bm25(social_post_search, 1.0, 0.5) FROM social_post_search"
+                " WHERE social_post_search MATCH %s AND rowid = social_post.id",
+                [expression],
+            )
+        elif connection.vendor == "postgresql":
+            matches = RawSQL(
+                "SELECT post_id FROM social_post_search"
+                f" WHERE document @@ {POSTGRES_QUERY}",
+                [terms, terms],
+            )
+            rank = RawSQL(
+                f"SELECT ts_rank(document, {POSTGRES_QUERY}) FROM social_post_search"
+                " WHERE post_id = social_post.id",
+                [terms, terms],
+            )
+        else:
+            condition = Q()
+            for field in self.fallback_fields:
+                condition |= Q(**{f"{field}__icontains": terms})
+            return queryset.filter(condition)
+
+        return queryset.filter(id__in=matches).annotate(
+            search_rank=RawSQL(f"({rank.sql})", rank.params, output_field=FloatField())
+        )
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, **kwargs):
+    index_post(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    unindex_post(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+def profile_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields and not {"name", "username"} & set(update_fields)):
+        return
+    index_profile_posts(instance.pk)
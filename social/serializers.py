@@ -4,9 +4,55 @@ from likes.models import Like
 from likes.serializers import LikeSerializer
 from users.views import ProfileSerializer
 
+from .membership import bookmarked_uids, get_viewer, liked_uids
 from .models import Bookmark, Comment, Picture, Post, Video
 
 
+def file_urls(model, field_name, post_ids):
+    """{post_id: [url, ...]} of the files of `model` attached to each post, in one query"""
+    field = model._meta.get_field(field_name)
+    urls = {post_id: [] for post_id in post_ids}
+    rows = (
+        model.objects.filter(post_id__in=post_ids)
+        .order_by("id")
+        .values_list("post_id", field_name)
+    )
+    for post_id, name in rows:
+        urls[post_id].append(field.attr_class(None, field, name).url)
+    return urls
+
+
+def picture_variants(name, variants):
+    """A picture's URL with the renditions of social/images.py, smallest first"""
+    field = Picture._meta.get_field("image")
+    url = field.storage.url
+    renditions = []
+    for rendition in variants.get("renditions", []):
+        # Sizes are ints, the formats hold stored names
+        renditions.append(
+            {
+                key: url(value) if isinstance(value, str) else value
+                for key, value in rendition.items()
+            }
+        )
+    return {
+        "url": url(name) if name else None,
+        "width": variants.get("width"),
+        "height": variants.get("height"),
+        "placeholder": variants.get("placeholder"),
+        "renditions": renditions,
+    }
+
+
+def uids(rows):
+    return [row["uid"] for row in rows]
+
+
+def flags(rows, members):
+    """{pk: bool} of whether each row's uid is in `members`"""
+    return {row["id"]: str(row["uid"]) in members for row in rows}
+
+
 class PictureSerializer(serializers.ModelSerializer):
     class Meta:
         model = Picture
@@ -22,7 +68,10 @@ class VideoSerializer(serializers.ModelSerializer):
 class PostSerializer(serializers.ModelSerializer):
     id = serializers.UUIDField(source="uid")
     pictures = serializers.SerializerMethodField()
+    picture_variants = serializers.SerializerMethodField()
     videos = serializers.SerializerMethodField()
+    liked_by_me = serializers.SerializerMethodField()
+    bookmarked_by_me = serializers.SerializerMethodField()
     profile = ProfileSerializer()
 
     class Meta:
@@ -31,20 +80,66 @@ class PostSerializer(serializers.ModelSerializer):
             "id",
             "content",
             "voice_recording",
+            "status",
             "date_created",
             "comment_count",
             "like_count",
+            "view_count",
             "pictures",
+            "picture_variants",
             "videos",
+            "liked_by_me",
+            "bookmarked_by_me",
             "profile",
         ]
 
     def get_pictures(self, obj):
         return [picture.image.url for picture in obj.pictures.all()]
 
+    def get_picture_variants(self, obj):
+        return [
+            picture_variants(picture.image.name, picture.variants)
+            for picture in obj.pictures.all()
+        ]
+
     def get_videos(self, obj):
         return [video.clip.url for video in obj.videos.all()]
 
+    def get_liked_by_me(self, obj):
+        viewer = get_viewer(self.context)
+        return bool(viewer) and str(obj.uid) in liked_uids(Post, viewer, [obj.uid])
+
+    def get_bookmarked_by_me(self, obj):
+        viewer = get_viewer(self.context)
+        return bool(viewer) and str(obj.uid) in bookmarked_uids(viewer, [obj.uid])
+
+    # Page-at-a-time versions of the above for utils.serializers.compile_serializer
+
+    def get_pictures_batch(self, rows):
+        return file_urls(Picture, "image", [row["id"] for row in rows])
+
+    def get_picture_variants_batch(self, rows):
+        variants = {row["id"]: [] for row in rows}
+        pictures = (
+            Picture.objects.filter(post_id__in=variants)
+            .order_by("id")
+            .values_list("post_id", "image", "variants")
+        )
+        for post_id, name, picture in pictures:
+            variants[post_id].append(picture_variants(name, picture))
+        return variants
+
+    def get_videos_batch(self, rows):
+        return file_urls(Video, "clip", [row["id"] for row in rows])
+
+    def get_liked_by_me_batch(self, rows):
+        viewer = get_viewer(self.context)
+        return flags(rows, liked_uids(Post, viewer, uids(rows)) if viewer else set())
+
+    def get_bookmarked_by_me_batch(self, rows):
+        viewer = get_viewer(self.context)
+        return flags(rows, bookmarked_uids(viewer, uids(rows)) if viewer else set())
+
 
 class CreatePostSerializer(serializers.Serializer):
     content = serializers.CharField()
@@ -63,11 +158,27 @@ class CreatePostSerializer(serializers.Serializer):
 
 class CommentSerializer(serializers.ModelSerializer):
     id = serializers.UUIDField(source="uid")
+    liked_by_me = serializers.SerializerMethodField()
     profile = ProfileSerializer()
 
     class Meta:
         model = Comment
-        fields = ["id", "content", "date_created", "like_count", "profile"]
+        fields = [
+            "id",
+            "content",
+            "date_created",
+            "like_count",
+            "liked_by_me",
+            "profile",
+        ]
+
+    def get_liked_by_me(self, obj):
+        viewer = get_viewer(self.context)
+        return bool(viewer) and str(obj.uid) in liked_uids(Comment, viewer, [obj.uid])
+
+    def get_liked_by_me_batch(self, rows):
+        viewer = get_viewer(self.context)
+        return flags(rows, liked_uids(Comment, viewer, uids(rows)) if viewer else set())
 
 
 class AddCommentSerializer(serializers.Serializer):
@@ -82,6 +193,9 @@ class LikePostSerializer(LikeSerializer):
         model = Like
         fields = ["id", "post_id"]
 
+    def get_targets(self):
+        return Post.objects.visible_to(self.context.get("user_id"))
+
 
 class LikeCommentSerializer(LikeSerializer):
     comment_id = serializers.UUIDField(source="object_id")
@@ -91,6 +205,25 @@ class LikeCommentSerializer(LikeSerializer):
         model = Like
         fields = ["id", "comment_id"]
 
+    def get_targets(self):
+        # Post.objects leaves out expired posts, and so their comments
+        posts = Post.objects.visible_to(self.context.get("user_id"))
+        return Comment.objects.filter(post__in=posts)
+
 
 class CreateBookmarkSerializer(serializers.Serializer):
-    post_id = serializers.UUIDField()
+    post_id = serializers.UUIDField(required=False)
+    post_ids = serializers.ListField(
+        child=serializers.UUIDField(), required=False, max_length=500
+    )
+
+    def validate(self, attrs):
+        if "post_id" not in attrs and not attrs.get("post_ids"):
+            raise serializers.ValidationError("Provide a post_id or a list of post_ids")
+        return attrs
+
+
+class DeleteBookmarkSerializer(serializers.Serializer):
+    post_ids = serializers.ListField(
+        child=serializers.UUIDField(), allow_empty=False, max_length=500
+    )
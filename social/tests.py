@@ -1,3 +1,809 @@
-from django.test import TestCase
+import tempfile
+from base64 import b64encode
+from io import StringIO
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+from unittest import mock
 
-# Create your tests here.
+import redis
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from hitcount.models import HitCount
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from likes.models import Like
+from users.models import UserWatching
+from utils.cache import get_cached, invalidate_tags, set_cached, tag_clock, tag_key
+from utils.renderers import ORJSONRenderer
+from utils.serializers import compile_serializer
+from utils.test import client_for, make_profile
+
+from . import images, media, timeline, views
+from . import trending
+from .expiry import sweep
+from .hits import LocalViewCounter
+from .models import Bookmark, Comment, Picture, Post, TrendingScore, Video
+from .serializers import CommentSerializer, PostSerializer
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        self.profile = make_profile("profile")
+        self.post = Post.objects.create(profile=self.profile, content="post")
+        self.client = client_for(self.profile)
+        self.comments = f"/api/v1/posts/{self.post.uid}/comments"
+
+    def counts(self):
+        self.post.refresh_from_db(fields=["like_count", "comment_count"])
+        return self.post.like_count, self.post.comment_count
+
+    def test_comments_move_the_comment_count(self):
+        response = self.client.post(self.comments, {"content": "first"})
+        self.client.post(self.comments, {"content": "second"})
+        self.assertEqual(self.counts(), (0, 2))
+
+        self.client.delete(f"{self.comments}/{response.json()['id']}")
+
+        self.assertEqual(self.counts(), (0, 1))
+
+    def test_like_toggles_move_the_like_counts(self):
+        comment = Comment.objects.create(
+            post=self.post, profile=self.profile, content="comment"
+        )
+
+        self.client.post("/api/v1/like/post", {"post_id": str(self.post.uid)})
+        self.client.post("/api/v1/like/comment", {"comment_id": str(comment.uid)})
+        self.assertEqual(self.counts(), (1, 0))
+        comment.refresh_from_db()
+        self.assertEqual(comment.like_count, 1)
+
+        self.client.post("/api/v1/like/post", {"post_id": str(self.post.uid)})
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_rebuild_counters_recounts_stored_rows(self):
+        comment = Comment.objects.create(
+            post=self.post, profile=self.profile, content="comment"
+        )
+        for model, pk in [(Post, self.post.pk), (Comment, comment.pk)]:
+            Like.objects.create(
+                content_type=ContentType.objects.get_for_model(model),
+                object_id=pk,
+                user_id=self.profile.user_id,
+            )
+        UserWatching.objects.create(
+            user_id=make_profile("watcher"), watching_user_id=self.profile
+        )
+        Post.objects.filter(pk=self.post.pk).update(like_count=5, comment_count=5)
+
+        call_command("rebuild_counters", stdout=StringIO())
+
+        self.assertEqual(self.counts(), (1, 1))
+        comment.refresh_from_db()
+        self.assertEqual(comment.like_count, 1)
+        self.profile.refresh_from_db()
+        self.assertEqual(
+            (self.profile.watchers_count, self.profile.watching_count), (1, 0)
+        )
+
+
+class FeedPagingTests(TestCase):
+    def setUp(self):
+        timeline._timeline = None
+        self.author = make_profile("author")
+        self.viewer = make_profile("viewer")
+        UserWatching.objects.create(user_id=self.viewer, watching_user_id=self.author)
+        self.client = client_for(self.viewer)
+
+    def create_posts(self, count, profile=None):
+        posts = Post.objects.bulk_create(
+            Post(profile=profile or self.author, content=f"post {index}")
+            for index in range(count)
+        )
+        # Created in the same instant, only the ids tell them apart
+        created = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        Post.objects.filter(id__in=[post.id for post in posts]).update(
+            date_created=created
+        )
+        return posts
+
+    def read_feed(self):
+        contents, params = [], {}
+        while True:
+            response = self.client.get("/api/v1/feed", params)
+            self.assertEqual(response.status_code, 200)
+            contents += [post["content"] for post in response.json()["results"]]
+            if response.json()["next"] is None:
+                return contents
+            params = {"before": response.json()["next"]}
+
+    def test_pages_through_posts_with_the_same_timestamp(self):
+        self.create_posts(25)
+
+        contents = self.read_feed()
+
+        self.assertEqual(contents, [f"post {index}" for index in reversed(range(25))])
+
+    def test_merges_pulled_posts_with_the_same_timestamp(self):
+        celebrity = make_profile("celebrity", watchers_count=10)
+        UserWatching.objects.create(user_id=self.viewer, watching_user_id=celebrity)
+        self.create_posts(12)
+        self.create_posts(12, profile=celebrity)
+
+        with mock.patch.object(timeline, "fanout_limit", return_value=5):
+            contents = self.read_feed()
+
+        self.assertEqual(sorted(contents), sorted([f"post {i}" for i in range(12)] * 2))
+
+    def test_rejects_a_malformed_cursor(self):
+        response = self.client.get("/api/v1/feed", {"before": "yesterday"})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_watching_survives_a_timeline_outage(self):
+        other = make_profile("other")
+        failing = mock.Mock(**{"reset.side_effect": redis.ConnectionError})
+
+        with mock.patch.object(timeline, "get_timeline", return_value=failing):
+            response = self.client.post(
+                "/api/v1/watch", {"watching_user_id": str(other.user_id)}
+            )
+            self.assertEqual(response.status_code, 200)
+
+            response = self.client.delete(f"/api/v1/unwatch/{other.user_id}")
+            self.assertEqual(response.status_code, 200)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.profile = make_profile("profile")
+        posts = Post.objects.bulk_create(
+            Post(profile=self.profile, content=f"post {index}") for index in range(25)
+        )
+        # Created in the same instant, only the ids tell them apart
+        Post.objects.filter(id__in=[post.id for post in posts]).update(
+            date_created=datetime(2024, 1, 1, tzinfo=timezone.utc)
+        )
+        self.client = client_for(self.profile)
+
+    def page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return [post["content"] for post in data["results"]], data
+
+    def test_pages_through_posts_with_the_same_timestamp(self):
+        contents, url = [], "/api/v1/posts"
+        while url:
+            page, data = self.page(url)
+            contents += page
+            url = data["next"]
+
+        self.assertEqual(contents, [f"post {index}" for index in reversed(range(25))])
+        self.assertNotIn("count", data)
+
+    def test_previous_links_lead_back(self):
+        first, data = self.page("/api/v1/posts")
+        self.assertIsNone(data["previous"])
+        second, data = self.page(data["next"])
+
+        self.assertEqual(self.page(data["previous"])[0], first)
+        self.assertEqual(second, [f"post {index}" for index in range(14, 4, -1)])
+
+    def test_rejects_a_malformed_cursor(self):
+        position = b64encode(b"p=yesterday|1").decode()
+
+        for cursor in ("not a cursor", position):
+            response = self.client.get("/api/v1/posts", {"cursor": cursor})
+            self.assertEqual(response.status_code, 400, cursor)
+
+
+class TaggedCacheTests(TestCase):
+    def setUp(self):
+        self.author = make_profile("author")
+        self.post = Post.objects.create(profile=self.author, content="first")
+        self.client = client_for(self.author)
+
+    def bump(self, *tags):
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_tags(*tags)
+
+    def contents(self):
+        response = self.client.get("/api/v1/posts")
+        return [post["content"] for post in response.json()["results"]]
+
+    def test_serves_entries_until_a_tag_is_bumped(self):
+        set_cached("entry", "data", ["post:1"], None, tag_clock())
+        self.assertEqual(get_cached("entry"), "data")
+
+        self.bump("post:1")
+
+        self.assertIsNone(get_cached("entry"))
+
+    def test_does_not_create_versions_when_storing(self):
+        set_cached("entry", "data", ["post:1"], None, tag_clock())
+
+        self.assertIsNone(cache.get(tag_key("post:1")))
+
+    def test_skips_data_read_before_a_bump(self):
+        clock = tag_clock()
+        # Committed after the data was read, before it was stored
+        self.bump("post:1")
+
+        set_cached("entry", "stale", ["post:1", "post:2"], None, clock)
+
+        self.assertIsNone(cache.get("entry"))
+
+    def test_post_list_follows_writes(self):
+        self.assertEqual(self.contents(), ["first"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.filter(pk=self.post.pk).update(content="edited")
+            invalidate_tags(f"post:{self.post.pk}")
+
+        self.assertEqual(self.contents(), ["edited"])
+
+    def test_post_list_is_not_cached_when_written_while_rendering(self):
+        render = views.PostViewSet.get_paginated_response
+
+        def edit_then_render(view, data):
+            # A write landing between the page's query and its caching
+            with self.captureOnCommitCallbacks(execute=True):
+                Post.objects.filter(pk=self.post.pk).update(content="edited")
+                invalidate_tags(f"post:{self.post.pk}")
+            return render(view, data)
+
+        with mock.patch.object(
+            views.PostViewSet, "get_paginated_response", edit_then_render
+        ):
+            self.assertEqual(self.contents(), ["first"])
+
+        self.assertEqual(self.contents(), ["edited"])
+
+
+class ViewCountTests(TestCase):
+    def setUp(self):
+        self.profile = make_profile("profile")
+        self.posts = [
+            Post.objects.create(profile=self.profile, content=f"post {index}")
+            for index in range(2)
+        ]
+        self.counter = LocalViewCounter({"WINDOW": 60})
+
+    def view_counts(self):
+        return [Post.objects.get(pk=post.pk).view_count for post in self.posts], sorted(
+            HitCount.objects.values_list("object_pk", "hits")
+        )
+
+    def test_counts_a_viewer_once_per_window(self):
+        post_id = self.posts[0].pk
+        with mock.patch("social.hits.time.monotonic", return_value=1000):
+            self.assertTrue(self.counter.record(post_id, "a"))
+            self.assertFalse(self.counter.record(post_id, "a"))
+            self.assertTrue(self.counter.record(post_id, "b"))
+
+        with mock.patch("social.hits.time.monotonic", return_value=1061):
+            self.assertTrue(self.counter.record(post_id, "a"))
+
+        self.assertEqual(self.counter.take(), {post_id: 3})
+
+    def test_flush_adds_the_views_with_one_update_per_table(self):
+        first, second = (post.pk for post in self.posts)
+        HitCount.objects.create(
+            content_type=ContentType.objects.get_for_model(Post),
+            object_pk=first,
+            hits=4,
+        )
+        Post.objects.filter(pk=first).update(view_count=4)
+        for user_id in ("a", "b"):
+            self.counter.record(first, user_id)
+        self.counter.record(second, "a")
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.counter.flush(), 3)
+
+        self.assertEqual(self.view_counts(), ([6, 1], [(first, 6), (second, 1)]))
+        updates = [
+            query["sql"] for query in queries if query["sql"].startswith("UPDATE")
+        ]
+        self.assertEqual(len(updates), 2)
+        self.assertTrue(all("CASE WHEN" in sql for sql in updates))
+        self.assertIsNone(self.counter.take())
+
+    def test_revalidated_retrieves_count_as_views(self):
+        counter = LocalViewCounter({"WINDOW": 0})
+        client = client_for(self.profile)
+        path = f"/api/v1/posts/{self.posts[0].uid}"
+
+        with mock.patch.object(views, "get_view_counter", return_value=counter):
+            etag = client.get(path)["ETag"]
+            response = client.get(path, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(counter.take(), {self.posts[0].pk: 2})
+
+
+class CompiledSerializerTests(TestCase):
+    def setUp(self):
+        self.viewer = make_profile("viewer")
+        author = make_profile("author")
+        self.posts = [
+            Post.objects.create(profile=author, content=f"post {index}")
+            for index in range(3)
+        ]
+        first, second, _ = self.posts
+        first.voice_recording = "recordings/voice.mp3"
+        first.save()
+        rendition = {"width": 320, "height": 240, "webp": "images/a_320w.webp"}
+        Picture.objects.create(
+            post=first,
+            image="images/a.jpg",
+            variants={"renditions": [rendition], "placeholder": "data:"},
+        )
+        Picture.objects.create(post=first, image="images/b.jpg")
+        Video.objects.create(post=second, clip="videos/a.mp4")
+        # Instead of Cloudinary, whose URLs need an account configured
+        storage = FileSystemStorage(base_url="/media/")
+        for model, name in [(Post, "voice_recording"), (Video, "clip")]:
+            patcher = mock.patch.object(model._meta.get_field(name), "storage", storage)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        Like.objects.create(
+            content_type=ContentType.objects.get_for_model(Post),
+            object_id=first.pk,
+            user_id=self.viewer.user_id,
+        )
+        Bookmark.objects.create(post=second, user_id=self.viewer.user_id)
+
+    def test_renders_the_bytes_of_post_serializer(self):
+        request = APIRequestFactory().get("/api/v1/posts")
+        request.user_id = str(self.viewer.user_id)
+        context = {"request": request}
+        queryset = Post.objects.order_by("-date_created", "-id")
+
+        posts = queryset.select_related("profile").prefetch_related(
+            "pictures", "videos"
+        )
+        expected = JSONRenderer().render(
+            PostSerializer(posts, many=True, context=context).data
+        )
+        compiled = compile_serializer(PostSerializer)
+        data = compiled.render(list(compiled.values(queryset)), context)
+
+        self.assertEqual(ORJSONRenderer().render(data), expected)
+        flags = [(row["liked_by_me"], row["bookmarked_by_me"]) for row in data]
+        self.assertEqual(flags, [(False, False), (False, True), (True, False)])
+        self.assertIsNone(data[0]["voice_recording"])
+
+    def test_method_fields_need_a_batched_version(self):
+        class UnbatchedSerializer(CommentSerializer):
+            extra = serializers.SerializerMethodField()
+
+            class Meta(CommentSerializer.Meta):
+                fields = [*CommentSerializer.Meta.fields, "extra"]
+
+            def get_extra(self, obj):
+                return None
+
+        with self.assertRaisesMessage(ImproperlyConfigured, "get_extra_batch"):
+            compile_serializer(UnbatchedSerializer)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.author = make_profile("author")
+        self.post = Post.objects.create(profile=self.author, content="hello there")
+        Post.objects.create(profile=make_profile("other"), content="hello again")
+        self.client = client_for(self.author)
+
+    def search(self, terms):
+        response = self.client.get("/api/v1/posts", {"search": terms})
+        return [post["content"] for post in response.json()["results"]]
+
+    def test_finds_posts_by_content(self):
+        self.assertEqual(self.search("ther"), ["hello there"])
+
+    def test_finds_posts_by_author_id_in_either_form(self):
+        for user_id in (str(self.author.user_id), self.author.user_id.hex):
+            self.assertEqual(self.search(user_id), ["hello there"])
+
+
+class BookmarkTests(TestCase):
+    def setUp(self):
+        self.profile = make_profile("profile")
+        self.posts = [
+            Post.objects.create(profile=self.profile, content=f"post {index}")
+            for index in range(3)
+        ]
+        self.client = client_for(self.profile)
+
+    def test_bulk_add_counts_only_new_bookmarks(self):
+        self.client.post("/api/v1/bookmark", {"post_id": str(self.posts[0].uid)})
+
+        response = self.client.post(
+            "/api/v1/bookmark",
+            {"post_ids": [str(post.uid) for post in self.posts]},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["count"], 2)
+
+
+class ViewerFlagTests(TestCase):
+    def setUp(self):
+        self.viewer = make_profile("viewer")
+        author = make_profile("author")
+        self.posts = Post.objects.bulk_create(
+            Post(profile=author, content=f"post {index}") for index in range(10)
+        )
+        Bookmark.objects.create(post=self.posts[0], user_id=self.viewer.user_id)
+        self.client = client_for(self.viewer)
+
+    def flags(self):
+        response = self.client.get("/api/v1/posts")
+        return {
+            post["content"]: (post["liked_by_me"], post["bookmarked_by_me"])
+            for post in response.json()["results"]
+        }
+
+    def like(self, post):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/v1/like/post", {"post_id": str(post.uid)})
+
+    def test_flags_a_cached_page_with_one_query_per_flag(self):
+        self.like(self.posts[1])
+        self.flags()
+
+        with self.assertNumQueries(2):
+            flags = self.flags()
+
+        self.assertEqual(flags["post 0"], (False, True))
+        self.assertEqual(flags["post 1"], (True, False))
+        self.assertEqual(flags["post 2"], (False, False))
+
+    @override_settings(
+        MEMBERSHIP_CACHE_SETTINGS={"ENABLED": True, "MAX_SIZE": 100, "TIMEOUT": 60}
+    )
+    def test_cached_flags_follow_like_toggles(self):
+        self.assertEqual(self.flags()["post 1"], (False, False))
+        with self.assertNumQueries(0):
+            self.flags()
+
+        self.like(self.posts[1])
+        self.assertEqual(self.flags()["post 1"], (True, False))
+
+        self.like(self.posts[1])
+        self.assertEqual(self.flags()["post 1"], (False, False))
+
+        # Likes written through the ORM expire the set by their signals
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(
+                content_type=ContentType.objects.get_for_model(Post),
+                object_id=self.posts[2].pk,
+                user_id=self.viewer.user_id,
+            )
+        self.assertEqual(self.flags()["post 2"], (True, False))
+
+
+class PostRouteTests(TestCase):
+    def setUp(self):
+        self.profile = make_profile("profile")
+        self.client = client_for(self.profile)
+
+    def test_routes_posts_by_uid(self):
+        post = Post.objects.create(profile=self.profile, content="post")
+
+        for path in (f"/api/v1/posts/{post.uid}", f"/api/v1/posts/{post.uid}/comments"):
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 200, path)
+
+    def test_malformed_post_uids_are_not_found(self):
+        for path in ("/api/v1/posts/1234", "/api/v1/posts/1234/comments"):
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 404, path)
+
+
+class ProcessingPostTests(TestCase):
+    def setUp(self):
+        timeline._timeline = None
+        self.author = make_profile("author")
+        self.viewer = make_profile("viewer")
+        UserWatching.objects.create(user_id=self.viewer, watching_user_id=self.author)
+        self.post = Post.objects.create(
+            profile=self.author, content="processing", status=Post.Status.PROCESSING
+        )
+
+    def contents(self, client, path):
+        return [post["content"] for post in client.get(path).json()["results"]]
+
+    def test_only_the_author_sees_a_processing_post(self):
+        author, viewer = client_for(self.author), client_for(self.viewer)
+
+        self.assertEqual(self.contents(viewer, "/api/v1/posts"), [])
+        self.assertEqual(self.contents(viewer, "/api/v1/feed"), [])
+        self.assertEqual(self.contents(author, "/api/v1/posts/mine"), ["processing"])
+
+        path = f"/api/v1/posts/{self.post.uid}"
+        self.assertEqual(viewer.get(path).status_code, 404)
+        self.assertEqual(author.get(path).status_code, 200)
+
+    def test_others_cannot_write_to_a_processing_post(self):
+        viewer = client_for(self.viewer)
+        uid = str(self.post.uid)
+
+        response = viewer.post(f"/api/v1/posts/{uid}/comments", {"content": "hi"})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(viewer.get(f"/api/v1/posts/{uid}/comments").status_code, 404)
+
+        for path, body in [
+            ("like/post", {"post_id": uid}),
+            ("bookmark", {"post_id": uid}),
+        ]:
+            response = viewer.post(f"/api/v1/{path}", body)
+            self.assertEqual(response.status_code, 404, path)
+            self.assertNotIn("processing", response.content.decode())
+
+        response = viewer.post("/api/v1/bookmark", {"post_ids": [uid]}, format="json")
+        self.assertEqual(response.json()["count"], 0)
+        response = viewer.post("/api/like", {"object_id": uid}, format="json")
+        self.assertEqual(response.status_code, 404)
+
+        self.assertFalse(Comment.objects.exists() or Bookmark.objects.exists())
+        self.assertFalse(Like.objects.exists())
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (0, 0))
+
+    def test_the_author_can_write_to_a_processing_post(self):
+        author = client_for(self.author)
+        uid = str(self.post.uid)
+
+        response = author.post(f"/api/v1/posts/{uid}/comments", {"content": "hi"})
+        self.assertEqual(response.status_code, 200)
+        response = author.post("/api/v1/like/post", {"post_id": uid})
+        self.assertEqual(response.status_code, 200)
+        response = author.post("/api/v1/bookmark", {"post_id": uid})
+        self.assertEqual(response.status_code, 201)
+
+    def test_publishing_fans_the_post_out(self):
+        viewer = client_for(self.viewer)
+        # Builds the viewer's inbox, which later posts are pushed into
+        self.assertEqual(self.contents(viewer, "/api/v1/feed"), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(media.publish(self.post.pk))
+
+        self.assertEqual(self.contents(viewer, "/api/v1/feed"), ["processing"])
+        self.assertEqual(self.contents(viewer, "/api/v1/posts"), ["processing"])
+
+
+class ImageTests(TestCase):
+    def setUp(self):
+        location = tempfile.TemporaryDirectory()
+        self.addCleanup(location.cleanup)
+        self.storage = FileSystemStorage(location=location.name)
+        self.path = Path(location.name) / "upload"
+
+    def write(self, image, image_format, exif=None):
+        image.save(self.path, image_format, **({"exif": exif} if exif else {}))
+
+    def camera_exif(self, orientation):
+        exif = Image.Exif()
+        exif[0x010F], exif[0x0110] = "Camera", "Model"
+        exif[images.ORIENTATION] = orientation
+        exif[0x8825] = {1: "N", 2: (1.0, 2.0, 3.0)}
+        return exif
+
+    def open(self, name):
+        with self.storage.open(name) as file, Image.open(file) as image:
+            image.load()
+            return image
+
+    @override_settings(
+        IMAGE_VARIANT_SETTINGS={
+            "WIDTHS": [320, 640, 1080],
+            "FORMATS": ["webp", "jpeg"],
+            "QUALITY": 80,
+            "PLACEHOLDER_SIZE": 16,
+        }
+    )
+    def test_renders_each_width_in_each_format(self):
+        self.write(Image.new("RGB", (800, 600), "red"), "JPEG")
+
+        variants = images.render_variants(self.path, "photo.jpg", self.storage.save)
+
+        self.assertEqual((variants["width"], variants["height"]), (800, 600))
+        self.assertTrue(variants["placeholder"].startswith("data:image/webp;base64,"))
+        sizes = [(row["width"], row["height"]) for row in variants["renditions"]]
+        # Widths above the original's are capped to it
+        self.assertEqual(sizes, [(320, 240), (640, 480), (800, 600)])
+        for rendition in variants["renditions"]:
+            for key, image_format in [("webp", "WEBP"), ("jpeg", "JPEG")]:
+                image = self.open(rendition[key])
+                self.assertEqual(image.format, image_format)
+                self.assertEqual(image.size, (rendition["width"], rendition["height"]))
+
+    def test_strips_camera_and_location_tags(self):
+        for image_format in ("JPEG", "PNG", "WEBP"):
+            for orientation in (1, 6):
+                with self.subTest(image_format, orientation=orientation):
+                    image = Image.new("RGB", (40, 20), "red")
+                    self.write(image, image_format, self.camera_exif(orientation))
+
+                    images.strip_exif(self.path)
+
+                    with Image.open(self.path) as stripped:
+                        self.assertEqual(stripped.format, image_format)
+                        self.assertEqual(dict(stripped.getexif()), {})
+                        upright = (20, 40) if orientation == 6 else (40, 20)
+                        self.assertEqual(stripped.size, upright)
+
+    def test_applies_the_orientation_to_renditions(self):
+        image = Image.new("RGB", (40, 20), "red")
+        self.write(image, "JPEG", self.camera_exif(6))
+
+        variants = images.render_variants(self.path, "photo.jpg", self.storage.save)
+
+        self.assertEqual((variants["width"], variants["height"]), (20, 40))
+        rendition = variants["renditions"][0]
+        self.assertEqual(self.open(rendition["jpeg"]).size, (20, 40))
+        self.assertEqual(dict(self.open(rendition["jpeg"]).getexif()), {})
+
+    def test_flattens_transparent_pictures_onto_white_for_jpeg(self):
+        image = Image.new("RGBA", (40, 40), (0, 0, 0, 0))
+        image.putpixel((0, 0), (255, 0, 0, 255))
+        self.write(image, "PNG")
+
+        variants = images.render_variants(self.path, "logo.png", self.storage.save)
+
+        rendition = variants["renditions"][0]
+        jpeg = self.open(rendition["jpeg"])
+        self.assertEqual(jpeg.mode, "RGB")
+        self.assertGreater(min(jpeg.getpixel((39, 39))), 240)
+        self.assertEqual(self.open(rendition["webp"]).mode, "RGBA")
+
+
+class ExpiryTests(TestCase):
+    def setUp(self):
+        location = tempfile.TemporaryDirectory()
+        self.addCleanup(location.cleanup)
+        self.storage = FileSystemStorage(location=location.name)
+
+        options = {
+            "BACKEND": "social.media.LocalMediaStorage",
+            "LOCATION": location.name,
+        }
+        override = override_settings(MEDIA_UPLOAD_SETTINGS=options)
+        override.enable()
+        self.addCleanup(override.disable)
+        media._pool = None
+        self.addCleanup(setattr, media, "_pool", None)
+
+        self.profile = make_profile("profile")
+        self.post = Post.objects.create(
+            profile=self.profile,
+            content="expired",
+            expiry=datetime.now(timezone.utc) - timedelta(minutes=1),
+            voice_recording=self.store("recordings/voice.mp3"),
+        )
+
+    def store(self, name):
+        return self.storage.save(name, ContentFile(b"file"))
+
+    def test_sweep_deletes_expired_posts_with_their_rows_and_files(self):
+        rendition = {
+            "width": 320,
+            "height": 240,
+            "webp": self.store("images/a_320w.webp"),
+        }
+        Picture.objects.create(
+            post=self.post,
+            image=self.store("images/a.jpg"),
+            variants={"renditions": [rendition]},
+        )
+        Video.objects.create(post=self.post, clip=self.store("videos/a.mp4"))
+        comment = Comment.objects.create(
+            post=self.post, profile=self.profile, content="comment"
+        )
+        for model, pk in [(Post, self.post.pk), (Comment, comment.pk)]:
+            Like.objects.create(
+                content_type=ContentType.objects.get_for_model(model),
+                object_id=pk,
+                user_id=self.profile.user_id,
+            )
+        live = Post.objects.create(profile=self.profile, content="live")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(sweep(), 1)
+
+        self.assertEqual(list(Post.all_objects.values_list("id", flat=True)), [live.pk])
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(Like.objects.exists())
+        self.assertFalse(Picture.objects.exists() or Video.objects.exists())
+        for directory in ("images", "videos", "recordings"):
+            self.assertEqual(self.storage.listdir(directory)[1], [])
+
+
+class TrendingTests(TestCase):
+    def setUp(self):
+        self.profile = make_profile("profile")
+        self.client = client_for(self.profile)
+        self.now = datetime.now(timezone.utc)
+        self.half_life = timedelta(hours=6)
+
+    def create(self, content, **counters):
+        return Post.objects.create(profile=self.profile, content=content, **counters)
+
+    def count(self, post, **counters):
+        Post.objects.filter(pk=post.pk).update(**counters)
+
+    def score(self, post):
+        return TrendingScore.objects.get(post=post).score
+
+    def trending(self, url="/api/v1/posts/trending"):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return [post["content"] for post in data["results"]], data["next"]
+
+    def test_recent_activity_outranks_older_activity(self):
+        old, recent = self.create("old"), self.create("recent")
+        self.count(old, like_count=3)
+        trending.update(now=self.now)
+
+        # A third of the likes, two half-lives later
+        self.count(recent, like_count=1)
+        trending.update(now=self.now + 2 * self.half_life)
+
+        self.assertEqual(self.trending()[0], ["recent", "old"])
+
+    def test_scores_only_counter_growth(self):
+        post = self.create("post", like_count=1, comment_count=1)
+        self.assertEqual(trending.update(now=self.now), 1)
+        score = self.score(post)
+
+        self.assertEqual(trending.update(now=self.now), 0)
+        # Unliked and liked again
+        self.count(post, like_count=0)
+        trending.update(now=self.now)
+        self.count(post, like_count=1)
+        self.assertEqual(trending.update(now=self.now), 0)
+        self.assertEqual(self.score(post), score)
+
+        self.count(post, like_count=2)
+        self.assertEqual(trending.update(now=self.now), 1)
+        self.assertGreater(self.score(post), score)
+
+    def test_posts_leaving_the_window_stop_trending(self):
+        post = self.create("post", like_count=1)
+        trending.update(now=self.now)
+
+        Post.objects.filter(pk=post.pk).update(
+            date_created=self.now - timedelta(days=4)
+        )
+        trending.update(now=self.now)
+
+        self.assertFalse(TrendingScore.objects.exists())
+        self.assertEqual(self.trending()[0], [])
+
+    def test_pages_by_score(self):
+        for index in range(12):
+            self.create(f"post {index}", like_count=index + 1)
+        trending.update(now=self.now)
+
+        first, url = self.trending()
+        second, url = self.trending(url)
+
+        self.assertEqual(first + second, [f"post {i}" for i in reversed(range(12))])
+        self.assertIsNone(url)
+        response = self.client.get("/api/v1/posts/trending", {"cursor": "garbage"})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,292 @@
+"""
+Per-profile home timelines ("inboxes") built from the UserWatching graph.
+
+New posts are pushed into the inbox of every watcher of the author (fan-out-on-write).
+Profiles with more than `FANOUT_LIMIT` watchers are skipped at write time and their posts
+are merged in when the feed is read instead (fan-out-on-read), so one post from a very
+popular profile does not turn into hundreds of thousands of inbox writes.
+
+Inboxes only hold `(post_id, score)` pairs where the score is the post's creation timestamp,
+and each one is trimmed to `MAX_LENGTH` entries so memory stays bounded. Feeds are ordered
+by `(score, post_id)`, newest first, so posts created in the same instant are still paged
+through one by one with a `(score, post_id)` cursor.
+"""
+
+import bisect
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import redis
+from django.conf import settings
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from users.models import Profile, UserWatching
+
+from .models import Post
+
+LOGGER = logging.getLogger(__name__)
+
+
+class BaseTimeline:
+    def __init__(self, options):
+        self.max_length = options.get("MAX_LENGTH", 800)
+
+    def exists(self, profile_id):
+        raise NotImplementedError
+
+    def push(self, profile_ids, post_id, score):
+        raise NotImplementedError
+
+    def fill(self, profile_id, entries):
+        """Replace the inbox of `profile_id` with `entries`, a list of (post_id, score)"""
+        raise NotImplementedError
+
+    def page(self, profile_id, before=None, limit=10):
+        """
+        Newest first (post_id, score) pairs ordered before `before`, a (score, post_id)
+        cursor taken from the last entry of the previous page
+        """
+        raise NotImplementedError
+
+    def reset(self, profile_id):
+        raise NotImplementedError
+
+
+class LocalTimeline(BaseTimeline):
+    """
+    In-process stand-in for the Redis timeline, for development and tests.
+    Each inbox is a list of (score, post_id) pairs kept sorted in ascending order.
+    """
+
+    def __init__(self, options):
+        super().__init__(options)
+        self._inboxes = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def exists(self, profile_id):
+        return profile_id in self._inboxes
+
+    def _add(self, inbox, post_id, score):
+        if (score, post_id) not in inbox:
+            bisect.insort(inbox, (score, post_id))
+        del inbox[: -self.max_length]
+
+    def push(self, profile_ids, post_id, score):
+        with self._lock:
+            for profile_id in profile_ids:
+                # Only inboxes that have been built are updated, the rest get built on read
+                if profile_id in self._inboxes:
+                    self._add(self._inboxes[profile_id], post_id, score)
+
+    def fill(self, profile_id, entries):
+        with self._lock:
+            inbox = self._inboxes[profile_id] = []
+            for post_id, score in entries:
+                self._add(inbox, post_id, score)
+
+    def page(self, profile_id, before=None, limit=10):
+        inbox = self._inboxes.get(profile_id, [])
+        end = len(inbox) if before is None else bisect.bisect_left(inbox, before)
+        return [
+            (post_id, score)
+            for score, post_id in reversed(inbox[max(end - limit, 0) : end])
+        ]
+
+    def reset(self, profile_id):
+        with self._lock:
+            self._inboxes.pop(profile_id, None)
+
+
+class RedisTimeline(BaseTimeline):
+    """
+    Stores every inbox as a Redis sorted set `timeline:<profile_id>` scored by post
+    timestamp. Members are zero padded post ids, Redis orders members with the same score
+    by their bytes, which then matches the order of the ids.
+    """
+
+    def __init__(self, options):
+        super().__init__(options)
+        self.client = redis.Redis.from_url(options["REDIS_URL"])
+
+    def key(self, profile_id):
+        return f"timeline:{profile_id}"
+
+    def exists(self, profile_id):
+        return bool(self.client.exists(self.key(profile_id)))
+
+    def member(self, post_id):
+        return f"{post_id:020d}"
+
+    def push(self, profile_ids, post_id, score):
+        keys = [self.key(profile_id) for profile_id in profile_ids]
+
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.exists(key)
+        built = pipe.execute()
+
+        # Only inboxes that have been built are updated, the rest get built on read
+        pipe = self.client.pipeline(transaction=False)
+        for key, exists in zip(keys, built):
+            if exists:
+                pipe.zadd(key, {self.member(post_id): score})
+                pipe.zremrangebyrank(key, 0, -self.max_length - 1)
+        pipe.execute()
+
+    def fill(self, profile_id, entries):
+        key = self.key(profile_id)
+        pipe = self.client.pipeline()
+        pipe.delete(key)
+        if entries:
+            pipe.zadd(key, {self.member(pk): score for pk, score in entries})
+            pipe.zremrangebyrank(key, 0, -self.max_length - 1)
+        pipe.execute()
+
+    def page(self, profile_id, before=None, limit=10):
+        key = self.key(profile_id)
+        if before is None:
+            rows = self.client.zrevrangebyscore(
+                key, "+inf", "-inf", start=0, num=limit, withscores=True
+            )
+        else:
+            score, post_id = before
+            # The rest of the cursor's own score, then the lower scores
+            rows = self.client.zrevrangebyscore(key, score, score, withscores=True)
+            rows = [row for row in rows if int(row[0]) < post_id][:limit]
+            below, rest = f"({score}", limit - len(rows)
+            rows += self.client.zrevrangebyscore(
+                key, below, "-inf", start=0, num=rest, withscores=True
+            )
+        return [(int(member), score) for member, score in rows]
+
+    def reset(self, profile_id):
+        self.client.delete(self.key(profile_id))
+
+
+_timeline = None
+_timeline_lock = threading.Lock()
+
+
+def get_timeline():
+    global _timeline
+    with _timeline_lock:
+        if _timeline is None:
+            options = settings.TIMELINE_SETTINGS
+            _timeline = import_string(options["BACKEND"])(options)
+    return _timeline
+
+
+def post_score(post):
+    return post.date_created.timestamp()
+
+
+def fanout_limit():
+    return settings.TIMELINE_SETTINGS.get("FANOUT_LIMIT", 5000)
+
+
+def fan_out_post(post):
+    """
+    Pushes a newly published post into the inboxes of the author's watchers.
+    Authors above the fan-out limit are left for `get_feed_page` to pull on read.
+    """
+    if post.profile.watchers_count > fanout_limit():
+        return
+
+    watcher_ids = list(
+        UserWatching.objects.filter(watching_user_id=post.profile_id).values_list(
+            "user_id", flat=True
+        )
+    )
+
+    # The author sees their own posts in their feed too
+    watcher_ids.append(post.profile_id)
+    try:
+        get_timeline().push(watcher_ids, post.id, post_score(post))
+    except redis.RedisError:
+        # The post is already saved, stale inboxes are rebuilt from the database on reset
+        LOGGER.error("Timeline fan-out failed for post %s", post.id, exc_info=True)
+
+
+def watched_profiles(profile_id):
+    return UserWatching.objects.filter(user_id=profile_id).values("watching_user_id")
+
+
+def pull_only_profiles(profile_id):
+    """Watched profiles that are too popular to be fanned out on write"""
+    return list(
+        Profile.objects.filter(
+            id__in=watched_profiles(profile_id), watchers_count__gt=fanout_limit()
+        ).values_list("id", flat=True)
+    )
+
+
+def reset_inbox(profile_id):
+    """Drops an inbox so it is rebuilt from the database on the next read"""
+    try:
+        get_timeline().reset(profile_id)
+    except redis.RedisError:
+        # The watch list is already saved, the inbox is only missing its new author
+        LOGGER.error("Timeline reset failed for profile %s", profile_id, exc_info=True)
+
+
+def build_inbox(profile_id):
+    """
+    Rebuilds an inbox from the database, this runs the first time a feed is read and after
+    the watch list of the profile changes.
+    """
+    timeline = get_timeline()
+    entries = (
+        Post.objects.published()
+        .filter(
+            Q(profile_id__in=watched_profiles(profile_id)) | Q(profile_id=profile_id)
+        )
+        .order_by("-date_created", "-id")
+        .values_list("id", "date_created")[: timeline.max_length]
+    )
+    timeline.fill(profile_id, [(pk, created.timestamp()) for pk, created in entries])
+
+
+def feed_order(entry):
+    post_id, score = entry
+    return score, post_id
+
+
+def feed_cursor(entry):
+    """The `before` value of the page after `entry`, as passed in a query string"""
+    post_id, score = entry
+    return f"{score!r}_{post_id}"
+
+
+def get_feed_page(profile_id, before=None, limit=10):
+    """
+    Returns up to `limit` (post_id, score) pairs, newest first, merged from the profile's
+    inbox and the posts of any watched profile that is only fanned out on read.
+
+    `before` is the (score, post_id) of the last entry of the previous page.
+    """
+    timeline = get_timeline()
+    if not timeline.exists(profile_id):
+        build_inbox(profile_id)
+
+    entries = timeline.page(profile_id, before=before, limit=limit)
+
+    if celebrities := pull_only_profiles(profile_id):
+        pulled = Post.objects.published().filter(profile_id__in=celebrities)
+        if before is not None:
+            score, post_id = before
+            created = datetime.fromtimestamp(score, tz=timezone.utc)
+            pulled = pulled.filter(
+                Q(date_created__lt=created) | Q(date_created=created, id__lt=post_id)
+            )
+        entries += [
+            (pk, created.timestamp())
+            for pk, created in pulled.order_by("-date_created", "-id").values_list(
+                "id", "date_created"
+            )[:limit]
+        ]
+        entries = sorted(set(entries), key=feed_order, reverse=True)[:limit]
+
+    return entries
@@ -0,0 +1,102 @@
+"""
+Trending posts.
+
+Every post created within WINDOW seconds gets a time-decayed activity score: each like,
+comment and view adds its weight from WEIGHTS, and what it added halves every HALF_LIFE
+seconds. `update` scores the activity since its previous run, BATCH_SIZE posts at a time.
+It reads the denormalized counters of the posts, never the Like, Comment or HitCount
+tables, and scores how far each counter grew past the value it had when last scored.
+Counters only score above their highest scored value, unliking and liking again adds
+nothing.
+
+Scores are stored as log(sum of weight * e^(rate * (t - EPOCH))) over the activity instead
+of being decayed in place. Time decays every score by the same factor, so their order holds
+without rewriting them, and a run only writes the posts that had activity. The ranking is
+served from TrendingScore's index on the score.
+"""
+
+import math
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Post, TrendingScore
+
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+# Keys of WEIGHTS and the Post counter each one scores
+COUNTERS = {"likes": "like_count", "comments": "comment_count", "views": "view_count"}
+
+
+def log_add(a, b):
+    """log(e^a + e^b), without leaving log space"""
+    if a is None:
+        return b
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def score_offset(now):
+    """log(e^(rate * (now - EPOCH))), the log weight of one unit of activity at `now`"""
+    half_life = settings.TRENDING_SETTINGS.get("HALF_LIFE", 6 * 60 * 60)
+    return math.log(2) / half_life * (now - EPOCH).total_seconds()
+
+
+def score_batch(rows, weights, offset):
+    """TrendingScores to create and to update for `rows` of (post_id, *counters)"""
+    scores = TrendingScore.objects.in_bulk([row[0] for row in rows])
+    created, updated = [], []
+    for post_id, *counts in rows:
+        current = scores.get(post_id)
+        if current is None:
+            current = TrendingScore(post_id=post_id, score=None)
+
+        gained = 0.0
+        for (name, field), count in zip(COUNTERS.items(), counts):
+            seen = getattr(current, field)
+            if count > seen:
+                gained += weights.get(name, 0) * (count - seen)
+                setattr(current, field, count)
+        if gained <= 0:
+            continue
+
+        was_scored = current.score is not None
+        current.score = log_add(current.score, math.log(gained) + offset)
+        (updated if was_scored else created).append(current)
+    return created, updated
+
+
+def update(batch_size=None, now=None):
+    """Scores the activity since the previous run, returns how many posts were rescored"""
+    options = settings.TRENDING_SETTINGS
+    batch_size = batch_size or options.get("BATCH_SIZE", 1000)
+    weights = options.get("WEIGHTS", {"likes": 1, "comments": 3, "views": 0.2})
+    now = now or timezone.now()
+    offset = score_offset(now)
+    cutoff = now - timedelta(seconds=options.get("WINDOW", 3 * 24 * 60 * 60))
+
+    # Posts that left the window stop trending
+    TrendingScore.objects.filter(post__date_created__lt=cutoff).delete()
+
+    rescored, last_id = 0, 0
+    while True:
+        rows = list(
+            Post.objects.filter(date_created__gte=cutoff, id__gt=last_id)
+            .order_by("id")
+            .values_list("id", *COUNTERS.values())[:batch_size]
+        )
+        if not rows:
+            return rescored
+        last_id = rows[-1][0]
+
+        created, updated = score_batch(rows, weights, offset)
+        with transaction.atomic():
+            TrendingScore.objects.bulk_create(created, ignore_conflicts=True)
+            TrendingScore.objects.bulk_update(updated, ["score", *COUNTERS.values()])
+        rescored += len(created) + len(updated)
+
+        if len(rows) < batch_size:
+            return rescored
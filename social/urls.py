@@ -1,8 +1,11 @@
+from django.conf import settings
 from django.urls import path
 from rest_framework.routers import DefaultRouter
 from rest_framework_nested.routers import NestedDefaultRouter
 
-from . import views
+from utils.views import split_by_method
+
+from . import async_views, views
 
 router  =  DefaultRouter(trailing_slash=False)
 
@@ -13,6 +16,7 @@ nested_router = NestedDefaultRouter(router, "posts", lookup="post")
 nested_router.register("comments", views.CommentViewSet, basename="posts-comments")
 
 urlpatterns = [
+    path("feed", views.FeedView.as_view()),
     path("like/post", views.LikePostView.as_view()),
     path("like/comment", views.LikeCommentView.as_view()),
     path("bookmark", views.BookmarkView.as_view())
@@ -20,3 +24,20 @@ urlpatterns = [
  
 
 ] + router.urls + nested_router.urls
+
+if settings.ASYNC_READ_VIEWS:
+    # Reads by the async views of social/async_views.py, writes by PostViewSet
+    urlpatterns = [
+        path(
+            "posts",
+            split_by_method(
+                async_views.AsyncPostListView.as_view(), async_views.post_list
+            ),
+        ),
+        path(
+            "posts/<uuid:uid>",
+            split_by_method(
+                async_views.AsyncPostDetailView.as_view(), async_views.post_detail
+            ),
+        ),
+    ] + urlpatterns
@@ -1,14 +1,12 @@
 from django.db import transaction
+from django.db.models import F
 from django.http import Http404, HttpRequest
 from django.http.request import HttpRequest
 from django.shortcuts import get_object_or_404
-from django.utils.decorators import method_decorator
+from django.urls.converters import UUIDConverter
 from django_filters.rest_framework import DjangoFilterBackend
-from hitcount.models import HitCount
-from hitcount.views import HitCountMixin
 from rest_framework import status
 from rest_framework.decorators import action
-from rest_framework.filters import OrderingFilter, SearchFilter
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
@@ -16,64 +14,115 @@ from rest_framework.viewsets import ModelViewSet
 from likes.views import LikeView
 from users.models import Profile
 from utils.exception_handlers import ErrorEnum, ErrorResponse
-from utils.helpers import custom_cache_decorator
+from utils.cache import tagged_cache
+from utils.conditional import conditional
+from utils.serializers import compile_serializer
 
 # from .filters import ApartmentFilter
-from .models import Bookmark, Comment, Picture, Post, Video
-from .pagination import PostPagination
+from .cache import (
+    invalidate_posts,
+    my_posts_tags,
+    page_expires,
+    post_list_tags,
+    public_scope,
+    viewer_scope,
+)
+from .conditional import comment_page_version, post_version
+from .hits import get_view_counter
+from .membership import apply_viewer_flags, invalidate_bookmarks, invalidate_likes
+from .media import discard, get_upload_pool, spool
+from .models import Bookmark, Comment, MediaUpload, Post
+from .pagination import (
+    BookmarkPagination,
+    CommentPagination,
+    PostPagination,
+    SearchPagination,
+    TrendingPagination,
+)
+from .search import PostSearchFilter
 from .serializers import (
     AddCommentSerializer,
     CommentSerializer,
     CreateBookmarkSerializer,
     CreatePostSerializer,
+    DeleteBookmarkSerializer,
     LikeCommentSerializer,
     LikePostSerializer,
     PostSerializer,
 )
+from .timeline import fan_out_post, feed_cursor, get_feed_page
 
 
 class PostViewSet(ModelViewSet):
     queryset = Post.objects.all()
+    read_from_replica = True  # For safe requests, see core/routers.py
     lookup_field = "uid"
-    filter_backends = [DjangoFilterBackend, OrderingFilter, SearchFilter]
+    # Malformed uids don't match the route, instead of failing the uid lookup
+    lookup_value_regex = UUIDConverter.regex
+    # Pages are newest first, or most relevant first when searching, the keyset
+    # pagination owns the ordering
+    filter_backends = [DjangoFilterBackend, PostSearchFilter]
     http_method_names = ["get", "post", "patch", "delete"]
-    search_fields = ["content", "profile__user_id", "profile__username"]
     pagination_class = PostPagination
 
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            searching = self.action == "list" and PostSearchFilter().get_search_terms(
+                self.request
+            )
+            self._paginator = (
+                SearchPagination if searching else self.pagination_class
+            )()
+        return self._paginator
+
     @action(methods=["GET"], detail=False, pagination_class=PostPagination)
-    @method_decorator(custom_cache_decorator)
     def mine(self, request):
         """
         Returns all the Posts owned by the currently logged in agent
 
         """
-        profile = Profile.objects.get(user_id=request.user_id)
+        response = self.my_page(request)
+        apply_viewer_flags(response.data["results"], Post, request.user_id)
+        return response
+
+    @action(methods=["GET"], detail=False, pagination_class=TrendingPagination)
+    def trending(self, request):
+        """
+        Returns the posts with the most recent likes, comments and views first, scored
+        in batches by social/trending.py
 
+        """
+        compiled = compile_serializer(PostSerializer)
         posts = (
-            Post.objects.filter(profile=profile)
-            .prefetch_related("pictures", "videos")
-            .select_related("profile")
+            Post.objects.published()
+            .filter(trending__isnull=False)
+            .annotate(trending_score=F("trending__score"))
         )
 
-        paginator = self.pagination_class()
-        result_page = paginator.paginate_queryset(posts, request)
+        page = self.paginate_queryset(compiled.values(posts))
 
-        serializer = PostSerializer(result_page, many=True)
+        data = compiled.render(page, {"viewer": request.user_id})
+        return self.get_paginated_response(data)
 
-        return paginator.get_paginated_response(serializer.data)
+    @tagged_cache(viewer_scope, my_posts_tags, expires=page_expires)
+    def my_page(self, request):
+        self.profile = Profile.objects.get(user_id=request.user_id)
+
+        compiled = compile_serializer(PostSerializer)
+        posts = Post.objects.filter(profile=self.profile)
+
+        result_page = self.paginate_queryset(compiled.values(posts))
+
+        # Flags are set per request by `mine`, likes and bookmarks don't expire the page
+        data = compiled.render(result_page, {"viewer": None})
+        return self.get_paginated_response(data)
 
     def get_queryset(self):
         return (
-            Post.objects.all()
+            Post.objects.visible_to(self.request.user_id)
             .select_related("profile")
-            .prefetch_related(
-                "pictures",
-                "videos",
-                "comments",
-                "profile__watching",
-                "profile__watchers",
-                "likes",
-            )
+            .prefetch_related("pictures", "videos")
         )
 
     def get_serializer_class(self):
@@ -81,18 +130,37 @@ class PostViewSet(ModelViewSet):
             return CreatePostSerializer
         return PostSerializer
 
-    @method_decorator(custom_cache_decorator) #? I need to create a new redis database instance on redis lab
     def list(self, request: HttpRequest, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        response = self.public_page(request)
+        apply_viewer_flags(response.data["results"], Post, request.user_id)
+        return response
 
-    def retrieve(self, request: HttpRequest, *args, **kwargs):
-        # Do a hit count
+    @tagged_cache(public_scope, post_list_tags, expires=page_expires)
+    def public_page(self, request):
+        """The page as every viewer sees it, the viewer's flags are added by `list`"""
+        # Rendered from `.values()` rows, see utils/serializers.py
+        compiled = compile_serializer(PostSerializer)
+        queryset = self.filter_queryset(self.get_queryset().published())
+
+        page = self.paginate_queryset(compiled.values(queryset))
 
-        hit_count = HitCount.objects.get_for_object(self.get_object())
+        data = compiled.render(page, {**self.get_serializer_context(), "viewer": None})
+        return self.get_paginated_response(data)
+
+    def retrieve(self, request: HttpRequest, *args, **kwargs):
+        response = self.post_detail(request, *args, **kwargs)
 
-        HitCountMixin.hit_count(request, hit_count)
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            # Counted in memory and flushed to HitCount in batches, see social/hits.py.
+            # Revalidated views count as well.
+            get_view_counter().record(self.resource_version["id"], request.user_id)
+        return response
 
-        return super().retrieve(request, *args, **kwargs)
+    @conditional(post_version)
+    def post_detail(self, request, *args, **kwargs):
+        instance = self.get_object()
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
 
     def create(self, request, *args, **kwargs):
         profile = get_object_or_404(Profile, user_id=request.user_id)
@@ -100,27 +168,42 @@ class PostViewSet(ModelViewSet):
 
         if serializer.is_valid():
             # serializer.is_valid(raise_exception=True)
-            with transaction.atomic():
-                data = serializer.validated_data
-
-                images = data.pop("pictures", [])
-                videos = data.pop("videos", [])
-
-                new_post = Post.objects.create(**data, profile=profile)
-
-                if images:
-                    pics = [Picture(image=img, post=new_post) for img in images]
-
-                    Picture.objects.bulk_create(pics)
-
-                if videos:
-                    vids = [Video(clip=clip, post=new_post) for clip in videos]
-
-                    Video.objects.bulk_create(vids)
-
-                serializer = PostSerializer(new_post)
-
-                return Response(serializer.data, status=status.HTTP_200_OK)
+            data = serializer.validated_data
+
+            # Files are only spooled here, social/media.py stores them in the background
+            files = [
+                *((MediaUpload.Kind.PICTURE, img) for img in data.pop("pictures", [])),
+                *((MediaUpload.Kind.VIDEO, clip) for clip in data.pop("videos", [])),
+            ]
+            if (recording := data.pop("voice_recording", None)) is not None:
+                files.append((MediaUpload.Kind.VOICE_RECORDING, recording))
+            uploads = [spool(kind, file) for kind, file in files]
+
+            post_status = Post.Status.PROCESSING if uploads else Post.Status.PUBLISHED
+            try:
+                with transaction.atomic():
+                    new_post = Post.objects.create(
+                        **data, profile=profile, status=post_status
+                    )
+
+                    for upload in uploads:
+                        upload.post = new_post
+                    MediaUpload.objects.bulk_create(uploads)
+
+                    # Posts with files are fanned out by social/media.py once published
+                    if uploads:
+                        transaction.on_commit(
+                            lambda: get_upload_pool().submit(new_post.pk)
+                        )
+                    else:
+                        transaction.on_commit(lambda: fan_out_post(new_post))
+            except Exception:
+                discard(uploads)
+                raise
+
+            serializer = PostSerializer(new_post)
+
+            return Response(serializer.data, status=status.HTTP_200_OK)
 
         return ErrorResponse(ErrorEnum.ERR_001, serializer_errors=serializer.errors)
 
@@ -143,108 +226,218 @@ class PostViewSet(ModelViewSet):
             )
 
 
+class FeedView(APIView):
+    read_from_replica = True
+
+    def get(self, request):
+        """
+        Returns the posts of the profiles the currently logged in user watches, newest first
+
+        Pass the `next` value of a response, `<timestamp>_<post id>`, as `?before=` to load
+        the following page
+        """
+        profile = get_object_or_404(Profile, user_id=request.user_id)
+        page_size = PostPagination.page_size
+
+        try:
+            before = request.query_params.get("before")
+            if before:
+                score, post_id = before.split("_")
+                before = (float(score), int(post_id))
+            else:
+                before = None
+        except ValueError:
+            return ErrorResponse(
+                ErrorEnum.ERR_001, extra_detail="before must be a feed cursor"
+            )
+
+        entries = get_feed_page(profile.id, before=before, limit=page_size)
+        positions = {pk: index for index, (pk, _) in enumerate(entries)}
+
+        compiled = compile_serializer(PostSerializer)
+        posts = compiled.values(Post.objects.published().filter(id__in=positions))
+        posts = sorted(posts, key=lambda post: positions[post["id"]])
+
+        return Response(
+            {
+                "next": feed_cursor(entries[-1]) if len(entries) == page_size else None,
+                "results": compiled.render(posts, {"viewer": request.user_id}),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
 class LikePostView(LikeView):
     serializer_class = LikePostSerializer
 
     def post(self, request):
-        super().post(request)
+        response = super().post(request)
 
         message = "Post liked"
         if self.unlike:
             message = "Post removed like"
 
-        product_instance = Post.objects.get(uid=request.data["post_id"])
-        data = PostSerializer(product_instance).data
+        # The toggle is raw SQL, expire what the Like signals would have
+        invalidate_posts(self.object_pk)
+        invalidate_likes(request.user_id)
         return Response(
-            {"status": True, "message": message, "result": data},
+            {"status": True, "message": message, "result": response.data},
             status=status.HTTP_200_OK,
         )
 
 
 class CommentViewSet(ModelViewSet):
+    read_from_replica = True
     lookup_field = "uid"
+    lookup_value_regex = UUIDConverter.regex
     http_method_names = ["get", "post", "patch", "delete"]
+    pagination_class = CommentPagination
 
     def get_queryset(self):
-        post = get_object_or_404(Post, uid=self.kwargs["post_uid"])
-        return Comment.objects.filter(post_id=post.id)
+        # Joined on the post's uid instead of looking the post up first, Post.objects
+        # leaves out expired posts
+        return Comment.objects.filter(
+            post__in=Post.objects.visible_to(self.request.user_id),
+            post__uid=self.kwargs["post_uid"],
+        ).select_related("profile")
 
     def get_serializer_class(self):
         if self.request.method == "POST":
             return AddCommentSerializer
         return CommentSerializer
 
+    @conditional(comment_page_version)
+    def list(self, request, *args, **kwargs):
+        compiled = compile_serializer(CommentSerializer)
+        queryset = self.filter_queryset(self.get_queryset())
+
+        page = self.paginate_queryset(compiled.values(queryset))
+        # Only an empty page tells a post without comments from a missing post
+        posts = Post.objects.visible_to(request.user_id)
+        if not page and not posts.filter(uid=kwargs["post_uid"]).exists():
+            raise Http404
+
+        data = compiled.render(page, {"viewer": request.user_id})
+        return self.get_paginated_response(data)
+
     def create(self, request, *args, **kwargs):
         serializer = AddCommentSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         profile = get_object_or_404(Profile, user_id=request.user_id)
         content = serializer.validated_data.get("content")
         post_uid = kwargs.get("post_uid")
-        post = Post.objects.get(uid=post_uid)
+        post = get_object_or_404(Post.objects.visible_to(request.user_id), uid=post_uid)
 
-        new_comment = Comment.objects.create(
-            content=content, profile=profile, post=post
-        )
+        with transaction.atomic():
+            new_comment = Comment.objects.create(
+                content=content, profile=profile, post=post
+            )
+            Post.objects.filter(pk=post.pk).update(
+                comment_count=F("comment_count") + 1
+            )
 
         serializer = CommentSerializer(new_comment)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            Post.objects.filter(pk=instance.post_id, comment_count__gt=0).update(
+                comment_count=F("comment_count") - 1
+            )
+
 
 class LikeCommentView(LikeView):
     serializer_class = LikeCommentSerializer
 
     def post(self, request):
-        super().post(request)
+        response = super().post(request)
 
         message = "Comment liked"
         if self.unlike:
             message = "Comment removed like"
 
-        comment_instance = Comment.objects.get(uid=request.data["comment_id"])
-        data = CommentSerializer(comment_instance).data
+        invalidate_likes(request.user_id)
         return Response(
-            {"status": True, "message": message, "result": data},
+            {"status": True, "message": message, "result": response.data},
             status=status.HTTP_200_OK,
         )
 
 
 class BookmarkView(APIView):
     serializer_class = CreateBookmarkSerializer
+    pagination_class = BookmarkPagination
 
     def get(self, request):
         """
-        Provides all the posts that have been saved by the currently logged in user
+        Provides the posts saved by the currently logged in user, most recently saved
+        first. Pages are keyset paginated, follow the `next` link for the following page.
         """
+        compiled = compile_serializer(PostSerializer)
+        posts = Post.objects.filter(bookmark__user_id=request.user_id).annotate(
+            saved_at=F("bookmark__date_created"), bookmark_id=F("bookmark__id")
+        )
 
-        my_bookmark = Bookmark.objects.filter(user_id=request.user_id).values("post_id")
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(compiled.values(posts), request, view=self)
 
-        _ids = [item["post_id"] for item in my_bookmark]
+        data = compiled.render(page, {"viewer": request.user_id})
+        return paginator.get_paginated_response(data)
 
-        posts = Post.objects.filter(id__in=_ids)
+    def post(self, request):
+        """
+        Add a post to bookmark or saved post, or several at once
 
-        serializer = PostSerializer(posts, many=True)
+        Example request body:
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+            {"post_id": "c0330839-f30c-4667-951c-2811e5e09bdf"}
+
+            {"post_ids": ["c0330839-f30c-4667-951c-2811e5e09bdf", ...]}
 
-    def post(self, request):
-        """
-        Add a post to bookmark or saved post
         """
         serializer = CreateBookmarkSerializer(data=request.data)
 
-        if serializer.is_valid():
-            post_id = serializer.validated_data.get("post_id")
-            post = get_object_or_404(Post, id=post_id)
+        if not serializer.is_valid():
+            return ErrorResponse(ErrorEnum.ERR_001, serializer_errors=serializer.errors)
 
-            Bookmark.objects.create(user_id=request.user_id, post=post)
-            serializer = PostSerializer(post)
+        post_id = serializer.validated_data.get("post_id")
+        if post_id is not None:
+            post = get_object_or_404(
+                Post.objects.visible_to(request.user_id).select_related("profile"),
+                uid=post_id,
+            )
+            Bookmark.objects.get_or_create(user_id=request.user_id, post=post)
+            invalidate_bookmarks(request.user_id)
+            serializer = PostSerializer(post, context={"viewer": request.user_id})
 
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(ErrorResponse("Validation error", serializer.errors))
+
+        post_ids = list(
+            Post.objects.visible_to(request.user_id)
+            .filter(uid__in=serializer.validated_data["post_ids"])
+            .values_list("id", flat=True)
+        )
+        bookmarked = Bookmark.objects.filter(
+            user_id=request.user_id, post_id__in=post_ids
+        )
+        with transaction.atomic():
+            before = bookmarked.count()
+            # Posts bookmarked before are skipped by the unique constraint
+            Bookmark.objects.bulk_create(
+                [Bookmark(user_id=request.user_id, post_id=pk) for pk in post_ids],
+                ignore_conflicts=True,
+            )
+            added = bookmarked.count() - before
+        invalidate_bookmarks(request.user_id)
+
+        return Response(
+            {"detail": "bookmarks added successfully", "count": added},
+            status=status.HTTP_201_CREATED,
+        )
 
     def delete(self, request):
         """
-        Delete selected bookmarks
+        Delete selected bookmarks of the currently logged in user
 
         Example request body:
 
@@ -258,10 +451,16 @@ class BookmarkView(APIView):
             }
 
         """
+        serializer = DeleteBookmarkSerializer(data=request.data)
 
-        post_id_list = request.data["post_ids"]
+        if not serializer.is_valid():
+            return ErrorResponse(ErrorEnum.ERR_001, serializer_errors=serializer.errors)
 
-        Bookmark.objects.filter(post_id__in=post_id_list).delete()
+        Bookmark.objects.filter(
+            user_id=request.user_id,
+            post__uid__in=serializer.validated_data["post_ids"],
+        ).delete()
+        invalidate_bookmarks(request.user_id)
 
         return Response(
             {"detail": "bookmarks removed successfully"},
@@ -0,0 +1,68 @@
+"""
+Async versions of the profile read endpoints, routed instead of the sync ones when
+settings.ASYNC_READ_VIEWS is on, see users/urls.py
+"""
+
+from adrf.views import APIView
+from django.http import Http404
+from rest_framework import status
+from rest_framework.response import Response
+
+from utils.conditional import conditional
+
+from . import views
+from .models import Profile
+from .serializers import ProfileSerializer
+
+
+class AsyncProfileView(APIView):
+    read_from_replica = True
+
+    @conditional(views.profile_version)
+    async def get(self, request):
+        profile = await Profile.objects.aget(user_id=request.user_id)
+
+        serializer = ProfileSerializer(profile)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class AsyncGetAProfile(APIView):
+    read_from_replica = True
+
+    @conditional(views.profile_version, public=True)
+    async def get(self, request, user_id):
+        profile = await Profile.objects.filter(user_id=user_id).afirst()
+        if profile is None:
+            raise Http404
+
+        serializer = ProfileSerializer(profile)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class AsyncWatchListView(APIView, views.WatchListView):
+    """WatchListView with the page streamed from the async ORM"""
+
+    def get_page_response(self, edges, serialize):
+        return self.pagination_class().get_async_streaming_response(
+            edges, self.request, serialize, view=self
+        )
+
+
+class AsyncGetWatchers(AsyncWatchListView, views.GetWatchers):
+    async def get(self, request):
+        return self.list_edges(request, request.user_id)
+
+
+class AsyncGetWatching(AsyncWatchListView, views.GetWatching):
+    async def get(self, request):
+        return self.list_edges(request, request.user_id)
+
+
+class AsyncGetWatchersForUserView(AsyncWatchListView, views.GetWatchersForUserView):
+    async def get(self, request, user_id):
+        return self.list_edges(request, user_id)
+
+
+class AsyncGetWatchingForUserView(AsyncWatchListView, views.GetWatchingForUserView):
+    async def get(self, request, user_id):
+        return self.list_edges(request, user_id)
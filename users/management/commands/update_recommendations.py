@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.recommendations import update
+
+
+class Command(BaseCommand):
+    help = "Recomputes the who to watch recommendations of profiles whose edges changed"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Recompute the recommendations of every profile",
+        )
+        parser.add_argument(
+            "--loop",
+            type=float,
+            default=None,
+            help="Keep updating every LOOP seconds instead of updating once",
+        )
+
+    def handle(self, *args, **options):
+        full = options["full"]
+        while True:
+            updated = update(full=full)
+            self.stdout.write(
+                self.style.SUCCESS(f"Updated the recommendations of {updated} profiles")
+            )
+
+            if options["loop"] is None:
+                break
+            time.sleep(options["loop"])
+            full = False
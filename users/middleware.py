@@ -1,44 +1,104 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
 from django.conf import settings
 from jose import jwt
-from jose.exceptions import ExpiredSignatureError, JWTError
+from jose.exceptions import JWTError
 
+from utils.middleware import SyncAndAsyncMiddleware
 
-class UserIDMiddleware:
-    def __init__(self, get_response):
-        self.get_response = get_response
 
-    def __call__(self, request):
-        user_id = request.META.get("HTTP_USER_ID")
+class TokenCache:
+    """
+    Bounded LRU of verified bearer tokens, keyed by the SHA-256 digest of the token.
 
-        request.user_id = user_id if user_id else None
+    Clients reuse the same token for many requests, so after the first one the user_id
+    comes from here instead of another HS256 verification and claims parse. Entries are
+    dropped once the token's `exp` passes, and only tokens that verified are stored.
+    The hit/miss counters are per worker process.
+    """
 
-        response = self.get_response(request)
-        return response
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, digest):
+        with self.lock:
+            entry = self.entries.get(digest)
+            if entry is not None:
+                user_id, expires = entry
+                if expires is None or expires > time.time():
+                    self.entries.move_to_end(digest)
+                    self.hits += 1
+                    return user_id
+                del self.entries[digest]
+            self.misses += 1
+            return None
+
+    def set(self, digest, user_id, expires):
+        with self.lock:
+            self.entries[digest] = (user_id, expires)
+            self.entries.move_to_end(digest)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
 
 
-class UserIDJWTMiddleware:
-    def __init__(self, get_response):
-        self.get_response = get_response
+token_cache = TokenCache(getattr(settings, "JWT_TOKEN_CACHE_SIZE", 10000))
 
-    def __call__(self, request):
-        authorization_header = request.META.get("HTTP_AUTHORIZATION")
 
-        if authorization_header and authorization_header.startswith("Bearer "):
-            token = authorization_header.split(" ")[1]
+def verify_token(token):
+    """The user_id of a bearer token, or None when it is invalid or expired"""
+    digest = hashlib.sha256(token.encode()).digest()
+    if (user_id := token_cache.get(digest)) is not None:
+        return user_id
 
-            try:
-                decoded_token = jwt.decode(
-                    token, settings.SECRET_KEY, algorithms=["HS256"]
-                )
-                user_id = decoded_token.get("user_id")
-            except ExpiredSignatureError:
-                user_id = None
-            except JWTError:
-                user_id = None
-        else:
-            user_id = None
+    try:
+        claims = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
+    except JWTError:
+        # ExpiredSignatureError included
+        return None
 
-        request.user_id = user_id
+    user_id = claims.get("user_id")
+    if user_id is not None:
+        expires = claims.get("exp")
+        token_cache.set(digest, user_id, float(expires) if expires else None)
+    return user_id
+
+
+class UserIDJWTMiddleware(SyncAndAsyncMiddleware):
+    """
+    Sets `request.user_id` from the `Authorization: Bearer <jwt>` header, None without a
+    valid token. A client supplied `User-Id` header is not trusted.
+    """
+
+    def handle(self, request):
+        request.user_id = self.user_id(request)
 
         response = self.get_response(request)
         return response
+
+    async def ahandle(self, request):
+        # Verification is CPU only, cheap enough to run on the event loop
+        request.user_id = self.user_id(request)
+        return await self.get_response(request)
+
+    def user_id(self, request):
+        authorization_header = request.META.get("HTTP_AUTHORIZATION", "")
+
+        if authorization_header.startswith("Bearer "):
+            return verify_token(authorization_header[len("Bearer ") :])
+        return None
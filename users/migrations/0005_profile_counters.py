@@ -0,0 +1,57 @@
+# Generated by Django 4.2.6 on 2026-10-17 00:15
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_edges(UserWatching, field):
+    counts = (
+        UserWatching.objects.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(total=Count("*"))
+        .values("total")
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def backfill(apps, schema_editor):
+    Profile = apps.get_model("users", "Profile")
+    UserWatching = apps.get_model("users", "UserWatching")
+
+    Profile.objects.update(
+        watchers_count=count_edges(UserWatching, "watching_user_id"),
+        watching_count=count_edges(UserWatching, "user_id"),
+    )
+
+    with_skills = Profile.objects.filter(skills__isnull=False).distinct()
+    for profile in with_skills.prefetch_related("skills"):
+        profile.user_skills = [skill.name for skill in profile.skills.all()]
+        profile.save(update_fields=["user_skills"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_profile_is_verified'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='user_skills',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='watchers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='watching_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.6 on 2026-10-17 00:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_profile_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userwatching',
+            index=models.Index(fields=['user_id', '-date_created', '-id'], name='users_userw_user_id_936970_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userwatching',
+            index=models.Index(fields=['watching_user_id', '-date_created', '-id'], name='users_userw_watchin_aad676_idx'),
+        ),
+    ]
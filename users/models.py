@@ -16,6 +16,10 @@ class Profile(models.Model):
         blank=True,
     )
     skills = models.ManyToManyField(Skill, blank=True)
+    # Denormalized so a nested ProfileSerializer renders without touching other tables
+    watchers_count = models.PositiveIntegerField(default=0)
+    watching_count = models.PositiveIntegerField(default=0)
+    user_skills = models.JSONField(default=list, blank=True)
     is_verified = models.BooleanField(default=False)
     date_created = models.DateTimeField(auto_now_add=True)
     date_update = models.DateTimeField(auto_now=True)
@@ -23,21 +27,9 @@ class Profile(models.Model):
     class Meta:
         indexes = [models.Index(fields=["username"]), models.Index(fields=["user_id"])]
 
-    @property
-    def watchers_count(self):
-        return self.watchers.count()
-
-    @property
-    def watching_count(self):
-        return self.watching.count()
-
-    @property
-    def user_skills(self):
-        skills = []
-        for skill in self.skills.all():
-            skills.append(skill.name)
-
-        return skills
+    def refresh_user_skills(self):
+        self.user_skills = list(self.skills.values_list("name", flat=True))
+        self.save(update_fields=["user_skills", "date_update"])
 
 
 class UserWatching(models.Model):
@@ -58,8 +50,41 @@ class UserWatching(models.Model):
         indexes = [
             models.Index(fields=["user_id"]),
             models.Index(fields=["watching_user_id"]),
+            # Keyset pages of users.views.WatchListView, one per side of the edge
+            models.Index(fields=["user_id", "-date_created", "-id"]),
+            models.Index(fields=["watching_user_id", "-date_created", "-id"]),
         ]
         ordering = ["-date_created"]
 
     def __str__(self):
         f"{self.user_id} follows {self.watching_user_id}"
+
+
+class Recommendation(models.Model):
+    """A profile suggested for `profile` to watch, computed by users/recommendations.py"""
+
+    profile = models.ForeignKey(
+        Profile, related_name="recommendations", on_delete=models.CASCADE
+    )
+    recommended = models.ForeignKey(Profile, related_name="+", on_delete=models.CASCADE)
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["profile", "recommended"], name="unique_recommendations"
+            )
+        ]
+        indexes = [
+            # A profile's recommendations, best first, in one range scan
+            models.Index(fields=["profile", "-score"]),
+        ]
+
+
+class StaleRecommendations(models.Model):
+    """A profile whose watch edges or skills changed since its recommendations were made"""
+
+    profile = models.OneToOneField(
+        Profile, primary_key=True, related_name="+", on_delete=models.CASCADE
+    )
+    date_created = models.DateTimeField(auto_now_add=True)
@@ -0,0 +1,9 @@
+from social.pagination import KeysetPagination
+
+
+class WatchPagination(KeysetPagination):
+    # Most recent watch edges first, keyed on the UserWatching row
+    ordering = "-date_created"
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 500
@@ -0,0 +1,177 @@
+"""
+"Who to watch" recommendations.
+
+`update` loads the whole UserWatching graph once, with profiles renumbered 0..n-1 and each
+side of the edges kept as compact CSR arrays (the neighbours of profile i are
+`targets[offsets[i]:offsets[i + 1]]`). It then scores, for every profile to update, the
+profiles watched by the profiles it watches: one point per path to the candidate, plus
+SKILL_WEIGHT per skill the two have in common. Profiles it already watches are left out,
+and the TOP_K best are stored as Recommendation rows, which `/recommendations` reads with
+one lookup of their index.
+
+Profiles whose watch edges or skills change are queued in StaleRecommendations by the
+receivers below. An incremental run only updates those and the profiles watching them,
+whose second degree went through them. Pass `full=True` to update every profile.
+"""
+
+import heapq
+from array import array
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Profile, Recommendation, StaleRecommendations, UserWatching
+
+
+def mark_stale(*profile_ids):
+    StaleRecommendations.objects.bulk_create(
+        [StaleRecommendations(profile_id=pk) for pk in profile_ids],
+        # Queued again, a run that started before this must not dequeue it
+        update_conflicts=True,
+        unique_fields=["profile"],
+        update_fields=["date_created"],
+    )
+
+
+class WatchGraph:
+    """The watch graph, in both directions, over profiles renumbered 0..n-1"""
+
+    def __init__(self, edges, profile_ids):
+        self.ids = sorted(profile_ids)
+        self.index = {pk: i for i, pk in enumerate(self.ids)}
+
+        sources = array("l", (self.index[source] for source, _ in edges))
+        targets = array("l", (self.index[target] for _, target in edges))
+        self.watching = self.csr(sources, targets)
+        self.watchers = self.csr(targets, sources)
+
+    def csr(self, sources, targets):
+        """(offsets, neighbours) of `sources[k] -> targets[k]`, neighbours sorted"""
+        offsets = array("l", [0] * (len(self.ids) + 1))
+        for source in sources:
+            offsets[source + 1] += 1
+        for i in range(len(self.ids)):
+            offsets[i + 1] += offsets[i]
+
+        neighbours = array("l", [0] * len(targets))
+        filled = array("l", offsets[:-1])
+        for source, target in zip(sources, targets):
+            neighbours[filled[source]] = target
+            filled[source] += 1
+        for i in range(len(self.ids)):
+            start, end = offsets[i], offsets[i + 1]
+            neighbours[start:end] = array("l", sorted(neighbours[start:end]))
+        return offsets, neighbours
+
+    def neighbours(self, side, i):
+        offsets, neighbours = side
+        return neighbours[offsets[i] : offsets[i + 1]]
+
+    def degree(self, side, i):
+        offsets, _ = side
+        return offsets[i + 1] - offsets[i]
+
+
+def load_graph():
+    edges = list(
+        UserWatching.objects.values_list("user_id", "watching_user_id").iterator(
+            chunk_size=10000
+        )
+    )
+    return WatchGraph(edges, Profile.objects.values_list("id", flat=True))
+
+
+def load_skills():
+    """{profile_id: frozenset of skill ids}"""
+    skills = defaultdict(set)
+    rows = Profile.skills.through.objects.values_list("profile_id", "skill_id")
+    for profile_id, skill_id in rows.iterator(chunk_size=10000):
+        skills[profile_id].add(skill_id)
+    return {profile_id: frozenset(ids) for profile_id, ids in skills.items()}
+
+
+def recommend(graph, skills, i, options):
+    """The TOP_K (score, profile_id) candidates of the profile at index `i`, best first"""
+    watched = graph.neighbours(graph.watching, i)
+    paths = Counter()
+    for via in watched:
+        # Mass watchers say little about any one profile they watch
+        if graph.degree(graph.watching, via) <= options["MAX_DEGREE"]:
+            paths.update(graph.neighbours(graph.watching, via))
+
+    paths.pop(i, None)
+    for known in watched:
+        paths.pop(known, None)
+
+    own_skills = skills.get(graph.ids[i], frozenset())
+    scored = []
+    for candidate, count in paths.items():
+        profile_id = graph.ids[candidate]
+        shared = len(own_skills & skills.get(profile_id, frozenset()))
+        scored.append((count + options["SKILL_WEIGHT"] * shared, profile_id))
+    return heapq.nlargest(options["TOP_K"], scored)
+
+
+def update(full=False):
+    """Recomputes the stale recommendations, or all with `full`, returns how many profiles"""
+    options = {
+        "TOP_K": 50,
+        "SKILL_WEIGHT": 0.5,
+        "MAX_DEGREE": 5000,
+        "BATCH_SIZE": 500,
+        **settings.RECOMMENDATION_SETTINGS,
+    }
+    started = timezone.now()
+    stale = set(StaleRecommendations.objects.values_list("profile_id", flat=True))
+    if not full and not stale:
+        return 0
+
+    graph, skills = load_graph(), load_skills()
+    if full:
+        indexes = range(len(graph.ids))
+    else:
+        indexes = {graph.index[pk] for pk in stale if pk in graph.index}
+        # Their second degree went through the stale profiles
+        for i in list(indexes):
+            indexes.update(graph.neighbours(graph.watchers, i))
+        indexes = sorted(indexes)
+
+    for start in range(0, len(indexes), options["BATCH_SIZE"]):
+        batch = indexes[start : start + options["BATCH_SIZE"]]
+        recommendations = [
+            Recommendation(profile_id=graph.ids[i], recommended_id=pk, score=score)
+            for i in batch
+            for score, pk in recommend(graph, skills, i, options)
+        ]
+        with transaction.atomic():
+            Recommendation.objects.filter(
+                profile_id__in=[graph.ids[i] for i in batch]
+            ).delete()
+            Recommendation.objects.bulk_create(recommendations)
+
+    # Profiles that changed again while this ran stay queued
+    StaleRecommendations.objects.filter(
+        profile_id__in=stale, date_created__lte=started
+    ).delete()
+    return len(indexes)
+
+
+@receiver([post_save, post_delete], sender=UserWatching)
+def watch_changed(sender, instance, **kwargs):
+    profile_id = instance.user_id_id
+
+    def queue():
+        # Edges are also deleted along with their watcher, which must not be queued then
+        mark_stale(*Profile.objects.filter(pk=profile_id).values_list("pk", flat=True))
+
+    transaction.on_commit(queue)
+
+
+@receiver(m2m_changed, sender=Profile.skills.through)
+def skills_changed(sender, instance, action, reverse, **kwargs):
+    if action.startswith("post_") and not reverse:
+        mark_stale(instance.pk)
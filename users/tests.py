@@ -1,3 +1,224 @@
+import hashlib
+import json
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.db import connection
 from django.test import TestCase
+from jose import jwt
+from rest_framework.test import APIClient
+
+from utils.renderers import ORJSONRenderer
+from utils.test import client_for, make_profile
+
+from . import middleware, recommendations
+from .models import Profile, StaleRecommendations, UserWatching
+
+
+class WatchCounterTests(TestCase):
+    def setUp(self):
+        self.profile = make_profile("profile")
+        self.other = make_profile("other")
+        self.client = client_for(self.profile)
+
+    def counts(self):
+        self.profile.refresh_from_db()
+        self.other.refresh_from_db()
+        return self.profile.watching_count, self.other.watchers_count
+
+    def watch(self):
+        return self.client.post(
+            "/api/v1/watch", {"watching_user_id": str(self.other.user_id)}
+        )
+
+    def test_watching_and_unwatching_move_both_counters(self):
+        response = self.watch()
+        self.assertEqual(response.json()["watchers_count"], 1)
+        self.assertEqual(self.counts(), (1, 1))
+
+        self.client.delete(f"/api/v1/unwatch/{self.other.user_id}")
+
+        self.assertEqual(self.counts(), (0, 0))
+        self.assertEqual(
+            (self.profile.watchers_count, self.other.watching_count), (0, 0)
+        )
+
+    def test_watching_twice_counts_once(self):
+        self.watch()
+        self.watch()
+
+        self.assertEqual(self.counts(), (1, 1))
+        self.assertEqual(UserWatching.objects.count(), 1)
+
+
+class SkillTests(TestCase):
+    def setUp(self):
+        self.profile = make_profile("profile")
+        self.client = client_for(self.profile)
+
+    def skills(self):
+        self.profile.refresh_from_db()
+        return sorted(self.profile.user_skills)
+
+    def test_adding_and_removing_skills_refreshes_user_skills(self):
+        response = self.client.post(
+            "/api/v1/skill", {"names": ["python", "django"]}, format="json"
+        )
+        self.assertEqual(sorted(response.json()["user_skills"]), ["django", "python"])
+        self.assertEqual(self.skills(), ["django", "python"])
+
+        self.client.delete("/api/v1/skill", {"names": ["python"]}, format="json")
+
+        self.assertEqual(self.skills(), ["django"])
+
+
+class TokenCacheTests(TestCase):
+    def setUp(self):
+        self.profile = make_profile("profile")
+        self.cache = middleware.TokenCache(2)
+        patcher = mock.patch.object(middleware, "token_cache", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def token(self, **claims):
+        claims = {"user_id": str(self.profile.user_id), **claims}
+        return jwt.encode(claims, settings.SECRET_KEY, algorithm="HS256")
+
+    def test_verifies_a_repeated_token_once(self):
+        token = self.token(exp=int(time.time()) + 60)
+
+        with mock.patch.object(
+            middleware.jwt, "decode", wraps=middleware.jwt.decode
+        ) as decode:
+            for _ in range(3):
+                self.assertEqual(
+                    middleware.verify_token(token), str(self.profile.user_id)
+                )
+
+        self.assertEqual(decode.call_count, 1)
+        self.assertEqual(self.cache.stats()["hits"], 2)
+
+    def test_expired_entries_are_evicted_and_rejected(self):
+        token = self.token(exp=int(time.time()) - 1)
+        digest = hashlib.sha256(token.encode()).digest()
+        # Stored while the token was still valid
+        self.cache.set(digest, str(self.profile.user_id), time.time() - 1)
+
+        self.assertIsNone(middleware.verify_token(token))
+        self.assertNotIn(digest, self.cache.entries)
+
+    def test_evicts_the_least_recently_used_token(self):
+        self.cache.set(b"a", "a", None)
+        self.cache.set(b"b", "b", None)
+        self.cache.get(b"a")
+        self.cache.set(b"c", "c", None)
+
+        self.assertEqual(list(self.cache.entries), [b"a", b"c"])
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_a_user_id_header_does_not_authenticate(self):
+        client = APIClient()
+
+        response = client.get("/api/v1/profile", HTTP_USER_ID=str(self.profile.user_id))
+        self.assertEqual(response.status_code, 403)
+
+        response = client_for(self.profile).get("/api/v1/profile")
+        self.assertEqual(response.status_code, 200)
+
+
+class WatchListTests(TestCase):
+    def setUp(self):
+        self.profile = make_profile("profile")
+        self.client = client_for(self.profile)
+
+    def test_streams_the_bytes_of_a_regular_response(self):
+        for name in ("Adé", "Zoë  "):
+            UserWatching.objects.create(
+                user_id=make_profile(name), watching_user_id=self.profile
+            )
+
+        response = self.client.get("/api/v1/watchers")
+        body = b"".join(response.streaming_content)
+
+        data = json.loads(body)
+        self.assertEqual([row["name"] for row in data["results"]], ["Zoë  ", "Adé"])
+        self.assertEqual(body, ORJSONRenderer().render(data))
+
+
+class ConditionalProfileTests(TestCase):
+    def setUp(self):
+        self.profile = make_profile("profile")
+        self.client = client_for(self.profile)
+        self.path = f"/api/v1/profile/{self.profile.user_id}"
+
+    def test_public_profiles_vary_on_the_token(self):
+        response = self.client.get(self.path)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("public", response["Cache-Control"])
+        self.assertIn("Authorization", response["Vary"])
+
+    def test_answers_a_matching_etag_with_304(self):
+        etag = self.client.get(self.path)["ETag"]
+
+        response = self.client.get(self.path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.profile.watchers_count = 1
+        self.profile.save()
+        response = self.client.get(self.path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        self.a, self.b, self.c, self.d = (make_profile(name) for name in "abcd")
+
+    def watch(self, profile, other):
+        with self.captureOnCommitCallbacks(execute=True):
+            UserWatching.objects.create(user_id=profile, watching_user_id=other)
+
+    def stale(self):
+        return set(StaleRecommendations.objects.values_list("profile_id", flat=True))
+
+    def recommended(self, profile):
+        response = client_for(profile).get("/api/v1/recommendations")
+        return [row["name"] for row in response.json()["results"]]
+
+    def test_watching_queues_the_watcher(self):
+        self.watch(self.a, self.b)
+
+        self.assertEqual(self.stale(), {self.a.pk})
+
+    def test_recommends_profiles_watched_by_watched_profiles(self):
+        self.watch(self.a, self.b)
+        self.watch(self.b, self.c)
+
+        self.assertEqual(recommendations.update(), 2)
+
+        self.assertEqual(self.recommended(self.a), ["c"])
+        self.assertEqual(self.stale(), set())
+
+    def test_incremental_runs_update_the_watchers_of_stale_profiles(self):
+        self.watch(self.a, self.b)
+        self.watch(self.b, self.c)
+        recommendations.update()
+
+        self.watch(self.b, self.d)
+        self.assertEqual(self.stale(), {self.b.pk})
+        # b and a, whose second degree goes through b
+        self.assertEqual(recommendations.update(), 2)
+
+        self.assertEqual(sorted(self.recommended(self.a)), ["c", "d"])
+
+    def test_deleting_a_profile_with_watch_edges(self):
+        self.watch(self.a, self.b)
+        self.watch(self.b, self.a)
+        recommendations.update()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Profile.objects.filter(pk=self.a.pk).delete()
+        connection.check_constraints()
 
-# Create your tests here.
+        self.assertEqual(self.stale(), {self.b.pk})
@@ -1,6 +1,9 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from utils.views import split_by_method
+
+from . import async_views, views
 
 urlpatterns = [
     path("profile", views.ProfileView.as_view()),
@@ -12,4 +15,27 @@ urlpatterns = [
     path("watching/<uuid:user_id>", views.GetWatchingForUserView.as_view()),
     path("profile/<uuid:user_id>", views.GetAProfile.as_view()),
     path("skill", views.SkillView.as_view()),
+    path("recommendations", views.RecommendationsView.as_view()),
 ]
+
+if settings.ASYNC_READ_VIEWS:
+    # Reads by the async views of users/async_views.py
+    urlpatterns = [
+        path(
+            "profile",
+            split_by_method(
+                async_views.AsyncProfileView.as_view(), views.ProfileView.as_view()
+            ),
+        ),
+        path("watchers", async_views.AsyncGetWatchers.as_view()),
+        path("watching", async_views.AsyncGetWatching.as_view()),
+        path(
+            "watchers/<uuid:user_id>",
+            async_views.AsyncGetWatchersForUserView.as_view(),
+        ),
+        path(
+            "watching/<uuid:user_id>",
+            async_views.AsyncGetWatchingForUserView.as_view(),
+        ),
+        path("profile/<uuid:user_id>", async_views.AsyncGetAProfile.as_view()),
+    ] + urlpatterns
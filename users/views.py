@@ -1,12 +1,19 @@
+from django.db import transaction
+from django.db.models import F
 from django.shortcuts import get_object_or_404
+from django.utils.dateparse import parse_datetime
 from rest_framework import status
 from rest_framework.generics import GenericAPIView
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from utils.exception_handlers import ErrorResponse
+from social.cache import invalidate_profiles
+from social.timeline import reset_inbox
+from utils.conditional import conditional
+from utils.exception_handlers import ErrorEnum, ErrorResponse
 
-from .models import Profile, Skill, UserWatching
+from .models import Profile, Recommendation, Skill, UserWatching
+from .pagination import WatchPagination
 from .serializers import (
     ProfileSerializer,
     ProfileUpdateSerializer,
@@ -15,7 +22,22 @@ from .serializers import (
 )
 
 
+def profile_version(view, request, user_id=None):
+    """
+    Version of a ProfileSerializer response for utils.conditional, of the requesting user
+    without `user_id`. The counters are updated without touching `date_update`.
+    """
+    return (
+        Profile.objects.filter(user_id=user_id or request.user_id)
+        .values_list("date_update", "watchers_count", "watching_count")
+        .first()
+    )
+
+
 class ProfileView(GenericAPIView):
+    read_from_replica = True  # For safe requests, see core/routers.py
+
+    @conditional(profile_version)
     def get(self, request):
         profile = Profile.objects.get(user_id=request.user_id)
 
@@ -37,6 +59,9 @@ class ProfileView(GenericAPIView):
 
 
 class GetAProfile(APIView):
+    read_from_replica = True
+
+    @conditional(profile_version, public=True)
     def get(self, request, user_id):
         profile = get_object_or_404(Profile, user_id=user_id)
 
@@ -47,82 +72,109 @@ class GetAProfile(APIView):
     ...
 
 
-class GetWatchers(APIView):
+class WatchListView(APIView):
     """
-    Get list of user's Following you.
+    Lists one side of the UserWatching graph for a profile in a single join, newest edge
+    first. Pages are keyset paginated and streamed, pass `?since=<ISO datetime>` to only get
+    edges created from that moment on.
     """
 
-    def get(self, request):
-        user_profile = get_object_or_404(Profile, user_id=request.user_id)
+    pagination_class = WatchPagination
+    read_from_replica = True
+    # The UserWatching field that points at the profile being listed, the other side is returned
+    lookup = None
+    returned = None
+
+    def list_edges(self, request, user_id):
+        since = request.query_params.get("since")
+        if since is not None and parse_datetime(since) is None:
+            return ErrorResponse(
+                ErrorEnum.ERR_001, extra_detail="since must be an ISO 8601 datetime"
+            )
+
+        edges = UserWatching.objects.filter(
+            **{f"{self.lookup}__user_id": user_id}
+        ).select_related(self.returned)
+        if since:
+            edges = edges.filter(date_created__gte=parse_datetime(since))
+
+        return self.get_page_response(
+            edges, lambda edge: ProfileSerializer(getattr(edge, self.returned)).data
+        )
 
-        results = UserWatching.objects.filter(user_id=user_profile)
+    def get_page_response(self, edges, serialize):
+        return self.pagination_class().get_streaming_response(
+            edges, self.request, serialize, view=self
+        )
 
-        ids = [profile.watching_user_id.user_id for profile in results]
 
-        profiles = Profile.objects.filter(user_id__in=ids)
+class GetWatchers(WatchListView):
+    """
+    Get list of user's Following you.
+    """
 
-        serializer = ProfileSerializer(profiles, many=True)
+    lookup, returned = "watching_user_id", "user_id"
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+    def get(self, request):
+        return self.list_edges(request, request.user_id)
 
 
-class GetWatching(APIView):
+class GetWatching(WatchListView):
     """
     Get the list of profile you are following
     """
 
-    def get(self, request):
-        user_profile = get_object_or_404(Profile, user_id=request.user_id)
-
-        results = UserWatching.objects.filter(user_id=user_profile)
-
-        # TODO change the name of the field on the Userwatching model, it is confusing
-        ids = [profile.user_id.user_id for profile in results]
+    lookup, returned = "user_id", "watching_user_id"
 
-        profiles = Profile.objects.filter(user_id__in=ids)
-
-        serializer = ProfileSerializer(profiles, many=True)
-
-        return Response(serializer.data, status=status.HTTP_200_OK)
+    def get(self, request):
+        return self.list_edges(request, request.user_id)
 
 
-class GetWatchersForUserView(APIView):
+class GetWatchersForUserView(WatchListView):
     """
     Get list of user's Following profile.
     """
 
-    def get(self, request, user_id):
-        user_profile = get_object_or_404(Profile, user_id=user_id)
-
-        results = UserWatching.objects.filter(user_id=user_profile)
-
-        ids = [profile.watching_user_id.user_id for profile in results]
-
-        profiles = Profile.objects.filter(user_id__in=ids)
+    lookup, returned = "watching_user_id", "user_id"
 
-        serializer = ProfileSerializer(profiles, many=True)
-
-        return Response(serializer.data, status=status.HTTP_200_OK)
+    def get(self, request, user_id):
+        return self.list_edges(request, user_id)
 
 
-class GetWatchingForUserView(APIView):
+class GetWatchingForUserView(WatchListView):
     """
     Get the list of profiles a user is following
     """
 
-    def get(self, request, user_id):
-        user_profile = get_object_or_404(Profile, user_id=user_id)
+    lookup, returned = "user_id", "watching_user_id"
 
-        results = UserWatching.objects.filter(user_id=user_profile)
+    def get(self, request, user_id):
+        return self.list_edges(request, user_id)
 
-        # TODO change the name of the field on the Userwatching model, it is confusing
-        ids = [profile.user_id.user_id for profile in results]
 
-        profiles = Profile.objects.filter(user_id__in=ids)
+class RecommendationsView(APIView):
+    read_from_replica = True
 
-        serializer = ProfileSerializer(profiles, many=True)
+    def get(self, request):
+        """
+        Profiles the currently logged in user may want to watch, best first. They are
+        computed in batches by users/recommendations.py, profiles watched since are left out.
+        """
+        watched = UserWatching.objects.filter(user_id__user_id=request.user_id).values(
+            "watching_user_id"
+        )
+        recommendations = (
+            Recommendation.objects.filter(profile__user_id=request.user_id)
+            .exclude(recommended__in=watched)
+            .select_related("recommended")
+            .order_by("-score")
+        )
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        data = [
+            ProfileSerializer(recommendation.recommended).data
+            for recommendation in recommendations
+        ]
+        return Response({"results": data}, status=status.HTTP_200_OK)
 
 
 class StartWatching(APIView):
@@ -140,10 +192,23 @@ class StartWatching(APIView):
         other_user_profile = get_object_or_404(
             Profile, user_id=serializer.validated_data["watching_user_id"]
         )
-        UserWatching.objects.get_or_create(
-            user_id=user_profile,
-            watching_user_id=other_user_profile,
-        )
+        with transaction.atomic():
+            _, created = UserWatching.objects.get_or_create(
+                user_id=user_profile,
+                watching_user_id=other_user_profile,
+            )
+            if created:
+                Profile.objects.filter(pk=user_profile.pk).update(
+                    watching_count=F("watching_count") + 1
+                )
+                Profile.objects.filter(pk=other_user_profile.pk).update(
+                    watchers_count=F("watchers_count") + 1
+                )
+
+        if created:
+            reset_inbox(user_profile.id)
+            invalidate_profiles(user_profile.pk, other_user_profile.pk)
+            other_user_profile.refresh_from_db(fields=["watchers_count"])
 
         serializer = ProfileSerializer(other_user_profile)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -162,7 +227,19 @@ class StopWatching(APIView):
             UserWatching, user_id=user_profile, watching_user_id=other_user_profile
         )
 
-        watch_obj.delete()
+        with transaction.atomic():
+            deleted, _ = watch_obj.delete()
+            if deleted:
+                Profile.objects.filter(
+                    pk=user_profile.pk, watching_count__gt=0
+                ).update(watching_count=F("watching_count") - 1)
+                Profile.objects.filter(
+                    pk=other_user_profile.pk, watchers_count__gt=0
+                ).update(watchers_count=F("watchers_count") - 1)
+
+        reset_inbox(user_profile.id)
+        invalidate_profiles(user_profile.pk, other_user_profile.pk)
+        other_user_profile.refresh_from_db(fields=["watchers_count"])
 
         serializer = ProfileSerializer(other_user_profile)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -183,6 +260,7 @@ class SkillView(GenericAPIView):
             profile = Profile.objects.get(user_id=request.user_id)
 
             profile.skills.add(*skill_objs)
+            profile.refresh_user_skills()
 
             serializer = ProfileSerializer(profile)
 
@@ -207,6 +285,7 @@ class SkillView(GenericAPIView):
 
             profile = Profile.objects.get(user_id=request.user_id)
             profile.skills.remove(*skill_objs)
+            profile.refresh_user_skills()
 
             serializer = ProfileSerializer(profile)
 
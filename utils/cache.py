@@ -0,0 +1,175 @@
+"""
+Tag based response caching.
+
+Every cached response is stored together with the version of each tag it depends on, e.g.
+`post:12` for a post on the page or `profile:3` for an embedded author. Writes invalidate
+by bumping tag versions, and a cached response is only served while all of its recorded
+versions are still current. That lets entries live for a long time without ever serving
+data older than the last write that touched them.
+
+Each bump also advances a shared clock and versions carry the clock value of their bump.
+Callers read the clock before computing the data, an entry is then only stored if none of
+its tags was bumped since, so the versions stored with it are the ones that were current
+before the data was read.
+"""
+
+import hashlib
+import math
+from functools import wraps
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .timing import record_cache
+
+# Versions are (clock, uuid) pairs, the "tag:" keys of plain uuid versions are left unread
+TAG_PREFIX = "tagv:"
+ENTRY_PREFIX = "view:"
+CLOCK_KEY = "tag-clock"
+
+
+def tag_key(tag):
+    return f"{TAG_PREFIX}{tag}"
+
+
+def tag_clock():
+    """The clock value of the latest bump, read it before computing data to cache"""
+    return cache.get(CLOCK_KEY, 0)
+
+
+def get_tag_versions(tags):
+    """Current version of each tag, None for tags that were never bumped"""
+    keys = {tag: tag_key(tag) for tag in tags}
+    found = cache.get_many(keys.values())
+    return {tag: found.get(key) for tag, key in keys.items()}
+
+
+def bumped_since(versions, clock):
+    return any(version and version[0] > clock for version in versions.values())
+
+
+def invalidate_tags(*tags):
+    """
+    Expires every cached response depending on any of `tags`, once the current transaction
+    commits so a concurrent read can not cache the data being replaced
+    """
+
+    def bump():
+        try:
+            now = cache.incr(CLOCK_KEY)
+        except ValueError:
+            cache.add(CLOCK_KEY, 0, timeout=None)
+            now = cache.incr(CLOCK_KEY)
+        version = (now, uuid4().hex)
+        cache.set_many({tag_key(tag): version for tag in tags}, timeout=None)
+
+    transaction.on_commit(bump)
+
+
+async def atag_clock():
+    return await cache.aget(CLOCK_KEY, 0)
+
+
+async def aget_tag_versions(tags):
+    keys = {tag: tag_key(tag) for tag in tags}
+    found = await cache.aget_many(keys.values())
+    return {tag: found.get(key) for tag, key in keys.items()}
+
+
+def get_cached(key):
+    entry = cache.get(key)
+    if entry is None:
+        record_cache(hit=False)
+        return None
+
+    versions, data = entry
+    current = cache.get_many([tag_key(tag) for tag in versions])
+    if any(current.get(tag_key(tag)) != version for tag, version in versions.items()):
+        record_cache(hit=False)
+        return None
+    record_cache(hit=True)
+    return data
+
+
+def set_cached(key, data, tags, timeout, clock):
+    """
+    Stores `data`, computed after `tag_clock()` returned `clock`. Skipped when one of
+    `tags` was bumped since, the data may predate that write.
+    """
+    versions = get_tag_versions(tags)
+    if not bumped_since(versions, clock):
+        cache.set(key, (versions, data), timeout)
+
+
+async def aget_cached(key):
+    """`get_cached` for async views"""
+    entry = await cache.aget(key)
+    if entry is None:
+        record_cache(hit=False)
+        return None
+
+    versions, data = entry
+    current = await cache.aget_many([tag_key(tag) for tag in versions])
+    if any(current.get(tag_key(tag)) != version for tag, version in versions.items()):
+        record_cache(hit=False)
+        return None
+    record_cache(hit=True)
+    return data
+
+
+async def aset_cached(key, data, tags, timeout, clock):
+    versions = await aget_tag_versions(tags)
+    if not bumped_since(versions, clock):
+        await cache.aset(key, (versions, data), timeout)
+
+
+def cache_key(function, scope, request):
+    """The key `tagged_cache` stores the response of `function` under"""
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f"{ENTRY_PREFIX}{function.__qualname__}:{scope}:{path}"
+
+
+def tagged_cache(scope, tags, timeout=None, expires=None):
+    """
+    Caches a successful view response.
+
+    Args:
+        scope (callable): `scope(view, request)` returns the part of the key identifying whose
+            data this is, e.g. "public" for responses that are the same for everybody, so the
+            entry is shared across tokens instead of kept once per Authorization header.
+        tags (callable): `tags(view, request, response)` returns the tags the response depends on.
+        timeout (int, optional): Seconds to keep an entry, defaults to settings.VIEW_CACHE_TIMEOUT.
+        expires (callable, optional): `expires(view, request, response)` returns the datetime
+            the response goes stale without any write, e.g. when a post on it expires, or None.
+    """
+
+    def decorator(function):
+        @wraps(function)
+        def wrapper(view, request, *args, **kwargs):
+            if settings.DEBUG or request.method != "GET":
+                return function(view, request, *args, **kwargs)
+
+            key = cache_key(function, scope(view, request), request)
+
+            if (data := get_cached(key)) is not None:
+                return Response(data)
+
+            clock = tag_clock()
+            response = function(view, request, *args, **kwargs)
+            if response.status_code == 200:
+                seconds = timeout or settings.VIEW_CACHE_TIMEOUT
+                if expires and (stale_at := expires(view, request, response)):
+                    left = (stale_at - timezone.now()).total_seconds()
+                    seconds = min(seconds, max(math.ceil(left), 1))
+
+                depends_on = tags(view, request, response)
+                set_cached(key, response.data, depends_on, seconds, clock)
+            return response
+
+        return wrapper
+
+    return decorator
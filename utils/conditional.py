@@ -0,0 +1,106 @@
+"""
+Conditional GET.
+
+`conditional` gives the responses of a view method an ETag computed from a version of the
+resource instead of from the rendered body: the handful of values the response changes
+with, e.g. update timestamps, denormalized counters and the viewer's flags, read with one
+narrow query. A request whose `If-None-Match` still matches is answered with 304 Not
+Modified without running the view.
+
+Counters are updated with `UPDATE ... SET x = x + 1` statements that leave the update
+timestamps alone, so versions must list them next to the timestamps. For the same reason
+no `Last-Modified` is sent, a timestamp alone would validate stale counters.
+"""
+
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+
+SAFE_METHODS = ("GET", "HEAD")
+
+
+def make_etag(request, version):
+    """A weak ETag of `version` for the URL and media type of `request`"""
+    media_type = getattr(request, "accepted_media_type", "")
+    raw = repr((request.get_full_path(), media_type, version))
+    return 'W/"%s"' % hashlib.md5(raw.encode()).hexdigest()
+
+
+def conditional(version, public=False):
+    """
+    Answers conditional GETs of a view method, sync or async.
+
+    Args:
+        version (callable): `version(view, request, *args, **kwargs)` returns the values the
+            response depends on, or None when there is nothing to validate (the view then
+            runs, e.g. to answer 404). The view finds it on `view.resource_version`.
+        public (bool): Whether the response is the same for every viewer. Shared caches such
+            as a CDN may then keep it for CONDITIONAL_GET_SETTINGS["PUBLIC_MAX_AGE"]
+            seconds, other responses are private to the viewer. Either way responses vary
+            on Authorization, a shared cache must not hand them to requests the API would
+            reject.
+    """
+
+    def not_modified(view, request, value):
+        view.resource_version = value
+        if value is None:
+            return None, None
+
+        etag = make_etag(request, value)
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            response = finish(response, etag)
+        return etag, response
+
+    def finish(response, etag):
+        if etag is None or response.status_code not in (200, 304):
+            return response
+
+        response["ETag"] = etag
+        if public:
+            max_age = settings.CONDITIONAL_GET_SETTINGS.get("PUBLIC_MAX_AGE", 60)
+            patch_cache_control(response, public=True, max_age=0, s_maxage=max_age)
+        else:
+            # Stored by the client, but revalidated before every use
+            patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ["Accept", "Authorization"])
+        return response
+
+    def decorator(function):
+        if iscoroutinefunction(function):
+
+            @wraps(function)
+            async def wrapper(view, request, *args, **kwargs):
+                if request.method not in SAFE_METHODS:
+                    return await function(view, request, *args, **kwargs)
+
+                value = await sync_to_async(version)(view, request, *args, **kwargs)
+                etag, response = not_modified(view, request, value)
+                if response is not None:
+                    return response
+                return finish(await function(view, request, *args, **kwargs), etag)
+
+        else:
+
+            @wraps(function)
+            def wrapper(view, request, *args, **kwargs):
+                if request.method not in SAFE_METHODS:
+                    return function(view, request, *args, **kwargs)
+
+                etag, response = not_modified(
+                    view, request, version(view, request, *args, **kwargs)
+                )
+                if response is not None:
+                    return response
+                return finish(function(view, request, *args, **kwargs), etag)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,19 @@
+import logging
+import threading
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+
+def start_flusher(flush, interval, name):
+    """Calls `flush` every `interval` seconds from a daemon thread of this worker"""
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                flush()
+            except Exception:
+                LOGGER.error("%s failed", name, exc_info=True)
+
+    threading.Thread(target=run, name=name, daemon=True).start()
@@ -0,0 +1,30 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+
+class SyncAndAsyncMiddleware:
+    """
+    Base for middleware that runs natively in WSGI and ASGI stacks. Django wraps sync-only
+    middleware of an async stack in a thread switch on the way in and out, these adapt to
+    the mode of the stack instead. Subclasses implement `handle(request)` and
+    `ahandle(request)`, which calls and awaits `self.get_response` respectively.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.ahandle(request)
+        return self.handle(request)
+
+    def handle(self, request):
+        return self.get_response(request)
+
+    async def ahandle(self, request):
+        return await self.get_response(request)
@@ -1,3 +1,11 @@
+from uuid import uuid4
+
+from django.conf import settings
+from django.test import AsyncClient
+from jose import jwt
+from rest_framework.test import APIClient
+
+
 class PytestTestRunner:
     """Runs pytest to discover and run tests."""
 
@@ -9,8 +17,7 @@ class PytestTestRunner:
     @classmethod
     def add_arguments(cls, parser):
         parser.add_argument(
-            '--keepdb', action='store_true',
-            help='Preserves the test DB between runs.'
+            "--keepdb", action="store_true", help="Preserves the test DB between runs."
         )
 
     def run_tests(self, test_labels):
@@ -22,15 +29,55 @@ class PytestTestRunner:
 
         argv = []
         if self.verbosity == 0:
-            argv.append('--quiet')
+            argv.append("--quiet")
         if self.verbosity == 2:
-            argv.append('--verbose')
+            argv.append("--verbose")
         if self.verbosity == 3:
-            argv.append('-vv')
+            argv.append("-vv")
         if self.failfast:
-            argv.append('--exitfirst')
+            argv.append("--exitfirst")
         if self.keepdb:
-            argv.append('--reuse-db')
+            argv.append("--reuse-db")
 
         argv.extend(test_labels)
-        return pytest.main(argv)
\ No newline at end of file
+        return pytest.main(argv)
+
+
+def make_profile(name, **fields):
+    from users.models import Profile
+
+    return Profile.objects.create(user_id=uuid4(), name=name, username=name, **fields)
+
+
+def bearer_token(profile):
+    token = jwt.encode(
+        {"user_id": str(profile.user_id)}, settings.SECRET_KEY, algorithm="HS256"
+    )
+    return f"Bearer {token}"
+
+
+def client_for(profile):
+    """An APIClient sending a bearer token for the user of `profile`"""
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=bearer_token(profile))
+    return client
+
+
+class BearerAsyncClient(AsyncClient):
+    """
+    An AsyncClient sending `authorization` with every request. Django 4.2's AsyncClient
+    drops the headers passed to its constructor, only per request ones reach the scope.
+    """
+
+    def __init__(self, authorization):
+        super().__init__()
+        self.authorization = authorization
+
+    def generic(self, *args, headers=None, **extra):
+        headers = {"Authorization": self.authorization, **(headers or {})}
+        return super().generic(*args, headers=headers, **extra)
+
+
+def async_client_for(profile):
+    """An AsyncClient, which runs requests through ASGIHandler, for the user of `profile`"""
+    return BearerAsyncClient(bearer_token(profile))
@@ -0,0 +1,57 @@
+"""
+Metrics of the request being handled, collected for core.middleware.RequestTimingMiddleware.
+
+The metrics of a request live in a context variable, so code anywhere below the view can
+add to them without being handed the request, and concurrent requests, threads or async
+tasks never mix their numbers.
+"""
+
+import time
+from contextvars import ContextVar
+
+_current = ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def execute(self, execute, sql, params, many, context):
+        """Times every query, installed with `connection.execute_wrapper`"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+    @property
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    @property
+    def db_ms(self):
+        return self.db_time * 1000
+
+
+def start():
+    """Starts collecting for the current request, returns (metrics, token for `stop`)"""
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+def record_cache(hit):
+    """Counts a lookup of utils.cache, outside of a request it is not counted"""
+    if (metrics := _current.get()) is not None:
+        if hit:
+            metrics.cache_hits += 1
+        else:
+            metrics.cache_misses += 1